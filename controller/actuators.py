@@ -0,0 +1,64 @@
+"""
+Actuator backends used by the asyncio control loop (controller.control).
+
+An actuator drives one zone's heating output towards a target temperature.
+Backends subclass Actuator and are selected with settings.CONTROLLER_ACTUATOR,
+which has no default outside DEBUG: FakeActuator drives nothing.
+"""
+import abc
+import asyncio
+import logging
+import random
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class ActuatorError(Exception):
+    pass
+
+
+class Actuator(abc.ABC):
+    @abc.abstractmethod
+    async def write(self, zone, target):
+        """
+        Sends `target` (°C) to the zone's output. Raises ActuatorError on failure.
+        """
+
+    async def close(self):
+        pass
+
+
+class FakeActuator(Actuator):
+    """
+    In-process backend for development and load testing: waits a simulated
+    I/O latency, fails a fraction of writes and remembers what was written.
+    """
+
+    def __init__(self, latency=0.01, jitter=0.0, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.state = {}
+        self.writes = 0
+
+    async def write(self, zone, target):
+        await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+        self.writes += 1
+        if self.random.random() < self.failure_rate:
+            raise ActuatorError(f"Simulated failure writing zone {zone.pk}")
+        self.state[zone.pk] = target
+
+
+def get_actuator(path=None, **kwargs):
+    path = path or settings.CONTROLLER_ACTUATOR
+    if not path:
+        raise ImproperlyConfigured("Set CONTROLLER_ACTUATOR to the actuator backend driving the zone outputs.")
+    actuator = import_string(path)(**kwargs)
+    if isinstance(actuator, FakeActuator) and not settings.DEBUG:
+        logger.warning("CONTROLLER_ACTUATOR is %s: no heating output is driven", path)
+    return actuator
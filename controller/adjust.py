@@ -0,0 +1,123 @@
+"""
+Coalesced +/- adjustments of a zone's manual override.
+
+Holding a dashboard button down fires many requests per second. Instead of
+one read-modify-write each, the deltas for a zone that arrive within a short
+window are summed and applied by whichever request came first, as a single
+UPDATE with an F() expression clamped in the database. Every request in the
+batch gets the final value back. Requests served by other processes are not
+coalesced with these, but the F() update still never loses one.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+from core.versions import bump_version
+from .models import ManualOverride, Zone, ZoneState
+from .scheduler import VERSION_NAME
+
+MAX_TEMP = 30.0
+MIN_TEMP = 5.0
+
+# Seconds the first adjustment of a burst waits for more to arrive
+DEFAULT_WINDOW = 0.05
+
+
+def clamp(value):
+    return max(MIN_TEMP, min(MAX_TEMP, value))
+
+
+def apply_adjustment(zone_id, delta, now=None):
+    """
+    Adds `delta` to the zone's active override (starting one from the
+    current target if there is none) and returns the new, clamped target.
+    Raises Zone.DoesNotExist for unknown zones.
+    """
+    if now is None:
+        now = timezone.now()
+    # A unique index probe: there is at most one override per zone
+    active = ManualOverride.objects.filter(zone_id=zone_id, active_from__lte=now).filter(
+        Q(active_until__gt=now) | Q(active_until__isnull=True)
+    )
+
+    with transaction.atomic():
+        # Writing first takes the SQLite write lock before anything is read,
+        # so concurrent adjustments queue up instead of racing
+        updated = active.update(
+            target_temperature=Greatest(
+                Least(F("target_temperature") + delta, Value(MAX_TEMP, FloatField())),
+                Value(MIN_TEMP, FloatField()),
+            ),
+            active_from=now,
+        )
+        if updated:
+            target = active.values_list("target_temperature", flat=True).get()
+            # Same override and window, only the target moved
+            ZoneState.objects.filter(zone_id=zone_id).update(target=target, source="manual")
+            # Not before the scheduler can read the new target
+            transaction.on_commit(lambda: bump_version(VERSION_NAME))
+            return target
+
+        zone = Zone.objects.get(pk=zone_id)
+        target = clamp(zone.status(now, include_manual=False).target + delta)
+        # Replaces an expired or upcoming override: a zone only has one
+        ManualOverride.objects.set_for_zone(zone, target, active_from=now)
+        return target
+
+
+class _Batch:
+    def __init__(self):
+        self.delta = 0.0
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class AdjustmentCoalescer:
+    def __init__(self, window=None, apply=apply_adjustment):
+        self.window = window
+        self.apply = apply
+        self._lock = threading.Lock()
+        self._pending = {}  # zone_id -> _Batch still collecting deltas
+
+    def get_window(self):
+        if self.window is not None:
+            return self.window
+        return getattr(settings, "OVERRIDE_ADJUST_WINDOW", DEFAULT_WINDOW)
+
+    def adjust(self, zone_id, delta):
+        """
+        Queues `delta` for the zone and returns the target once it is applied.
+        """
+        with self._lock:
+            batch = self._pending.get(zone_id)
+            leader = batch is None
+            if leader:
+                batch = self._pending[zone_id] = _Batch()
+            batch.delta += delta
+
+        if leader:
+            time.sleep(self.get_window())
+            with self._lock:
+                # Anything arriving from now on starts the next batch
+                del self._pending[zone_id]
+            try:
+                batch.result = self.apply(zone_id, batch.delta)
+            except Exception as e:
+                batch.error = e
+            finally:
+                batch.done.set()
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.result
+
+
+coalescer = AdjustmentCoalescer()
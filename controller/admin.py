@@ -1,7 +1,8 @@
 from django.contrib import admin
-from .models import Zone, Schedule, ManualOverride, TemperatureLog
+from .models import Zone, Schedule, ManualOverride, ManualOverrideArchive, TemperatureLog
 
 admin.site.register(Zone)
 admin.site.register(Schedule)
 admin.site.register(ManualOverride)
+admin.site.register(ManualOverrideArchive)
 admin.site.register(TemperatureLog)
@@ -1,16 +1,80 @@
+import csv
+import json
+
+from django.db import router, transaction
+from django.http import StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from rest_framework import status
 from .models import Zone, Schedule, ManualOverride, TemperatureLog
-from .serializers import ZoneSerializer, ScheduleSerializer, ManualOverrideSerializer, TemperatureLogSerializer
+from .serializers import (
+    ZoneSerializer, ScheduleSerializer, ManualOverrideSerializer, SensorReadingSerializer, TemperatureLogSerializer,
+)
 from rest_framework.permissions import IsAuthenticated
+from core.db_router import read_from_replica
+from . import rollups
+from .logwriter import record_readings
+from .zonestate import get_states
+
+LOG_SOURCES = dict(TemperatureLog._meta.get_field("source").choices)
+
+
+def parse_query_datetime(value):
+    """
+    Parses an ISO datetime query parameter; naive values are local time.
+    """
+    parsed = parse_datetime(value or "")
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
 
 
 class ZoneViewSet(viewsets.ModelViewSet):
-    queryset = Zone.objects.all()
+    queryset = Zone.objects.select_related("state", "state__override")
     serializer_class = ZoneSerializer
     permission_classes = [IsAuthenticated]
 
+    # Targets come from ZoneState; re-resolve only the rows that went stale
+
+    def get_object(self):
+        zone = super().get_object()
+        get_states([zone])
+        return zone
+
+    def list(self, request, *args, **kwargs):
+        zones = list(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(zones)
+        get_states(zones if page is None else page)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(zones, many=True).data)
+
+    @action(detail=True, methods=["post"])
+    def readings(self, request, pk=None):
+        """
+        Measured temperatures for the zone, the feed preheat learns from:
+        {"temperature": 19.5, "timestamp": <iso>} or a list of them.
+        Timestamps default to now.
+        """
+        # Not get_object(): no need to resolve the zone's state
+        zone = get_object_or_404(Zone.objects.all(), pk=pk)
+        many = isinstance(request.data, list)
+        serializer = SensorReadingSerializer(data=request.data, many=many)
+        serializer.is_valid(raise_exception=True)
+        now = timezone.now()
+        readings = serializer.validated_data if many else [serializer.validated_data]
+        logs = record_readings(zone.pk, [
+            (reading["temperature"], reading.get("timestamp", now)) for reading in readings
+        ])
+        return Response({"zone": zone.pk, "recorded": len(logs)}, status=status.HTTP_201_CREATED)
+
 
 class ScheduleViewSet(viewsets.ModelViewSet):
     queryset = Schedule.objects.all()
@@ -23,8 +87,135 @@ class ManualOverrideViewSet(viewsets.ModelViewSet):
     serializer_class = ManualOverrideSerializer
     permission_classes = [IsAuthenticated]
 
+    # A zone has one override row (override_one_per_zone), possibly expired
+    # and not archived yet: writes replace it instead of adding a second
+    def set_override(self, serializer):
+        data = serializer.validated_data
+        return ManualOverride.objects.set_for_zone(
+            data["zone"], data["target_temperature"],
+            until=data.get("active_until"), active_from=data.get("active_from"),
+        )
+
+    def perform_create(self, serializer):
+        serializer.instance = self.set_override(serializer)
+
+    def perform_update(self, serializer):
+        instance = serializer.instance
+        data = {
+            field: serializer.validated_data.get(field, getattr(instance, field))
+            for field in ("zone", "target_temperature", "active_from", "active_until")
+        }
+        serializer.validated_data.update(data)
+        with transaction.atomic():
+            if data["zone"].pk != instance.zone_id:
+                # Moving to another zone replaces that zone's override
+                instance.delete()
+            serializer.instance = self.set_override(serializer)
+
+
+class TemperatureLogPagination(CursorPagination):
+    # Keyset pagination: pages stay cheap however deep the client goes
+    ordering = ("timestamp", "id")
+    page_size = 500
+    page_size_query_param = "page_size"
+    max_page_size = 5000
+
+
+class Echo:
+    """
+    File-like object for csv.writer that hands each row back instead of storing it.
+    """
 
+    def write(self, value):
+        return value
+
+
+@method_decorator(read_from_replica, name='dispatch')
 class TemperatureLogViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Filters: ?zone=<id>[,<id>...]&source=<source>&start=<iso>&end=<iso>
+    """
     queryset = TemperatureLog.objects.all()
     serializer_class = TemperatureLogSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = TemperatureLogPagination
+
+    EXPORT_FIELDS = ("id", "zone_id", "temperature", "source", "timestamp")
+    EXPORT_CHUNK_SIZE = 2000
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+
+        if params.get("zone"):
+            try:
+                zone_ids = [int(z) for z in params["zone"].split(",")]
+            except ValueError:
+                raise ValidationError({"zone": "Expected comma separated zone ids."})
+            queryset = queryset.filter(zone_id__in=zone_ids)
+        if params.get("source"):
+            if params["source"] not in LOG_SOURCES:
+                raise ValidationError({"source": f"Expected one of: {', '.join(LOG_SOURCES)}."})
+            queryset = queryset.filter(source=params["source"])
+        for param, lookup in (("start", "timestamp__gte"), ("end", "timestamp__lt")):
+            if params.get(param):
+                value = parse_query_datetime(params[param])
+                if value is None:
+                    raise ValidationError({param: "Expected an ISO datetime."})
+                queryset = queryset.filter(**{lookup: value})
+        return queryset
+
+    @action(detail=False)
+    def export(self, request):
+        """
+        Streams every matching row as ?fmt=ndjson (default) or ?fmt=csv.
+        Rows are read in chunks, so memory use does not grow with the export.
+        """
+        fmt = request.query_params.get("fmt", "ndjson")
+        if fmt not in ("ndjson", "csv"):
+            return Response({"error": "fmt must be ndjson or csv"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # The rows are read while the response streams, after read_from_replica
+        # has returned, so pick the database now
+        queryset = self.get_queryset().using(router.db_for_read(TemperatureLog))
+        rows = queryset.order_by("timestamp", "id").values_list(
+            *self.EXPORT_FIELDS).iterator(chunk_size=self.EXPORT_CHUNK_SIZE)
+
+        if fmt == "csv":
+            writer = csv.writer(Echo())
+
+            def content():
+                yield writer.writerow(self.EXPORT_FIELDS)
+                for row in rows:
+                    yield writer.writerow(row[:-1] + (row[-1].isoformat(),))
+
+            response = StreamingHttpResponse(content(), content_type="text/csv")
+            response["Content-Disposition"] = 'attachment; filename="temperature_logs.csv"'
+            return response
+
+        def content():
+            for row in rows:
+                record = dict(zip(self.EXPORT_FIELDS, row))
+                record["timestamp"] = record["timestamp"].isoformat()
+                yield json.dumps(record) + "\n"
+
+        return StreamingHttpResponse(content(), content_type="application/x-ndjson")
+
+    @action(detail=False)
+    def series(self, request):
+        """
+        Downsampled history: ?zone=<id>&start=<iso>&end=<iso>&resolution=<seconds>
+        Served from the coarsest rollup tier no coarser than `resolution`.
+        """
+        start = parse_query_datetime(request.query_params.get("start"))
+        end = parse_query_datetime(request.query_params.get("end")) if "end" in request.query_params else timezone.now()
+        try:
+            zone_id = int(request.query_params["zone"])
+            resolution = int(request.query_params.get("resolution", 0))
+        except (KeyError, ValueError):
+            return Response({"error": "zone and resolution must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        if start is None or end is None:
+            return Response({"error": "start and end must be ISO datetimes"}, status=status.HTTP_400_BAD_REQUEST)
+
+        tier, points = rollups.series(zone_id, start, end, resolution)
+        return Response({"zone": zone_id, "resolution": tier, "points": points})
@@ -0,0 +1,159 @@
+"""
+Benchmarks of the scheduling, dashboard and API hot paths.
+
+Each benchmark is run once to warm caches, once under tracemalloc to record
+its query count and peak memory, then `repeat` times for wall time. Results
+are plain dicts (see run_benchmarks) so they can be saved as JSON and
+compared between commits with compare(). Run through `manage.py bench`,
+which sets up a throwaway test database first.
+"""
+import asyncio
+import statistics
+import time
+import tracemalloc
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import preheat
+from .actuators import FakeActuator
+from .control import ControlLoop, _resolve_targets
+from .models import Zone
+
+# Fractional slowdown of the fastest run reported as a regression
+DEFAULT_THRESHOLD = 0.2
+
+
+def measure(func, repeat=5):
+    """
+    Runs `func` and returns {"queries", "peak_kb", "wall_ms": {min, median, max}}.
+    `func` may return a number of queries it ran on other threads.
+    """
+    func()
+
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as ctx:
+            extra = func() or 0
+        # Read now: later requests reset connection.queries
+        queries = len(ctx) + extra
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+
+    return {
+        "queries": queries,
+        "peak_kb": round(peak / 1024, 1),
+        "wall_ms": {
+            "min": round(min(times), 3),
+            "median": round(statistics.median(times), 3),
+            "max": round(max(times), 3),
+        },
+    }
+
+
+def benchmarks(now=None):
+    """
+    {name: callable} over the zones currently in the database.
+    """
+    zones = list(Zone.objects.order_by("pk"))
+    user = User.objects.filter(is_superuser=True).first() or User.objects.create_superuser("bench")
+    client = Client()
+    client.force_login(user)
+
+    def current_schedule():
+        for zone in zones:
+            zone.current_schedule(now)
+
+    def next_temperature_event():
+        for zone in zones:
+            zone.next_temperature_event(now)
+
+    def get(url):
+        def view():
+            response = client.get(url)
+            assert response.status_code == 200, f"{url} returned {response.status_code}"
+        return view
+
+    def control_tick():
+        # The evaluator runs on a worker thread, with its own connection
+        queries = []
+
+        def evaluate():
+            with CaptureQueriesContext(connection) as ctx:
+                targets = _resolve_targets()
+            queries.append(len(ctx))
+            return targets
+
+        # A fresh loop writes every zone, like the first tick after a change
+        loop = ControlLoop(FakeActuator(latency=0), evaluate=sync_to_async(evaluate))
+        asyncio.run(loop.tick())
+        return sum(queries)
+
+    def preheat_fit():
+        # From scratch over the whole log history, the slowest refit there is
+        preheat.reset()
+        preheat.refit(now)
+
+    return {
+        "zone.current_schedule": current_schedule,
+        "zone.next_temperature_event": next_temperature_event,
+        "dashboard": get(reverse("controller:dashboard")),
+        "zone_schedule_api": get(reverse("controller:api_zone_schedule", args=[zones[0].pk])),
+        "api_logs": get(reverse("temperaturelog-list")),
+        "control_tick": control_tick,
+        # Runs last: the published model then feeds nothing measured here
+        "preheat_fit": preheat_fit,
+    }
+
+
+def run_benchmarks(repeat=5, only=None, now=None):
+    """
+    Runs every benchmark (or those named in `only`) and returns {name: result}.
+    """
+    if now is None:
+        now = timezone.now()
+    results = {}
+    for name, func in benchmarks(now).items():
+        if only and name not in only:
+            continue
+        results[name] = measure(func, repeat)
+    return results
+
+
+def compare(baseline, results, threshold=DEFAULT_THRESHOLD):
+    """
+    Returns (rows, regressions): one row per benchmark present in both runs
+    with the old and new wall time and query count, and the names that got
+    slower by more than `threshold` or run more queries. Compares the fastest
+    run, which is the least affected by noise from the rest of the machine.
+    """
+    rows, regressions = [], []
+    for name, new in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        old_ms, new_ms = old["wall_ms"]["min"], new["wall_ms"]["min"]
+        change = (new_ms - old_ms) / old_ms if old_ms else 0.0
+        rows.append({
+            "name": name,
+            "old_ms": old_ms,
+            "new_ms": new_ms,
+            "change": change,
+            "old_queries": old["queries"],
+            "new_queries": new["queries"],
+        })
+        if change > threshold or new["queries"] > old["queries"]:
+            regressions.append(name)
+    return rows, regressions
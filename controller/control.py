@@ -0,0 +1,131 @@
+"""
+Asyncio control loop.
+
+Each tick evaluates every zone's target once (one bulk resolve) and then
+writes the changed targets to the actuator concurrently, so a slow output
+on one zone no longer holds up the others. Writes are bounded by a
+semaphore, each one has a timeout and failed writes are retried with
+exponential backoff. Any error only fails its own zone (or, outside the
+writes, its own tick): the loop keeps running and logs it.
+"""
+import asyncio
+import logging
+import statistics
+import time
+from dataclasses import dataclass, field
+
+from asgiref.sync import sync_to_async
+
+from .actuators import ActuatorError
+from .resolver import resolve_zones
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TickResult:
+    zones: int = 0
+    written: int = 0
+    failed: int = 0
+    duration: float = 0.0
+    # Seconds from the start of the tick until each write completed
+    latencies: list = field(default_factory=list)
+
+    def percentile(self, pct):
+        if not self.latencies:
+            return 0.0
+        if len(self.latencies) == 1:
+            return self.latencies[0]
+        return statistics.quantiles(self.latencies, n=100, method="inclusive")[pct - 1]
+
+    def summary(self):
+        return (
+            f"{self.zones} zones, {self.written} written, {self.failed} failed, "
+            f"p50 {self.percentile(50) * 1000:.1f}ms, p95 {self.percentile(95) * 1000:.1f}ms, "
+            f"max {max(self.latencies, default=0) * 1000:.1f}ms, tick {self.duration * 1000:.1f}ms"
+        )
+
+
+def _resolve_targets():
+    return {status.zone: status.target for status in resolve_zones().values()}
+
+
+async def resolve_targets():
+    """
+    Default evaluator: {zone: target} for every zone in the database.
+    """
+    return await sync_to_async(_resolve_targets)()
+
+
+class ControlLoop:
+    def __init__(self, actuator, evaluate=resolve_targets, concurrency=50,
+                 timeout=2.0, retries=3, backoff=0.1):
+        self.actuator = actuator
+        self.evaluate = evaluate
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        # zone_id -> target the actuator last acknowledged
+        self.written = {}
+
+    async def actuate(self, semaphore, zone, target):
+        """
+        Writes one zone, retrying with backoff. Returns True on success.
+        """
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                async with semaphore:
+                    await asyncio.wait_for(self.actuator.write(zone, target), self.timeout)
+            except (ActuatorError, asyncio.TimeoutError):
+                continue
+            except Exception:
+                # A backend bug or I/O error (OSError, serial, HTTP...)
+                logger.exception("Unexpected error writing zone %s", zone.pk)
+                continue
+            self.written[zone.pk] = target
+            return True
+        logger.warning("Gave up writing %s°C to zone %s after %d attempts", target, zone.pk, self.retries + 1)
+        return False
+
+    async def tick(self):
+        started = time.perf_counter()
+        targets = await self.evaluate()
+        result = TickResult(zones=len(targets))
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(zone, target):
+            ok = await self.actuate(semaphore, zone, target)
+            result.latencies.append(time.perf_counter() - started)
+            if ok:
+                result.written += 1
+            else:
+                result.failed += 1
+
+        await asyncio.gather(*(
+            run(zone, target) for zone, target in targets.items()
+            if self.written.get(zone.pk) != target
+        ))
+
+        result.duration = time.perf_counter() - started
+        return result
+
+    async def run(self, interval, ticks=None, report=None):
+        count = 0
+        while ticks is None or count < ticks:
+            started = time.monotonic()
+            try:
+                result = await self.tick()
+            except Exception:
+                # Say the database is down for the evaluation: try again next tick
+                logger.exception("Control loop tick failed")
+                result = None
+            count += 1
+            if report and result is not None:
+                report(count, result)
+            if ticks is not None and count >= ticks:
+                break
+            await asyncio.sleep(max(interval - (time.monotonic() - started), 0))
@@ -1,10 +1,40 @@
 from django import forms
+from . import overlaps
 from .models import Schedule, ManualOverride, Zone
 
 # Add Bootstrap classes using widget
 
 
-class ScheduleForm(forms.ModelForm):
+class OverlapCheckMixin:
+    """
+    Rejects a submission whose zone × day rows would overlap each other or
+    the zones' other schedules (under the "reject" overlap policy).
+    """
+    # Stored schedules the save rewrites, so not counted as conflicts
+    replacing = ()
+
+    def clean(self):
+        cleaned = super().clean()
+        if overlaps.policy() != overlaps.REJECT or self.errors:
+            return cleaned
+
+        candidates = [
+            Schedule(
+                zone=zone, day_of_week=int(day), start_time=cleaned["start_time"],
+                end_time=cleaned["end_time"], priority=cleaned.get("priority") or 0,
+            )
+            for zone in cleaned["zones"] for day in cleaned["days_of_week"]
+        ]
+        found = overlaps.check_schedules(candidates, self.replacing)
+        if found:
+            messages = [overlaps.describe(overlap) for overlap in found[:overlaps.MAX_REPORTED]]
+            if len(found) > overlaps.MAX_REPORTED:
+                messages.append(f"...and {len(found) - overlaps.MAX_REPORTED} more overlaps.")
+            raise forms.ValidationError(messages)
+        return cleaned
+
+
+class ScheduleForm(OverlapCheckMixin, forms.ModelForm):
     # Multiple zones
     zones = forms.ModelMultipleChoiceField(
         queryset=Zone.objects.all(),
@@ -61,22 +91,29 @@ class ScheduleForm(forms.ModelForm):
             self.fields['days_of_week'].initial = [
                 self.instance.day_of_week]
 
+        if self.instance.pk:
+            self.replacing = [self.instance]
+
     def save(self, commit=True):
         zones = self.cleaned_data.pop('zones')
         days = self.cleaned_data.pop('days_of_week')
         instance = super().save(commit=False)
 
         if commit:
-            for zone in zones:
-                for day in days:
-                    Schedule.objects.create(
-                        zone=zone,
-                        day_of_week=day,
-                        start_time=instance.start_time,
-                        end_time=instance.end_time,
-                        target_temperature=instance.target_temperature,
-                        priority=instance.priority
-                    )
+            zone_ids = [zone.pk for zone in zones]
+            values = dict(
+                start_time=instance.start_time,
+                end_time=instance.end_time,
+                target_temperature=instance.target_temperature,
+                priority=instance.priority,
+            )
+            if instance.pk:
+                # Editing moves the row rather than adding new ones next to it
+                overlaps.save_schedules(
+                    lambda: Schedule.objects.replace_group([instance], zone_ids, days, **values), zone_ids,
+                )
+            else:
+                overlaps.save_schedules(lambda: Schedule.objects.upsert(zone_ids, days, **values), zone_ids)
         return instance
 
 
@@ -103,7 +140,7 @@ class ZoneForm(forms.ModelForm):
         }
 
 
-class ScheduleBatchForm(forms.ModelForm):
+class ScheduleBatchForm(OverlapCheckMixin, forms.ModelForm):
     zones = forms.ModelMultipleChoiceField(
         queryset=Zone.objects.all(),
         widget=forms.SelectMultiple(attrs={
@@ -141,6 +178,7 @@ class ScheduleBatchForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         initial_zones = kwargs.pop('initial_zones', None)
         initial_days = kwargs.pop('initial_days', None)
+        self.replacing = kwargs.pop('replacing', ())
         super().__init__(*args, **kwargs)
 
         if initial_zones is not None:
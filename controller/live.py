@@ -0,0 +1,233 @@
+"""
+Live dashboard updates over Server-Sent Events.
+
+One Hub per process watches the version tokens (the same ones the scheduler
+daemon polls), recomputes every zone's state once when something changed
+and fans the per-zone deltas out to every connected browser. N open
+dashboards therefore cost one resolve_zones() per change, not N.
+
+When a refresh fails the Hub logs it, sends the clients a "stale" event (the
+dashboard flags its values as out of date) and keeps retrying every poll;
+the first refresh that works sends everyone a fresh snapshot.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.utils import timezone
+
+from core.versions import get_version
+from .resolver import resolve_zones
+from .scheduler import STATE_VERSION, current_versions
+from .timeline import check_version
+
+# Seconds between version token checks
+POLL_INTERVAL = 1.0
+# Full recompute even without a version change, so time based changes
+# (an override expiring with no scheduler running) still show up
+REFRESH_INTERVAL = 30.0
+# Comment line sent when idle so proxies keep the connection open
+KEEPALIVE_INTERVAL = 15.0
+# Events buffered per client before it is considered stuck and resynced
+QUEUE_SIZE = 100
+# Browser reconnect delay (ms) after the stream drops
+RETRY = 3000
+# Queued for clients when refreshing fails (None is "resync")
+STALE = "stale"
+
+logger = logging.getLogger(__name__)
+
+
+def zone_state(status):
+    event = status.next_event
+    return {
+        "name": status.zone.name,
+        "current": status.zone.current_temperature,
+        "target": status.target,
+        "display_target": status.display_target,
+        "source": status.source,
+        "next_event": event and {
+            "time": timezone.localtime(event["time"]),
+            "type": event["type"],
+            "target": event["target"],
+        },
+    }
+
+
+def snapshot():
+    """
+    {zone_id: state} for every zone, as sent to the browsers.
+    """
+    return {zone_id: zone_state(status) for zone_id, status in resolve_zones().items()}
+
+
+def diff(old, new):
+    """
+    Returns (changed, removed): the zones whose state differs, with only the
+    fields that changed, and the ids of zones that are gone.
+    """
+    changed = {}
+    for zone_id, state in new.items():
+        previous = old.get(zone_id)
+        if previous is None:
+            changed[zone_id] = state
+            continue
+        fields = {key: value for key, value in state.items() if previous.get(key) != value}
+        if fields:
+            changed[zone_id] = fields
+    removed = [zone_id for zone_id in old if zone_id not in new]
+    return changed, removed
+
+
+def format_event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+class Subscriber:
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # Too far behind: drop what is queued and send a fresh snapshot instead
+            with self.queue.mutex:
+                self.queue.queue.clear()
+            self.queue.put_nowait(None)
+
+    def get(self, timeout):
+        """
+        Next queued event, None for "resync", STALE when the hub can't
+        refresh, raises queue.Empty on timeout.
+        """
+        return self.queue.get(timeout=timeout)
+
+
+class Hub:
+    def __init__(self, compute=snapshot, poll_interval=POLL_INTERVAL,
+                 refresh_interval=REFRESH_INTERVAL, autostart=True):
+        self.compute = compute
+        self.poll_interval = poll_interval
+        self.refresh_interval = refresh_interval
+        self.autostart = autostart
+        self.subscribers = set()
+        self.state = None
+        self.versions = None
+        self.refreshed_at = 0.0
+        self.failing = False
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self):
+        """
+        Registers a client. Returns (subscriber, full state to send first).
+        """
+        subscriber = Subscriber()
+        with self._lock:
+            self.subscribers.add(subscriber)
+            start = self.autostart and (self._thread is None or not self._thread.is_alive())
+            if start:
+                self._thread = threading.Thread(target=self.run, name="live-hub", daemon=True)
+                self._thread.start()
+        if self.state is None:
+            self.refresh()
+        return subscriber, self.state
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self.subscribers.discard(subscriber)
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.put(event)
+
+    def refresh(self):
+        """
+        Recomputes the state and publishes the delta. Returns the delta event
+        (None when nothing changed).
+        """
+        versions = (current_versions(), get_version(STATE_VERSION))
+        if versions != self.versions:
+            check_version()
+        state = self.compute()
+        with self._lock:
+            old, self.state = self.state, state
+            self.versions = versions
+            self.refreshed_at = time.monotonic()
+        if old is None:
+            return None
+
+        changed, removed = diff(old, state)
+        if not changed and not removed:
+            return None
+        event = {"zones": changed, "removed": removed}
+        self.publish(event)
+        return event
+
+    def poll(self):
+        """
+        Refreshes when a version token moved or the refresh interval passed.
+        """
+        versions = (current_versions(), get_version(STATE_VERSION))
+        if versions != self.versions or time.monotonic() - self.refreshed_at >= self.refresh_interval:
+            return self.refresh()
+        return None
+
+    def run(self):
+        # Stops once the last client left; the next subscribe starts it again
+        while True:
+            with self._lock:
+                if not self.subscribers:
+                    self._thread = None
+                    self.state = None
+                    return
+            try:
+                self.poll()
+            except Exception:
+                # Keep serving; the state wasn't replaced, so the next poll retries
+                logger.exception("Live dashboard refresh failed")
+                if not self.failing:
+                    self.failing = True
+                    self.publish(STALE)
+            else:
+                if self.failing:
+                    self.failing = False
+                    self.publish(None)
+            finally:
+                # This thread lives as long as there are clients: don't hold
+                # a connection past CONN_MAX_AGE or after an error
+                close_old_connections()
+            time.sleep(self.poll_interval)
+
+    def stream(self, keepalive=KEEPALIVE_INTERVAL):
+        """
+        Generator of SSE text for one client: the full state first, then deltas.
+        """
+        subscriber, state = self.subscribe()
+        try:
+            yield f"retry: {RETRY}\n\n"
+            yield format_event("snapshot", {"zones": state})
+            while True:
+                try:
+                    event = subscriber.get(keepalive)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    yield format_event("snapshot", {"zones": self.state})
+                elif event == STALE:
+                    yield format_event("stale", {})
+                else:
+                    yield format_event("delta", event)
+        finally:
+            self.unsubscribe(subscriber)
+
+
+hub = Hub()
@@ -0,0 +1,176 @@
+"""
+Buffered TemperatureLog writer.
+
+Records are dropped unless the zone's temperature moved by more than the
+deadband, its source changed, or the heartbeat interval passed since the
+zone's last row. Sensor readings and setpoints are compared separately, so a
+feed logging measured temperatures doesn't defeat the setpoint deadband.
+
+Kept rows are buffered and written with one bulk_create in a single
+transaction once the buffer is full or the flush interval elapsed, so a
+crash loses at most one flush window. The same transaction folds the rows
+into the rollup tiers (controller.rollups).
+
+A failed flush is logged rather than raised, so it never takes the daemon
+down mid-refresh. Rows of zones deleted meanwhile are dropped, anything else
+stays buffered for the next flush, up to MAX_BUFFER rows (oldest dropped).
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+
+from core.sqlite import serialized_write
+from . import rollups
+from .models import TemperatureLog, Zone
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "DEADBAND": 0.1,        # °C
+    "HEARTBEAT": 15 * 60,   # seconds, None to disable
+    "FLUSH_SIZE": 500,      # rows
+    "FLUSH_INTERVAL": 5.0,  # seconds
+    "MAX_BUFFER": 10000,    # rows
+}
+
+
+class TemperatureLogWriter:
+    def __init__(
+        self, deadband=DEFAULTS["DEADBAND"], heartbeat=DEFAULTS["HEARTBEAT"],
+        flush_size=DEFAULTS["FLUSH_SIZE"], flush_interval=DEFAULTS["FLUSH_INTERVAL"],
+        max_buffer=DEFAULTS["MAX_BUFFER"],
+    ):
+        self.deadband = deadband
+        self.heartbeat = heartbeat
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max(max_buffer, flush_size)
+        self.buffer = []
+        self.last = {}  # (zone_id, is sensor) -> (temperature, source, timestamp) last kept
+        self.flushed_at = time.monotonic()
+
+    @classmethod
+    def from_settings(cls):
+        options = {**DEFAULTS, **getattr(settings, "TEMPERATURE_LOG_WRITER", {})}
+        return cls(
+            deadband=options["DEADBAND"],
+            heartbeat=options["HEARTBEAT"],
+            flush_size=options["FLUSH_SIZE"],
+            flush_interval=options["FLUSH_INTERVAL"],
+            max_buffer=options["MAX_BUFFER"],
+        )
+
+    def should_record(self, zone_id, temperature, source, timestamp):
+        previous = self.last.get((zone_id, source == TemperatureLog.SENSOR))
+        if previous is None:
+            return True
+        last_temperature, last_source, last_timestamp = previous
+        if source != last_source or abs(temperature - last_temperature) > self.deadband:
+            return True
+        return (
+            self.heartbeat is not None
+            and (timestamp - last_timestamp).total_seconds() >= self.heartbeat
+        )
+
+    def record(self, zone_id, temperature, source, timestamp=None):
+        """
+        Buffers a reading if it is worth keeping. Returns True when it was kept.
+        """
+        if timestamp is None:
+            timestamp = timezone.now()
+        if not self.should_record(zone_id, temperature, source, timestamp):
+            self.maybe_flush()
+            return False
+
+        self.last[zone_id, source == TemperatureLog.SENSOR] = (temperature, source, timestamp)
+        self.buffer.append(TemperatureLog(
+            zone_id=zone_id, temperature=temperature, source=source, timestamp=timestamp,
+        ))
+        if len(self.buffer) > self.max_buffer:
+            # Flushes keep failing: give up on the oldest rows
+            dropped = len(self.buffer) - self.max_buffer
+            del self.buffer[:dropped]
+            logger.warning("TemperatureLog buffer full, dropped %d rows", dropped)
+        self.maybe_flush()
+        return True
+
+    def maybe_flush(self):
+        """
+        Flushes when the size or time threshold is reached. Daemons call this
+        on every wakeup so an idle buffer still gets written in time.
+        """
+        if (
+            len(self.buffer) >= self.flush_size
+            or time.monotonic() - self.flushed_at >= self.flush_interval
+        ):
+            return self.flush()
+        return 0
+
+    def flush(self):
+        """
+        Writes the buffered rows in one transaction. Returns the row count,
+        0 when the write failed.
+        """
+        self.flushed_at = time.monotonic()
+        if not self.buffer:
+            return 0
+
+        try:
+            try:
+                self.write()
+            except IntegrityError:
+                # Most likely a zone deleted since its rows were buffered
+                if not self.drop_deleted_zones():
+                    raise
+                if self.buffer:
+                    self.write()
+        except Exception:
+            # Left buffered for the next flush
+            logger.exception("Failed to write %d TemperatureLog rows", len(self.buffer))
+            return 0
+        count, self.buffer = len(self.buffer), []
+        return count
+
+    def write(self):
+        with serialized_write():
+            TemperatureLog.objects.bulk_create(self.buffer, batch_size=self.flush_size)
+            rollups.ingest(self.buffer)
+
+    def drop_deleted_zones(self):
+        """
+        Drops the buffered rows of zones that no longer exist. Returns how many.
+        """
+        zone_ids = {log.zone_id for log in self.buffer}
+        gone = zone_ids - set(Zone.objects.filter(pk__in=zone_ids).values_list("pk", flat=True))
+        if not gone:
+            return 0
+        count = len(self.buffer)
+        self.buffer = [log for log in self.buffer if log.zone_id not in gone]
+        for key in [key for key in self.last if key[0] in gone]:
+            del self.last[key]
+        logger.warning("Dropped %d TemperatureLog rows of deleted zones %s", count - len(self.buffer), sorted(gone))
+        return count - len(self.buffer)
+
+    def close(self):
+        return self.flush()
+
+
+def record_readings(zone_id, readings):
+    """
+    Stores measured temperatures [(°C, timestamp), ...] of a zone as
+    TemperatureLog.SENSOR rows, the ones controller.preheat fits on, in one
+    transaction. Unlike the setpoints, every reading is kept: the feed
+    decides how often to sample. Returns the rows written.
+    """
+    logs = [
+        TemperatureLog(zone_id=zone_id, temperature=temperature, source=TemperatureLog.SENSOR, timestamp=timestamp)
+        for temperature, timestamp in readings
+    ]
+    if logs:
+        with serialized_write():
+            TemperatureLog.objects.bulk_create(logs)
+            rollups.ingest(logs)
+    return logs
@@ -1,27 +1,12 @@
-from django.core.management.base import BaseCommand
-from controller.models import Zone, ManualOverride
-import time
+from django.core.management.base import BaseCommand, CommandError
 
 
 class Command(BaseCommand):
-    help = "Apply manual overrides to zones"
+    help = "Deprecated: overrides are applied by apply_schedule"
 
     def handle(self, *args, **kwargs):
-        self.stdout.write("Starting manual override loop...")
-        try:
-            while True:
-                # Get all active manual overrides
-                overrides = ManualOverride.objects.filter(active=True)
-
-                for override in overrides:
-                    zone = override.zone
-                    zone.current_temperature = override.target_temperature
-                    zone.save()
-                    self.stdout.write(
-                        f"Applied override: {zone.name} -> {zone.current_temperature}°C")
-
-                # Sleep for 10 seconds (adjust as needed)
-                time.sleep(10)
-
-        except KeyboardInterrupt:
-            self.stdout.write("Manual override loop stopped.")
+        # Starting a second scheduler here would write every zone and log twice
+        raise CommandError(
+            "apply_overrides is no longer needed: apply_schedule applies manual overrides "
+            "together with schedules. Stop running this command."
+        )
@@ -0,0 +1,108 @@
+import json
+import platform
+import subprocess
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from controller import bench, synthetic
+
+# Keeps benchmark version bumps away from the cache and socket live processes watch
+BENCH_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "bench",
+    }
+}
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "Benchmark the scheduling, dashboard and API hot paths on synthetic data in a test database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--zones", type=int, default=50)
+        parser.add_argument("--schedules-per-day", type=int, default=4)
+        parser.add_argument("--overrides", type=int, default=10)
+        parser.add_argument("--log-days", type=float, default=2)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark")
+        parser.add_argument("--only", nargs="+", help="Benchmark names to run")
+        parser.add_argument("--output", help="Write the results to this JSON file")
+        parser.add_argument("--compare", help="Baseline JSON file to compare against")
+        parser.add_argument("--threshold", type=float, default=bench.DEFAULT_THRESHOLD,
+                            help="Slowdown (fraction of the fastest run) counted as a regression")
+
+    def handle(self, *args, **options):
+        params = {key: options[key] for key in ("zones", "schedules_per_day", "overrides", "log_days", "seed")}
+        if params["zones"] < 1:
+            raise CommandError("At least one zone is needed.")
+        baseline = None
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                baseline = json.load(f)
+
+        # Never touch the real database: run in a throwaway test database
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        runner.setup_test_environment()
+        old_config = runner.setup_databases()
+        try:
+            with override_settings(CACHES=BENCH_CACHES, VERSION_NOTIFY_SOCKET=None):
+                self.stdout.write("Generating data...")
+                counts = synthetic.generate(**params)
+                self.stdout.write(", ".join(f"{count} {name}" for name, count in counts.items()))
+                results = bench.run_benchmarks(repeat=options["repeat"], only=options["only"])
+        finally:
+            runner.teardown_databases(old_config)
+            runner.teardown_test_environment()
+
+        for name, result in results.items():
+            wall = result["wall_ms"]
+            self.stdout.write(
+                f"{name:30} {result['queries']:5} queries  "
+                f"median {wall['median']:9.2f}ms  min {wall['min']:9.2f}ms  "
+                f"peak {result['peak_kb']:9.1f}KB"
+            )
+
+        report = {
+            "meta": {
+                "commit": current_commit(),
+                "created": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "params": params,
+                "counts": counts,
+                "repeat": options["repeat"],
+            },
+            "results": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is not None:
+            if baseline["meta"]["params"] != params:
+                self.stdout.write(self.style.WARNING("Baseline was run with different data sizes."))
+            rows, regressions = bench.compare(baseline["results"], results, options["threshold"])
+            for row in rows:
+                line = (
+                    f"{row['name']:30} {row['old_ms']:9.2f}ms -> {row['new_ms']:9.2f}ms "
+                    f"({row['change']:+.0%})  queries {row['old_queries']} -> {row['new_queries']}"
+                )
+                self.stdout.write(self.style.ERROR(line) if row["name"] in regressions else line)
+            if regressions:
+                raise CommandError(f"Regressions: {', '.join(regressions)}")
+
+        self.stdout.write(self.style.SUCCESS("Benchmark complete!"))
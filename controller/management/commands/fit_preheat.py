@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from controller import preheat
+from controller.models import Zone
+
+
+def rate(value):
+    return f"{value:5.2f}°C/h" if value is not None else "    -    "
+
+
+class Command(BaseCommand):
+    help = "Refit the preheat heating rates from new sensor readings (the scheduler daemon also does this)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true",
+                            help="Forget the current model and refit from the last LOOKBACK_DAYS of logs")
+
+    def handle(self, *args, **options):
+        if options["full"]:
+            preheat.reset()
+        model = preheat.refit()
+        for zone in Zone.objects.filter(pk__in=list(model.rows)).order_by("name"):
+            self.stdout.write(
+                f"{zone.name:30} heat {rate(model.heat_rate(zone.pk))}  cool {rate(model.cool_rate(zone.pk))}"
+            )
+        self.stdout.write(self.style.SUCCESS("Fit complete!"))
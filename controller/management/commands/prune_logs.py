@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from controller import rollups
+
+
+class Command(BaseCommand):
+    help = "Delete TemperatureLog rows and rollups past their retention period"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=rollups.PRUNE_CHUNK_SIZE,
+                            help="Rows deleted per transaction")
+
+    def handle(self, *args, **options):
+        removed = rollups.prune(chunk_size=options["chunk_size"])
+        for tier, count in removed.items():
+            label = "raw logs" if tier == "raw" else f"{tier}s rollups"
+            self.stdout.write(f"Removed {count} {label}")
+        self.stdout.write(self.style.SUCCESS("Pruning complete!"))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from controller import rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute TemperatureLog rollups from the raw rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="Only rebuild buckets from this ISO datetime on")
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            since = parse_datetime(options["since"])
+            if since is None:
+                raise CommandError("--since must be an ISO datetime")
+
+        rollups.rebuild(since=since)
+        self.stdout.write(self.style.SUCCESS("Rollups rebuilt!"))
@@ -0,0 +1,88 @@
+import asyncio
+import random
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from controller.actuators import FakeActuator, get_actuator
+from controller.control import ControlLoop, resolve_targets
+from controller.models import Zone
+
+
+def simulated_zones(count, churn, seed):
+    """
+    Evaluator for load tests: `count` in-memory zones whose targets change
+    with probability `churn` on every tick.
+    """
+    rng = random.Random(seed)
+    zones = [Zone(pk=i, name=f"Simulated {i}") for i in range(1, count + 1)]
+    targets = {zone: 20.0 for zone in zones}
+
+    async def evaluate():
+        for zone in zones:
+            if rng.random() < churn:
+                targets[zone] = round(rng.uniform(16.0, 23.0), 1)
+        return dict(targets)
+
+    return evaluate
+
+
+class Command(BaseCommand):
+    help = "Run the asyncio control loop that drives the zone actuators"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=10.0, help="Seconds between ticks")
+        parser.add_argument("--ticks", type=int, help="Stop after this many ticks")
+        parser.add_argument("--concurrency", type=int, default=50, help="Max concurrent actuator writes")
+        parser.add_argument("--timeout", type=float, default=2.0, help="Per-write timeout in seconds")
+        parser.add_argument("--retries", type=int, default=3, help="Retries per failed write")
+        parser.add_argument("--backoff", type=float, default=0.1, help="Initial retry backoff in seconds")
+        parser.add_argument(
+            "--fake-zones", type=int,
+            help="Load test: drive this many simulated zones through the fake actuator")
+        parser.add_argument("--fake-churn", type=float, default=1.0,
+                            help="Fraction of simulated targets changing per tick")
+        parser.add_argument("--fake-latency", type=float, default=0.01, help="Simulated write latency")
+        parser.add_argument("--fake-jitter", type=float, default=0.0, help="Extra random write latency")
+        parser.add_argument("--fake-failure-rate", type=float, default=0.0,
+                            help="Fraction of simulated writes that fail")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options["fake_zones"]:
+            actuator = FakeActuator(
+                latency=options["fake_latency"],
+                jitter=options["fake_jitter"],
+                failure_rate=options["fake_failure_rate"],
+                seed=options["seed"],
+            )
+            evaluate = simulated_zones(options["fake_zones"], options["fake_churn"], options["seed"])
+        else:
+            try:
+                actuator = get_actuator()
+            except ImproperlyConfigured as e:
+                raise CommandError(e)
+            evaluate = resolve_targets
+
+        loop = ControlLoop(
+            actuator,
+            evaluate=evaluate,
+            concurrency=options["concurrency"],
+            timeout=options["timeout"],
+            retries=options["retries"],
+            backoff=options["backoff"],
+        )
+
+        def report(count, result):
+            self.stdout.write(f"tick {count}: {result.summary()}")
+
+        async def main():
+            try:
+                await loop.run(options["interval"], ticks=options["ticks"], report=report)
+            finally:
+                await actuator.close()
+
+        self.stdout.write("Starting control loop...")
+        try:
+            asyncio.run(main())
+        except KeyboardInterrupt:
+            self.stdout.write("Control loop stopped.")
@@ -1,13 +1,32 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
+from controller import synthetic
 from controller.models import Zone, ManualOverride, Schedule
 import random
+import time as clock
 from datetime import timedelta, time
 
 class Command(BaseCommand):
-    help = "Seed the database with initial zones, schedules, and optional manual overrides"
+    help = (
+        "Seed the database with initial zones, schedules, and optional manual overrides. "
+        "Pass --zones to generate a large synthetic fleet instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--zones", type=int, help="Generate this many synthetic zones")
+        parser.add_argument("--schedules-per-day", type=int, default=2, help="Schedules per zone and day")
+        parser.add_argument("--overrides", type=int, default=0, help="Zones given a manual override")
+        parser.add_argument("--log-days", type=float, default=0,
+                            help="Days of TemperatureLog history (a reading every 15 minutes per zone)")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed, same seed gives the same data")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per insert and transaction")
+        parser.add_argument("--no-rollups", action="store_true",
+                            help="Skip the log rollups (faster; build them later with rebuild_rollups)")
 
     def handle(self, *args, **kwargs):
+        if kwargs["zones"] is not None:
+            return self.generate(kwargs)
+
         self.stdout.write("Seeding database...")
 
         # --- Seed Zones ---
@@ -70,14 +89,27 @@ class Command(BaseCommand):
             if not active_overrides.exists() and random.choice([True, False]):
                 # Randomly choose +2°C or -2°C
                 override_temp = 21.0 + random.choice([-2, 2])
-                ManualOverride.objects.create(
-                    zone=zone,
-                    target_temperature=override_temp,
-                    active_from=now,
-                    active_until=now + timedelta(hours=2)
+                ManualOverride.objects.set_for_zone(
+                    zone, override_temp, until=now + timedelta(hours=2), active_from=now
                 )
                 self.stdout.write(
                     f"Created manual override for {zone.name}: {override_temp}°C (2h)"
                 )
 
         self.stdout.write(self.style.SUCCESS("Seeding complete!"))
+
+    def generate(self, options):
+        started = clock.monotonic()
+        self.stdout.write(f"Generating {options['zones']} zones...")
+        counts = synthetic.generate(
+            zones=options["zones"],
+            schedules_per_day=options["schedules_per_day"],
+            overrides=options["overrides"],
+            log_days=options["log_days"],
+            seed=options["seed"],
+            batch_size=options["batch_size"],
+            with_rollups=not options["no_rollups"],
+        )
+        for name, count in counts.items():
+            self.stdout.write(f"Created {count} {name}")
+        self.stdout.write(self.style.SUCCESS(f"Seeding complete in {clock.monotonic() - started:.1f}s!"))
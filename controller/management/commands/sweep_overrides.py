@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from controller import sweeper
+
+
+class Command(BaseCommand):
+    help = "Move expired manual overrides to the archive (the scheduler daemon also does this)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=sweeper.SWEEP_BATCH_SIZE,
+                            help="Rows moved per transaction")
+
+    def handle(self, *args, **options):
+        zone_ids = sweeper.sweep_expired(batch_size=options["batch_size"])
+        self.stdout.write(f"Archived expired overrides of {len(zone_ids)} zone(s)")
+        self.stdout.write(self.style.SUCCESS("Sweep complete!"))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controller', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='temperaturelog',
+            name='source',
+            field=models.CharField(choices=[('schedule', 'Schedule'), ('manual', 'Manual'), ('eco', 'Eco')], max_length=20),
+        ),
+    ]
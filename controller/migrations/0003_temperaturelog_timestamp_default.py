@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:45
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controller', '0002_temperaturelog_eco_source'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='temperaturelog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
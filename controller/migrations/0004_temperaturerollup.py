@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controller', '0003_temperaturelog_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TemperatureRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.PositiveIntegerField()),
+                ('bucket', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('minimum', models.FloatField()),
+                ('maximum', models.FloatField()),
+                ('total', models.FloatField()),
+                ('zone', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='controller.zone')),
+            ],
+            options={
+                'ordering': ['bucket'],
+                'unique_together': {('zone', 'resolution', 'bucket')},
+            },
+        ),
+    ]
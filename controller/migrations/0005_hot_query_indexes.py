@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controller', '0004_temperaturerollup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='manualoverride',
+            name='zone',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='controller.zone'),
+        ),
+        migrations.AlterField(
+            model_name='temperaturelog',
+            name='zone',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='controller.zone'),
+        ),
+        migrations.AddIndex(
+            model_name='manualoverride',
+            index=models.Index(fields=['zone', 'active_until', 'active_from'], name='override_zone_window_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='manualoverride',
+            index=models.Index(fields=['active_until'], name='override_until_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='temperaturelog',
+            index=models.Index(fields=['zone', 'timestamp'], name='log_zone_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='temperaturelog',
+            index=models.Index(fields=['timestamp', 'id'], name='log_timestamp_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='temperaturerollup',
+            index=models.Index(fields=['resolution', 'bucket'], name='rollup_resolution_bucket_idx'),
+        ),
+    ]
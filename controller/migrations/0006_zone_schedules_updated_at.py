@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:50
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controller', '0005_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='zone',
+            name='schedules_updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_groups(apps, schema_editor):
+    Schedule = apps.get_model("controller", "Schedule")
+    ScheduleGroup = apps.get_model("controller", "ScheduleGroup")
+    keys = Schedule.objects.values_list(
+        "start_time", "end_time", "target_temperature", "priority").distinct()
+    for start_time, end_time, target_temperature, priority in keys:
+        group = ScheduleGroup.objects.create(
+            start_time=start_time, end_time=end_time,
+            target_temperature=target_temperature, priority=priority,
+        )
+        Schedule.objects.filter(
+            start_time=start_time, end_time=end_time,
+            target_temperature=target_temperature, priority=priority,
+        ).update(group=group)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controller', '0006_zone_schedules_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('target_temperature', models.FloatField()),
+                ('priority', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['start_time', 'end_time', 'target_temperature', 'priority'],
+                'unique_together': {('start_time', 'end_time', 'target_temperature', 'priority')},
+            },
+        ),
+        migrations.AddField(
+            model_name='schedule',
+            name='group',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='schedules', to='controller.schedulegroup'),
+        ),
+        migrations.RunPython(backfill_groups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:59
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def dedupe_overrides(apps, schema_editor):
+    # Keep the override the resolver uses: the active one (latest start),
+    # else the next upcoming one, else the most recently expired one
+    ManualOverride = apps.get_model("controller", "ManualOverride")
+    now = timezone.now()
+
+    def rank(override):
+        if override.active_from <= now and (override.active_until is None or override.active_until > now):
+            return (0, -override.active_from.timestamp(), -override.pk)
+        if override.active_from > now:
+            return (1, override.active_from.timestamp(), override.pk)
+        return (2, -override.active_until.timestamp(), -override.pk)
+
+    by_zone = {}
+    for override in ManualOverride.objects.all():
+        by_zone.setdefault(override.zone_id, []).append(override)
+    duplicates = []
+    for overrides in by_zone.values():
+        overrides.sort(key=rank)
+        duplicates.extend(override.pk for override in overrides[1:])
+    ManualOverride.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controller', '0007_schedulegroup'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_overrides, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='manualoverride',
+            name='override_zone_window_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='manualoverride',
+            constraint=models.UniqueConstraint(fields=('zone',), name='override_one_per_zone'),
+        ),
+    ]
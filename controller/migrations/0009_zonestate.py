@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controller', '0008_one_override_per_zone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ZoneState',
+            fields=[
+                ('zone', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='state', serialize=False, to='controller.zone')),
+                ('target', models.FloatField()),
+                ('source', models.CharField(choices=[('schedule', 'Schedule'), ('manual', 'Manual'), ('eco', 'Eco')], max_length=20)),
+                ('valid_until', models.DateTimeField(blank=True, null=True)),
+                ('next_event_type', models.CharField(blank=True, max_length=20)),
+                ('next_target', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField()),
+                ('override', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='controller.manualoverride')),
+                ('schedule', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='controller.schedule')),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controller', '0009_zonestate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ManualOverrideArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target_temperature', models.FloatField()),
+                ('active_from', models.DateTimeField()),
+                ('active_until', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('zone', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='controller.zone')),
+            ],
+            options={
+                'ordering': ['active_until'],
+                'indexes': [models.Index(fields=['zone', 'active_until'], name='override_archive_zone_idx')],
+            },
+        ),
+    ]
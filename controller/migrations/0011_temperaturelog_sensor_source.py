@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controller', '0010_manualoverridearchive'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='temperaturelog',
+            name='source',
+            field=models.CharField(choices=[('schedule', 'Schedule'), ('manual', 'Manual'), ('eco', 'Eco'), ('sensor', 'Sensor')], max_length=20),
+        ),
+    ]
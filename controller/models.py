@@ -6,171 +6,71 @@ from django.db.models import Q
 
 
 import datetime
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Q
 from django.utils import timezone
 
+from .timeline import get_timeline
+
 
 class Zone(models.Model):
     name = models.CharField(max_length=100)
     pin = models.PositiveIntegerField(unique=True, null=True, blank=True)
     current_temperature = models.FloatField(default=20.0)
+    # Bumped whenever one of the zone's schedules changes (see controller.signals)
+    schedules_updated_at = models.DateTimeField(default=timezone.now, editable=False)
 
     def __str__(self):
         return self.name
 
+    @property
+    def timeline(self):
+        """
+        Compiled weekly schedule (cached, rebuilt when this zone's schedules change).
+        """
+        return get_timeline(self.pk)
+
     def current_schedule(self, now=None):
         """
         Returns the currently active schedule, handling overnight schedules.
         """
-        if now is None:
-            now = timezone.localtime()
-
-        weekday = now.weekday()
-        current_time = now.time()
-
-        # Get schedules for today
-        today_schedules = self.schedule_set.filter(day_of_week=weekday)
-
-        for sched in today_schedules:
-            # Normal schedule
-            if sched.start_time < sched.end_time:
-                if sched.start_time <= current_time < sched.end_time:
-                    return sched
-            else:
-                # Overnight schedule: e.g., 22:00 - 06:00
-                if current_time >= sched.start_time or current_time < sched.end_time:
-                    return sched
-
-        return None
+        return self.timeline.schedule_at(now)
 
     def next_schedule(self, now=None):
         """
         Returns the next schedule and its start datetime.
         Handles overnight schedules correctly.
         """
-        if now is None:
-            now = timezone.localtime()
+        return self.timeline.next_start(now)
 
-        today_weekday = now.weekday()
-        upcoming = []
-
-        for sched in self.schedule_set.all():
-            days_ahead = (sched.day_of_week - today_weekday) % 7
-            sched_date = now.date() + datetime.timedelta(days=days_ahead)
-            start_dt = datetime.datetime.combine(sched_date, sched.start_time)
-            start_dt = timezone.make_aware(
-                start_dt, timezone.get_current_timezone())
-
-            # If already started, skip to next occurrence
-            current_time = now.time()
-            if days_ahead == 0 and (
-                (sched.start_time < sched.end_time and sched.start_time <= current_time)
-                or (sched.start_time > sched.end_time and current_time >= sched.start_time)
-            ):
-                start_dt += datetime.timedelta(days=7)
-
-            upcoming.append((start_dt, sched))
-
-        if not upcoming:
-            return None, None
-
-        next_dt, next_sched = min(upcoming, key=lambda x: x[0])
-        return next_sched, next_dt
+    def status(self, now=None, include_manual=True):
+        """
+        Effective target, source and next event for this zone.
+        Use controller.resolver.resolve_zones when handling many zones.
+        """
+        from .resolver import resolve_zones
+        return resolve_zones([self], now, include_manual)[self.pk]
 
     def next_temperature_event(self, now=None, include_manual=True):
-        if now is None:
-            now = timezone.localtime()
-
-        events = []
-
-        # 🔹 Manual overrides
-        if include_manual:
-            manual = self.manualoverride_set.filter(
-                active_from__lte=now
-            ).filter(
-                Q(active_until__gt=now) | Q(active_until__isnull=True)
-            ).first()
-
-            if manual and manual.active_until:
-                events.append({
-                    "time": manual.active_until,
-                    "type": "manual_end",
-                    "target": None,
-                })
-
-            next_manual = self.manualoverride_set.filter(
-                active_from__gt=now
-            ).order_by('active_from').first()
-
-            if next_manual:
-                events.append({
-                    "time": next_manual.active_from,
-                    "type": "manual_start",
-                    "target": next_manual.target_temperature,
-                })
-
-        # 🔹 Schedule end
-        current = self.current_schedule(now)
-        if current:
-            # Determine end date (today or tomorrow for overnight)
-            if current.start_time < current.end_time:
-                end_date = now.date()
-            else:
-                end_date = now.date() if now.time() < current.end_time else now.date() + \
-                    datetime.timedelta(days=1)
+        return self.status(now, include_manual).next_event
 
-            end_dt = timezone.make_aware(
-                datetime.datetime.combine(end_date, current.end_time),
-                timezone.get_current_timezone()
-            )
-            if end_dt > now:
-                events.append({
-                    "time": end_dt,
-                    "type": "schedule_end",
-                    "target": None,
-                })
-
-        # 🔹 Schedule start
-        next_sched, start_dt = self.next_schedule(now)
-        if next_sched and start_dt > now:
-            events.append({
-                "time": start_dt,
-                "type": "schedule_start",
-                "target": next_sched.target_temperature,
-            })
-
-        return min(events, key=lambda e: e["time"]) if events else None
+    def current_state(self, now=None):
+        """
+        Materialized ZoneState (controller.zonestate), recomputed only when stale.
+        """
+        from .zonestate import get_states
+        return get_states([self], now)[self.pk]
 
     @property
     def get_active_target(self):
-        now = timezone.localtime()
-
-        # 1️ Active manual override wins
-        manual = self.manualoverride_set.filter(
-            active_from__lte=now
-        ).filter(
-            Q(active_until__gte=now) | Q(active_until__isnull=True)
-        ).first()
-
-        if manual:
-            return manual.target_temperature
-
-        # 2️ Active schedule
-        current = self.current_schedule(now)
-        if current:
-            return current.target_temperature
-
-        # 3️ Fallback
-        return 20.0
+        return self.current_state().target
 
     def next_temperature_change(self, now=None):
         # Next event ignoring manual overrides
         return self.next_temperature_event(now, include_manual=False)
 
     def next_target_temperature(self, now=None):
-        event = self.next_temperature_event(now)
-        return event["target"] if event and event["target"] is not None else self.get_active_target
+        return self.current_state(now).display_target
 
     @property
     def next_change(self):
@@ -178,6 +78,104 @@ class Zone(models.Model):
         return self.next_temperature_event()
 
 
+class ScheduleGroup(models.Model):
+    """
+    Schedules that share start, end, target and priority, as listed on the
+    grouped schedules page. Kept up to date by Schedule.save and the bulk
+    queryset methods; empty groups are pruned in controller.signals.
+    """
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    target_temperature = models.FloatField()
+    priority = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["start_time", "end_time", "target_temperature", "priority"]
+        unique_together = ("start_time", "end_time", "target_temperature", "priority")
+
+    @classmethod
+    def for_values(cls, start_time, end_time, target_temperature, priority=0):
+        return cls.objects.get_or_create(
+            start_time=start_time, end_time=end_time,
+            target_temperature=target_temperature, priority=priority,
+        )[0]
+
+
+class ScheduleQuerySet(models.QuerySet):
+    # unique_together key, used as the conflict target for upserts
+    KEY_FIELDS = ["zone", "day_of_week", "start_time", "end_time"]
+
+    def upsert(self, zone_ids, days, start_time, end_time, target_temperature, priority=0):
+        """
+        Creates a schedule for every zone × day, updating the target and
+        priority of rows that already exist for that slot. Set-based: one
+        INSERT ... ON CONFLICT per batch and one schedules_changed signal.
+        """
+        from .signals import groups_left, schedule_batch
+
+        zone_ids = list(zone_ids)
+        with transaction.atomic(), schedule_batch() as changed:
+            group = ScheduleGroup.for_values(start_time, end_time, target_temperature, priority)
+            # Groups of the rows the upsert overwrites
+            groups_left(self.filter(
+                zone_id__in=zone_ids, day_of_week__in=[int(day) for day in days],
+                start_time=start_time, end_time=end_time,
+            ).exclude(group=group).values_list("group_id", flat=True).distinct())
+            rows = [
+                Schedule(
+                    zone_id=zone_id, day_of_week=int(day), start_time=start_time,
+                    end_time=end_time, target_temperature=target_temperature,
+                    priority=priority, group=group,
+                )
+                for zone_id in zone_ids for day in days
+            ]
+            self.bulk_create(
+                rows, update_conflicts=True, unique_fields=self.KEY_FIELDS,
+                update_fields=["target_temperature", "priority", "group"],
+            )
+            changed.update(zone_ids)
+
+    def replace_group(self, schedules, zone_ids, days, **values):
+        """
+        Rewrites a group of schedules so it covers exactly zone_ids × days
+        with `values` (start_time, end_time, target_temperature, priority):
+        dropped slots go in one DELETE, kept rows in one UPDATE and new
+        slots in one upsert.
+        """
+        from .signals import groups_left, schedule_batch
+
+        wanted = {(zone_id, int(day)) for zone_id in zone_ids for day in days}
+        kept, removed, existing = [], [], set()
+        for sched in schedules:
+            key = (sched.zone_id, sched.day_of_week)
+            if key in wanted and key not in existing:
+                kept.append(sched.pk)
+            else:
+                removed.append(sched.pk)
+            existing.add(key)
+
+        with transaction.atomic(), schedule_batch() as changed:
+            group = ScheduleGroup.for_values(**values)
+            groups_left(sched.group_id for sched in schedules)
+            if removed:
+                self.filter(pk__in=removed).delete()
+            if kept:
+                self.filter(pk__in=kept).update(group=group, **values)
+            if wanted - existing:
+                # Rows of other groups in those slots get overwritten
+                groups_left(self.filter(
+                    zone_id__in={zone_id for zone_id, _ in wanted - existing},
+                    start_time=values["start_time"], end_time=values["end_time"],
+                ).exclude(group=group).values_list("group_id", flat=True).distinct())
+                self.bulk_create(
+                    [Schedule(zone_id=zone_id, day_of_week=day, group=group, **values)
+                     for zone_id, day in wanted - existing],
+                    update_conflicts=True, unique_fields=self.KEY_FIELDS,
+                    update_fields=["target_temperature", "priority", "group"],
+                )
+            changed.update(zone_id for zone_id, _ in existing | wanted)
+
+
 class Schedule(models.Model):
     zone = models.ForeignKey(Zone, on_delete=models.CASCADE)
     day_of_week = models.IntegerField(
@@ -195,6 +193,14 @@ class Schedule(models.Model):
     end_time = models.TimeField()
     target_temperature = models.FloatField()
     priority = models.PositiveIntegerField(default=0)
+    # Groups are only deleted once empty, so their delete can skip the
+    # collector and run as a single statement
+    group = models.ForeignKey(
+        ScheduleGroup, on_delete=models.DO_NOTHING, null=True, editable=False,
+        related_name="schedules",
+    )
+
+    objects = ScheduleQuerySet.as_manager()
 
     class Meta:
         ordering = ["priority", "start_time"]
@@ -209,28 +215,184 @@ class Schedule(models.Model):
     def day_name(self):
         return dict(self._meta.get_field('day_of_week').choices).get(self.day_of_week)
 
+    def save(self, *args, **kwargs):
+        # The group lookup and the write in one transaction, so a prune in
+        # another process can't delete the group in between
+        with transaction.atomic(savepoint=False):
+            # Pruned by controller.signals if this row was its last one
+            self._previous_group_id = self.group_id
+            self.group = ScheduleGroup.for_values(
+                self.start_time, self.end_time, self.target_temperature, self.priority)
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "group"}
+            super().save(*args, **kwargs)
+
+
+class ManualOverrideQuerySet(models.QuerySet):
+    def set_for_zone(self, zone, target, until=None, active_from=None):
+        """
+        Creates or replaces the zone's override in a single
+        INSERT ... ON CONFLICT (zone) DO UPDATE statement.
+        `zone` may be a Zone or its id.
+        """
+        from core.versions import bump_version
+        from .scheduler import VERSION_NAME
+        from .zonestate import refresh_states
+
+        override = ManualOverride(
+            zone_id=getattr(zone, "pk", zone),
+            target_temperature=target,
+            active_from=active_from or timezone.now(),
+            active_until=until,
+        )
+        self.bulk_create(
+            [override], update_conflicts=True, unique_fields=["zone"],
+            update_fields=["target_temperature", "active_from", "active_until"],
+        )
+        # bulk_create sends no post_save, so do what controller.signals would
+        # (once committed, or the scheduler could re-resolve the old override)
+        transaction.on_commit(lambda: bump_version(VERSION_NAME))
+        refresh_states([override.zone_id])
+        return override
+
+    def sweep_delete(self):
+        """
+        delete() for the sweeper. controller.signals skips its per-row
+        receivers for it (see swept()), the sweeper refreshes the zones once.
+        """
+        self.swept = True
+        return self.delete()
+
 
 class ManualOverride(models.Model):
-    zone = models.ForeignKey(Zone, on_delete=models.CASCADE)
+    # One override per zone (override_one_per_zone), which also indexes it
+    zone = models.ForeignKey(Zone, on_delete=models.CASCADE, db_index=False)
     target_temperature = models.FloatField()
     active_from = models.DateTimeField(default=timezone.now)
     active_until = models.DateTimeField(null=True, blank=True)
 
+    objects = ManualOverrideQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["zone"], name="override_one_per_zone"),
+        ]
+        indexes = [
+            # Fleet-wide scans: active_until > now OR active_until IS NULL
+            models.Index(fields=["active_until"], name="override_until_idx"),
+        ]
+
     def is_active(self, now):
         return self.active_until is None or now < self.active_until
 
 
+class ManualOverrideArchive(models.Model):
+    """
+    Overrides past their active_until, moved out of ManualOverride by
+    controller.sweeper so the live table only holds current ones.
+    """
+    zone = models.ForeignKey(Zone, on_delete=models.CASCADE, db_index=False)
+    target_temperature = models.FloatField()
+    active_from = models.DateTimeField()
+    active_until = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["active_until"]
+        indexes = [
+            # A zone's override history
+            models.Index(fields=["zone", "active_until"], name="override_archive_zone_idx"),
+        ]
+
+
+class ZoneState(models.Model):
+    """
+    A zone's effective target as last resolved, kept current by the scheduler
+    and controller.signals. Valid until `valid_until` (the next event), after
+    which readers recompute it (see controller.zonestate).
+    """
+    zone = models.OneToOneField(Zone, on_delete=models.CASCADE, primary_key=True, related_name="state")
+    target = models.FloatField()
+    source = models.CharField(
+        max_length=20,
+        choices=[("schedule", "Schedule"), ("manual", "Manual"), ("eco", "Eco")]
+    )
+    override = models.ForeignKey(ManualOverride, on_delete=models.SET_NULL, null=True, blank=True)
+    schedule = models.ForeignKey(Schedule, on_delete=models.SET_NULL, null=True, blank=True)
+    valid_until = models.DateTimeField(null=True, blank=True)
+    # The event at valid_until, as in Zone.next_temperature_event
+    next_event_type = models.CharField(max_length=20, blank=True)
+    next_target = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField()
+
+    def is_stale(self, now):
+        return (
+            (self.valid_until is not None and self.valid_until <= now)
+            or self.updated_at > now
+        )
+
+    @property
+    def next_event(self):
+        if self.valid_until is None:
+            return None
+        return {"time": self.valid_until, "type": self.next_event_type, "target": self.next_target}
+
+    @property
+    def display_target(self):
+        # Same rule as resolver.ZoneStatus.display_target
+        if self.next_target is not None:
+            return self.next_target
+        return self.target
+
+
 class TemperatureLog(models.Model):
-    zone = models.ForeignKey(Zone, on_delete=models.CASCADE)
+    # Measured room temperature, as opposed to the setpoints the scheduler logs
+    SENSOR = "sensor"
+
+    # Indexed through log_zone_timestamp_idx
+    zone = models.ForeignKey(Zone, on_delete=models.CASCADE, db_index=False)
     temperature = models.FloatField()
     source = models.CharField(
         max_length=20,
-        choices=[("schedule", "Schedule"), ("manual", "Manual")]
+        choices=[("schedule", "Schedule"), ("manual", "Manual"), ("eco", "Eco"), (SENSOR, "Sensor")]
     )
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: buffered writers (controller.logwriter) set the time of the reading
+    timestamp = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ["timestamp"]
+        indexes = [
+            # History of one zone over a time range
+            models.Index(fields=["zone", "timestamp"], name="log_zone_timestamp_idx"),
+            # Cursor pagination, exports and retention pruning
+            models.Index(fields=["timestamp", "id"], name="log_timestamp_id_idx"),
+        ]
 
     def __str__(self):
         return f"{self.zone.name} - {self.temperature}°C ({self.source})"
+
+
+class TemperatureRollup(models.Model):
+    """
+    Min/max/avg of a zone's TemperatureLog rows over one time bucket.
+    Maintained incrementally by controller.rollups.
+    """
+    zone = models.ForeignKey(Zone, on_delete=models.CASCADE)
+    resolution = models.PositiveIntegerField()  # bucket width in seconds
+    bucket = models.DateTimeField()  # bucket start
+    count = models.PositiveIntegerField(default=0)
+    minimum = models.FloatField()
+    maximum = models.FloatField()
+    total = models.FloatField()
+
+    class Meta:
+        ordering = ["bucket"]
+        unique_together = ("zone", "resolution", "bucket")
+        indexes = [
+            # Retention pruning per tier
+            models.Index(fields=["resolution", "bucket"], name="rollup_resolution_bucket_idx"),
+        ]
+
+    @property
+    def average(self):
+        return self.total / self.count if self.count else None
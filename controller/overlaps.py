@@ -0,0 +1,230 @@
+"""
+Overlap checks for schedules of the same zone.
+
+Schedule only enforces unique_together on exact times, so two rows can cover
+the same time. The forms check a submission before saving it: its rows
+against each other and against the zone's stored schedules, as
+seconds-of-week spans (timeline.schedule_intervals, so overnight rows run
+into the next day and Sunday night wraps to Monday). Each zone's spans go in
+an IntervalTree, which takes O(n log n) to build and O(log n + hits) per
+lookup, so a bulk submission over many zones and days stays cheap.
+
+settings.SCHEDULE_OVERLAP_POLICY decides what happens to overlaps:
+- "reject": the form reports them as errors and nothing is saved.
+- "priority": the submission is saved and resolve_overlaps() then rewrites
+  the zone's rows by precedence (the lower priority value wins, as in
+  timeline.precedence): losing rows are trimmed, split or deleted.
+Either way the stored schedules never overlap.
+"""
+import datetime
+from collections import defaultdict
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Schedule, ScheduleGroup
+from .timeline import (
+    SECONDS_PER_DAY, SECONDS_PER_WEEK, WeekTimeline, schedule_intervals,
+)
+
+REJECT = "reject"
+PRIORITY = "priority"
+
+# Overlaps listed in a form error before "and N more"
+MAX_REPORTED = 10
+
+DAY_NAMES = dict(Schedule._meta.get_field("day_of_week").choices)
+
+
+def policy():
+    return getattr(settings, "SCHEDULE_OVERLAP_POLICY", REJECT)
+
+
+class IntervalTree:
+    """
+    Static interval tree over (start, end, item) half-open intervals: sorted
+    by start and laid out as an implicit balanced tree (the middle of each
+    range is the node), each node storing the largest end in its subtree.
+    """
+
+    def __init__(self, intervals):
+        self.intervals = sorted(intervals, key=lambda i: i[0])
+        self.max_end = [0] * len(self.intervals)
+        self._build(0, len(self.intervals) - 1)
+
+    def _build(self, lo, hi):
+        if lo > hi:
+            return 0
+        mid = (lo + hi) // 2
+        self.max_end[mid] = max(self.intervals[mid][1], self._build(lo, mid - 1), self._build(mid + 1, hi))
+        return self.max_end[mid]
+
+    def overlapping(self, start, end):
+        """
+        Items whose interval intersects [start, end).
+        """
+        found = []
+        ranges = [(0, len(self.intervals) - 1)]
+        while ranges:
+            lo, hi = ranges.pop()
+            if lo > hi:
+                continue
+            mid = (lo + hi) // 2
+            # Nothing in this subtree reaches past `start`
+            if self.max_end[mid] <= start:
+                continue
+            ranges.append((lo, mid - 1))
+            node_start, node_end, item = self.intervals[mid]
+            # Everything to the right starts at or after this node
+            if node_start < end:
+                if node_end > start:
+                    found.append(item)
+                ranges.append((mid + 1, hi))
+        return found
+
+
+class Overlap(NamedTuple):
+    schedule: Schedule  # one of the submitted rows
+    other: Schedule     # a stored row or another submitted one
+
+
+def find_overlaps(candidates, existing=()):
+    """
+    Returns an Overlap for every pair of same-zone schedules that cover a
+    common moment, where at least one of the two is in `candidates`.
+    Each pair is reported once.
+    """
+    candidate_ids = {id(sched) for sched in candidates}
+    by_zone = defaultdict(list)
+    for sched in [*existing, *candidates]:
+        by_zone[sched.zone_id].append(sched)
+
+    overlaps = []
+    for scheds in by_zone.values():
+        tree = IntervalTree([
+            (start, end, sched) for sched in scheds for start, end in schedule_intervals(sched)
+        ])
+        seen = set()
+        for sched in scheds:
+            if id(sched) not in candidate_ids:
+                continue
+            for start, end in schedule_intervals(sched):
+                for other in tree.overlapping(start, end):
+                    pair = frozenset((id(sched), id(other)))
+                    if other is sched or pair in seen:
+                        continue
+                    seen.add(pair)
+                    overlaps.append(Overlap(sched, other))
+    return overlaps
+
+
+def check_schedules(candidates, replacing=()):
+    """
+    Overlaps that saving `candidates` (unsaved Schedules) would leave.
+    Stored rows in `replacing` are left out since the save rewrites them, as
+    are stored rows with the same slot as a candidate the upsert creates,
+    which it overwrites. (A candidate for a zone and day in `replacing` is
+    an UPDATE of that row instead, so an identical stored row does count.)
+    """
+    replacing = list(replacing)
+    replaced = {sched.pk for sched in replacing}
+    updated = {(sched.zone_id, sched.day_of_week) for sched in replacing}
+    slots = {
+        (c.zone_id, c.day_of_week, c.start_time, c.end_time) for c in candidates
+        if (c.zone_id, c.day_of_week) not in updated
+    }
+    existing = [
+        sched for sched in Schedule.objects.filter(zone_id__in={c.zone_id for c in candidates}).select_related("zone")
+        if sched.pk not in replaced
+        and (sched.zone_id, sched.day_of_week, sched.start_time, sched.end_time) not in slots
+    ]
+    return find_overlaps(candidates, existing)
+
+
+def _describe(sched):
+    return f"{DAY_NAMES[sched.day_of_week]} {sched.start_time:%H:%M}-{sched.end_time:%H:%M}"
+
+
+def describe(overlap):
+    return f"{overlap.schedule.zone}: {_describe(overlap.schedule)} overlaps {_describe(overlap.other)}"
+
+
+def _merge(spans):
+    """
+    Joins touching spans, including a Sunday night span running on into
+    Monday morning, which becomes one span past the end of the week.
+    """
+    merged = []
+    for start, end in sorted(spans):
+        if merged and merged[-1][1] == start:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    if len(merged) > 1 and merged[0][0] == 0 and merged[-1][1] == SECONDS_PER_WEEK:
+        first = merged.pop(0)
+        merged[-1] = (merged[-1][0], SECONDS_PER_WEEK + first[1])
+    return merged
+
+
+def _time(seconds):
+    seconds %= SECONDS_PER_DAY
+    return datetime.time(seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+
+def resolve_overlaps(zone_ids):
+    """
+    Rewrites the stored schedules of `zone_ids` so that none overlap, keeping
+    each moment for the schedule that takes precedence there. Rows that lose
+    time are replaced by the pieces they keep (none if fully covered).
+    Returns the number of rows replaced.
+    """
+    from .signals import schedule_batch
+
+    with transaction.atomic(), schedule_batch() as changed:
+        by_zone = defaultdict(list)
+        for sched in Schedule.objects.filter(zone_id__in=zone_ids):
+            by_zone[sched.zone_id].append(sched)
+
+        stale, pieces = [], []
+        for zone_id, scheds in by_zone.items():
+            if not find_overlaps(scheds):
+                continue
+            kept = defaultdict(list)
+            for segment in WeekTimeline.compile(scheds).segments:
+                kept[segment.schedule].append((segment.start, segment.end))
+            for sched in scheds:
+                spans = _merge(kept.get(sched, ()))
+                if spans == _merge(schedule_intervals(sched)):
+                    continue
+                stale.append(sched.pk)
+                for start, end in spans:
+                    values = dict(
+                        start_time=_time(start), end_time=_time(end),
+                        target_temperature=sched.target_temperature, priority=sched.priority,
+                    )
+                    pieces.append(Schedule(
+                        zone_id=zone_id, day_of_week=start // SECONDS_PER_DAY,
+                        group=ScheduleGroup.for_values(**values), **values,
+                    ))
+            changed.add(zone_id)
+
+        if stale:
+            # Deleted first: a piece can take the slot of another stale row
+            Schedule.objects.filter(pk__in=stale).delete()
+            Schedule.objects.bulk_create(pieces)
+    return len(stale)
+
+
+def save_schedules(save, zone_ids):
+    """
+    Runs `save` (the form's upsert/replace) and, under the "priority"
+    policy, resolves the overlaps it left, in one transaction and one
+    schedules_changed signal.
+    """
+    from .signals import schedule_batch
+
+    with transaction.atomic(), schedule_batch():
+        save()
+        if policy() == PRIORITY:
+            resolve_overlaps(zone_ids)
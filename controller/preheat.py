@@ -0,0 +1,263 @@
+"""
+Predictive preheat from learned per-zone heating rates.
+
+The fit only reads measured temperatures: TemperatureLog rows with source
+"sensor" (TemperatureLog.SENSOR). Sensors post them to
+POST /api/zones/<id>/readings/, and in-process feeds call
+logwriter.record_readings(). The other sources are the setpoints the
+scheduler logs, which jump rather than climb. Preheat stays off by default
+(PREHEAT_ENABLED) since a zone only gets a rate once its sensor has
+reported for a while.
+
+Every pair of consecutive sensor readings of a zone less than MAX_GAP apart
+is a transition: rising ones count towards the zone's heating rate, falling
+ones towards its cooling rate. A rate (°C per hour) is the least-squares
+slope through the origin of temperature change against elapsed time, with
+each transition weighted down by its age (HALF_LIFE_HOURS) so the fit
+follows the recent behaviour of the room. The model only keeps
+the per-zone sums of that fit, so a refit folds in the rows logged since the
+last one (decaying the old sums) instead of rereading the history, and
+NumPy does all zones in one pass.
+
+The scheduler refits every REFIT_INTERVAL and stores the model in the shared
+cache; other processes pick it up through the "preheat" version token, like
+the timelines. The resolver then brings a schedule start forward by the time
+the zone needs to climb from its current target to the schedule's:
+next_temperature_event reports a "preheat_start" event, and from then on the
+zone gets the schedule's target. Zones with fewer than MIN_SAMPLES
+transitions start on time, as before.
+"""
+import datetime
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+from core.versions import bump_version, get_version
+from .models import TemperatureLog
+
+DEFAULTS = {
+    "ENABLED": False,             # needs zone sensors posting readings
+    "LOOKBACK_DAYS": 7,           # history read by a first fit
+    "HALF_LIFE_HOURS": 72,        # age at which a transition counts half
+    "MAX_GAP": 60 * 60,           # seconds; longer gaps aren't transitions
+    "MIN_SAMPLES": 5,             # weighted transitions needed to trust a rate
+    "MAX_LEAD": 3 * 60 * 60,      # seconds, longest preheat
+    "REFIT_INTERVAL": 15 * 60,    # seconds between scheduler refits
+}
+
+# Rates outside this range (°C per hour) are clipped
+MIN_RATE, MAX_RATE = 0.05, 20.0
+
+# How often (seconds) a process checks whether a new model was published
+VERSION_CHECK_INTERVAL = 1.0
+VERSION_NAME = "preheat"
+
+# Columns of HeatingModel.sums
+HEAT_XY, HEAT_XX, HEAT_N, COOL_XY, COOL_XX, COOL_N = range(6)
+
+
+def options():
+    return {**DEFAULTS, **getattr(settings, "PREHEAT", {})}
+
+
+def enabled():
+    return options()["ENABLED"]
+
+
+class HeatingModel:
+    """
+    Per-zone least-squares sums, one row per zone, plus each zone's latest
+    reading so the next refit can pair it with the first new one.
+    """
+
+    def __init__(self, half_life_hours=DEFAULTS["HALF_LIFE_HOURS"], max_gap=DEFAULTS["MAX_GAP"],
+                 min_samples=DEFAULTS["MIN_SAMPLES"]):
+        self.half_life = half_life_hours * 3600
+        self.max_gap = max_gap
+        self.min_samples = min_samples
+        self.rows = {}  # zone_id -> row
+        self.sums = np.zeros((0, 6))
+        self.last_time = np.zeros(0)
+        self.last_temperature = np.full(0, np.nan)
+        self.fitted_at = None  # epoch seconds
+        self.cursor = 0  # highest TemperatureLog id folded in
+        self.heat_rates = {}
+        self.cool_rates = {}
+
+    @classmethod
+    def from_settings(cls):
+        opts = options()
+        return cls(opts["HALF_LIFE_HOURS"], opts["MAX_GAP"], opts["MIN_SAMPLES"])
+
+    def _rows_for(self, zone_ids):
+        unique, inverse = np.unique(zone_ids, return_inverse=True)
+        new = [zone_id for zone_id in unique.tolist() if zone_id not in self.rows]
+        if new:
+            first = len(self.rows)
+            self.rows.update((zone_id, first + i) for i, zone_id in enumerate(new))
+            self.sums = np.vstack([self.sums, np.zeros((len(new), 6))])
+            self.last_time = np.concatenate([self.last_time, np.zeros(len(new))])
+            self.last_temperature = np.concatenate([self.last_temperature, np.full(len(new), np.nan)])
+        return np.array([self.rows[zone_id] for zone_id in unique.tolist()], dtype=int)[inverse]
+
+    def update(self, zone_ids, times, temperatures, now):
+        """
+        Folds readings (arrays of zone id, epoch seconds and °C, in any
+        order) into the sums, after decaying them to `now` (epoch seconds).
+        """
+        if self.fitted_at is not None:
+            self.sums *= 0.5 ** (max(now - self.fitted_at, 0) / self.half_life)
+        self.fitted_at = now
+
+        if len(zone_ids):
+            rows = self._rows_for(np.asarray(zone_ids))
+            times = np.asarray(times, dtype=float)
+            temperatures = np.asarray(temperatures, dtype=float)
+
+            # Each zone's previous latest reading goes first in its run
+            known = np.unique(rows)
+            known = known[~np.isnan(self.last_temperature[known])]
+            rows = np.concatenate([known, rows])
+            times = np.concatenate([self.last_time[known], times])
+            temperatures = np.concatenate([self.last_temperature[known], temperatures])
+
+            order = np.lexsort((times, rows))
+            rows, times, temperatures = rows[order], times[order], temperatures[order]
+
+            elapsed = np.diff(times)
+            change = np.diff(temperatures)
+            pair_rows = rows[1:]
+            valid = (rows[:-1] == pair_rows) & (elapsed > 0) & (elapsed <= self.max_gap)
+            weight = 0.5 ** ((now - times[1:]) / self.half_life)
+            hours = elapsed / 3600
+            count = len(self.rows)
+            for mask, sign, xy, xx, n in (
+                (valid & (change > 0), 1, HEAT_XY, HEAT_XX, HEAT_N),
+                (valid & (change < 0), -1, COOL_XY, COOL_XX, COOL_N),
+            ):
+                r, w, h = pair_rows[mask], weight[mask], hours[mask]
+                self.sums[:, xy] += np.bincount(r, weights=w * h * sign * change[mask], minlength=count)
+                self.sums[:, xx] += np.bincount(r, weights=w * h * h, minlength=count)
+                self.sums[:, n] += np.bincount(r, weights=w, minlength=count)
+
+            # Latest reading per zone: the end of each run
+            ends = np.flatnonzero(np.append(rows[1:] != rows[:-1], True))
+            self.last_time[rows[ends]] = times[ends]
+            self.last_temperature[rows[ends]] = temperatures[ends]
+
+        self.heat_rates = self._rates(HEAT_XY, HEAT_XX, HEAT_N)
+        self.cool_rates = self._rates(COOL_XY, COOL_XX, COOL_N)
+
+    def _rates(self, xy, xx, n):
+        sums = self.sums
+        trusted = (sums[:, n] >= self.min_samples) & (sums[:, xx] > 0)
+        rates = np.clip(np.divide(sums[:, xy], sums[:, xx], out=np.zeros(len(sums)), where=trusted),
+                        MIN_RATE, MAX_RATE)
+        return {zone_id: float(rates[row]) for zone_id, row in self.rows.items() if trusted[row]}
+
+    def heat_rate(self, zone_id):
+        """
+        Learned heating rate in °C per hour, or None when not known yet.
+        """
+        return self.heat_rates.get(zone_id)
+
+    def cool_rate(self, zone_id):
+        return self.cool_rates.get(zone_id)
+
+    def lead_time(self, zone_id, current, target, max_lead=DEFAULTS["MAX_LEAD"]):
+        """
+        Seconds the zone needs to climb from `current` to `target` (at most
+        `max_lead`), or None when it doesn't need to climb or its rate
+        isn't known.
+        """
+        rate = self.heat_rate(zone_id)
+        if rate is None or target <= current:
+            return None
+        return min((target - current) / rate * 3600, max_lead)
+
+
+def cache_key():
+    # Per database, so a test run never replaces the live model
+    return f"preheat:model:{connections[DEFAULT_DB_ALIAS].settings_dict['NAME']}"
+
+
+_model = None
+_lock = threading.Lock()
+_seen_version = None
+_checked_at = 0.0
+
+
+def get_model():
+    """
+    The last published HeatingModel, or None. Reloaded from the shared
+    cache when another process published a new one.
+    """
+    global _model, _seen_version, _checked_at
+    with _lock:
+        now = time.monotonic()
+        if now - _checked_at >= VERSION_CHECK_INTERVAL:
+            _checked_at = now
+            version = get_version(VERSION_NAME)
+            if version != _seen_version:
+                _model = cache.get(cache_key())
+                _seen_version = version
+        return _model
+
+
+def publish(model, changed=True):
+    """
+    Stores `model` for every process; other processes (and the scheduler's
+    refresh) only reload it when `changed`.
+    """
+    global _model, _seen_version, _checked_at
+    cache.set(cache_key(), model, timeout=None)
+    with _lock:
+        _model = model
+        if changed:
+            _seen_version = bump_version(VERSION_NAME)
+        _checked_at = time.monotonic()
+
+
+def reset():
+    """
+    Forgets the model, here and in the shared cache.
+    """
+    global _model, _seen_version, _checked_at
+    cache.delete(cache_key())
+    with _lock:
+        _model = None
+        _seen_version = bump_version(VERSION_NAME)
+        _checked_at = time.monotonic()
+
+
+def refit(now=None):
+    """
+    Folds the sensor readings logged since the last fit (the last
+    LOOKBACK_DAYS for a first fit) into the model and publishes it.
+    Returns the model.
+    """
+    if now is None:
+        now = timezone.now()
+    model = cache.get(cache_key()) or HeatingModel.from_settings()
+    rates = model.heat_rates, model.cool_rates
+
+    logs = TemperatureLog.objects.using(DEFAULT_DB_ALIAS).filter(
+        source=TemperatureLog.SENSOR, pk__gt=model.cursor,
+    ).order_by()
+    if not model.cursor:
+        logs = logs.filter(timestamp__gte=now - datetime.timedelta(days=options()["LOOKBACK_DAYS"]))
+    rows = list(logs.values_list("pk", "zone_id", "timestamp", "temperature"))
+
+    if rows:
+        pks, zone_ids, timestamps, temperatures = zip(*rows)
+        model.update(zone_ids, [t.timestamp() for t in timestamps], temperatures, now.timestamp())
+        model.cursor = max(pks)
+    else:
+        model.update((), (), (), now.timestamp())
+    publish(model, changed=(model.heat_rates, model.cool_rates) != rates)
+    return model
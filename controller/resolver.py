@@ -0,0 +1,149 @@
+"""
+Bulk resolution of every zone's effective target.
+
+Loads zones, overrides and settings in a constant number of queries (the
+schedules come from the compiled timelines) and works out the active target,
+its source and the next temperature event for each zone in memory.
+"""
+import datetime
+from dataclasses import dataclass
+
+from django.db.models import Q
+from django.utils import timezone
+
+from core.system_settings import get_system_settings
+from . import preheat
+from .models import ManualOverride, Zone
+from .timeline import get_timelines
+
+# Used when there is no schedule, no override and no SystemSettings row yet
+FALLBACK_TEMPERATURE = 20.0
+
+
+@dataclass
+class ZoneStatus:
+    zone: Zone
+    target: float
+    source: str  # "manual", "schedule" or "eco"
+    override: ManualOverride = None
+    schedule: object = None
+    next_event: dict = None
+
+    @property
+    def display_target(self):
+        # The dashboard shows the upcoming target when one is known
+        if self.next_event and self.next_event["target"] is not None:
+            return self.next_event["target"]
+        return self.target
+
+
+def next_event(now, override=None, upcoming=None, timeline=None):
+    """
+    Returns the earliest upcoming event for a zone, in the same format as
+    Zone.next_temperature_event.
+    """
+    events = []
+
+    if override and override.active_until:
+        events.append({
+            "time": override.active_until,
+            "type": "manual_end",
+            "target": None,
+        })
+
+    if upcoming:
+        events.append({
+            "time": upcoming.active_from,
+            "type": "manual_start",
+            "target": upcoming.target_temperature,
+        })
+
+    if timeline:
+        change_dt, next_sched = timeline.next_transition(now)
+        if change_dt:
+            events.append({
+                "time": change_dt,
+                "type": "schedule_start" if next_sched else "schedule_end",
+                "target": next_sched.target_temperature if next_sched else None,
+            })
+
+    return min(events, key=lambda e: e["time"]) if events else None
+
+
+def eco_temperature():
+    system_settings = get_system_settings()
+    return system_settings.eco_temperature if system_settings else FALLBACK_TEMPERATURE
+
+
+def schedules_enabled():
+    # In manual mode only overrides and the eco temperature apply
+    system_settings = get_system_settings()
+    return system_settings is None or system_settings.mode != "manual"
+
+
+def resolve_zones(zones=None, now=None, include_manual=True):
+    """
+    Returns {zone_id: ZoneStatus} for `zones` (all zones when None).
+    """
+    if now is None:
+        now = timezone.localtime()
+    if zones is None:
+        zones = Zone.objects.all()
+    zones = list(zones)
+    zone_ids = [zone.pk for zone in zones]
+
+    active, upcoming = {}, {}
+    if include_manual and zone_ids:
+        overrides = ManualOverride.objects.filter(zone_id__in=zone_ids).filter(
+            Q(active_until__gt=now) | Q(active_until__isnull=True)
+        ).order_by("active_from")
+        for override in overrides:
+            if override.active_from <= now:
+                # The most recently started override wins
+                active[override.zone_id] = override
+            else:
+                upcoming.setdefault(override.zone_id, override)
+
+    timelines = get_timelines(zone_ids)
+    use_schedules = schedules_enabled()
+    model = preheat.get_model() if use_schedules and preheat.enabled() else None
+    max_lead = preheat.options()["MAX_LEAD"]
+
+    eco = None
+    statuses = {}
+    for zone in zones:
+        override = active.get(zone.pk)
+        timeline = timelines[zone.pk] if use_schedules else None
+        schedule = timeline.schedule_at(now) if timeline else None
+
+        if override:
+            target, source = override.target_temperature, "manual"
+        elif schedule:
+            target, source = schedule.target_temperature, "schedule"
+        else:
+            if eco is None:
+                eco = eco_temperature()
+            target, source = eco, "eco"
+
+        event = next_event(now, override, upcoming.get(zone.pk), timeline)
+        if model is not None and not override and event and event["type"] == "schedule_start":
+            # Start early enough to reach the schedule's target on time
+            lead = model.lead_time(zone.pk, target, event["target"], max_lead)
+            if lead is not None:
+                start = event["time"] - datetime.timedelta(seconds=lead)
+                if start > now:
+                    event = {"time": start, "type": "preheat_start", "target": event["target"]}
+                else:
+                    target, source = event["target"], "schedule"
+                    schedule = timeline.next_transition(now)[1]
+
+        statuses[zone.pk] = ZoneStatus(
+            zone=zone,
+            target=target,
+            source=source,
+            override=override,
+            schedule=schedule,
+            next_event=event,
+        )
+
+    return statuses
@@ -0,0 +1,198 @@
+"""
+Downsampled TemperatureLog tiers and retention.
+
+Every flushed batch of log rows is folded into TemperatureRollup buckets for
+each configured resolution (settings.TEMPERATURE_LOG_TIERS). Old raw rows and
+old buckets are pruned in chunks, and history queries are served from the
+coarsest tier that still satisfies the requested range and resolution.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import TemperatureLog, TemperatureRollup
+
+# resolution (seconds) -> retention (days, None keeps forever)
+DEFAULT_TIERS = {60: 30, 15 * 60: 365, 60 * 60: None}
+DEFAULT_RAW_RETENTION_DAYS = 7
+
+PRUNE_CHUNK_SIZE = 5000
+
+
+def tiers():
+    return dict(sorted(getattr(settings, "TEMPERATURE_LOG_TIERS", DEFAULT_TIERS).items()))
+
+
+def raw_retention_days():
+    return getattr(settings, "TEMPERATURE_LOG_RAW_RETENTION_DAYS", DEFAULT_RAW_RETENTION_DAYS)
+
+
+def bucket_start(timestamp, resolution):
+    seconds = int(timestamp.timestamp())
+    return datetime.datetime.fromtimestamp(seconds - seconds % resolution, tz=datetime.timezone.utc)
+
+
+def ingest(logs):
+    """
+    Folds TemperatureLog rows (saved or not) into every rollup tier.
+    Costs one SELECT plus at most one INSERT and one UPDATE per tier.
+    """
+    logs = list(logs)
+    if not logs:
+        return
+
+    with transaction.atomic():
+        for resolution in tiers():
+            pending = {}
+            for log in logs:
+                key = (log.zone_id, bucket_start(log.timestamp, resolution))
+                agg = pending.get(key)
+                if agg is None:
+                    pending[key] = [1, log.temperature, log.temperature, log.temperature]
+                else:
+                    agg[0] += 1
+                    agg[1] = min(agg[1], log.temperature)
+                    agg[2] = max(agg[2], log.temperature)
+                    agg[3] += log.temperature
+
+            existing = TemperatureRollup.objects.filter(
+                resolution=resolution,
+                zone_id__in={zone_id for zone_id, _ in pending},
+                bucket__gte=min(bucket for _, bucket in pending),
+                bucket__lte=max(bucket for _, bucket in pending),
+            )
+            to_update = []
+            for rollup in existing:
+                agg = pending.pop((rollup.zone_id, rollup.bucket), None)
+                if agg is None:
+                    continue
+                rollup.count += agg[0]
+                rollup.minimum = min(rollup.minimum, agg[1])
+                rollup.maximum = max(rollup.maximum, agg[2])
+                rollup.total += agg[3]
+                to_update.append(rollup)
+
+            if to_update:
+                TemperatureRollup.objects.bulk_update(
+                    to_update, ["count", "minimum", "maximum", "total"])
+            if pending:
+                TemperatureRollup.objects.bulk_create([
+                    TemperatureRollup(
+                        zone_id=zone_id, resolution=resolution, bucket=bucket,
+                        count=agg[0], minimum=agg[1], maximum=agg[2], total=agg[3],
+                    )
+                    for (zone_id, bucket), agg in pending.items()
+                ])
+
+
+def rebuild(since=None, chunk_size=PRUNE_CHUNK_SIZE):
+    """
+    Recomputes all rollups (from `since` on) from the raw rows still kept.
+    """
+    if since is not None and tiers():
+        # Start on a boundary of every tier so no bucket is only half rebuilt
+        since = bucket_start(since, max(tiers()))
+
+    with transaction.atomic():
+        rollups = TemperatureRollup.objects.all()
+        logs = TemperatureLog.objects.order_by("timestamp", "id")
+        if since is not None:
+            rollups = rollups.filter(bucket__gte=since)
+            logs = logs.filter(timestamp__gte=since)
+        rollups.delete()
+
+        batch = []
+        for log in logs.only("zone_id", "temperature", "timestamp").iterator(chunk_size=chunk_size):
+            batch.append(log)
+            if len(batch) >= chunk_size:
+                ingest(batch)
+                batch = []
+        ingest(batch)
+
+
+def _delete_in_chunks(queryset, chunk_size):
+    deleted = 0
+    while True:
+        ids = list(queryset.values_list("id", flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            deleted += queryset.model.objects.filter(id__in=ids).delete()[0]
+
+
+def prune(now=None, chunk_size=PRUNE_CHUNK_SIZE):
+    """
+    Applies the retention settings. Returns {"raw": n, resolution: n, ...}.
+    Deletes in short transactions so writers are never blocked for long.
+    """
+    if now is None:
+        now = timezone.now()
+
+    removed = {}
+    days = raw_retention_days()
+    if days is not None:
+        removed["raw"] = _delete_in_chunks(
+            TemperatureLog.objects.filter(timestamp__lt=now - datetime.timedelta(days=days)),
+            chunk_size,
+        )
+    for resolution, days in tiers().items():
+        if days is None:
+            continue
+        removed[resolution] = _delete_in_chunks(
+            TemperatureRollup.objects.filter(
+                resolution=resolution, bucket__lt=now - datetime.timedelta(days=days)),
+            chunk_size,
+        )
+    return removed
+
+
+def choose_tier(start, resolution, now=None):
+    """
+    Returns the coarsest tier no coarser than `resolution` whose retention
+    still covers `start`, or None when only raw rows will do.
+    """
+    if now is None:
+        now = timezone.now()
+
+    def covers(days):
+        return days is None or start >= now - datetime.timedelta(days=days)
+
+    best = None
+    for tier_resolution, days in tiers().items():
+        if tier_resolution <= resolution and covers(days):
+            best = tier_resolution
+
+    if best is None and not covers(raw_retention_days()):
+        # Raw rows are gone: fall back to the finest tier that still has the data
+        for tier_resolution, days in tiers().items():
+            if covers(days):
+                return tier_resolution
+    return best
+
+
+def series(zone_id, start, end, resolution=0, now=None):
+    """
+    Returns (resolution, points) for a zone's history between start and end.
+    `resolution` is the coarsest bucket width (seconds) the caller accepts;
+    0 returns raw rows. Each point is a dict with time/min/max/avg/count.
+    """
+    tier = choose_tier(start, resolution, now) if resolution else None
+
+    if tier is None:
+        logs = TemperatureLog.objects.filter(
+            zone_id=zone_id, timestamp__gte=start, timestamp__lt=end,
+        ).order_by("timestamp", "id").values_list("timestamp", "temperature")
+        return 0, [
+            {"time": timestamp, "min": temperature, "max": temperature, "avg": temperature, "count": 1}
+            for timestamp, temperature in logs
+        ]
+
+    rollups = TemperatureRollup.objects.filter(
+        zone_id=zone_id, resolution=tier, bucket__gte=bucket_start(start, tier), bucket__lt=end,
+    )
+    return tier, [
+        {"time": r.bucket, "min": r.minimum, "max": r.maximum, "avg": r.average, "count": r.count}
+        for r in rollups
+    ]
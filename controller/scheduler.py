@@ -0,0 +1,238 @@
+"""
+Event driven scheduler daemon.
+
+Instead of polling every zone on a fixed interval, the scheduler keeps a heap
+of each zone's next transition (schedule start/end, preheat start, override
+start/expiry) and sleeps until the earliest one. Edits made in other
+processes bump the shared version tokens, and every bump pokes the daemon's
+VersionListener socket, so it wakes up right away rather than polling the
+tokens; without the socket it falls back to checking them every
+poll_interval. Only zones whose effective target actually changed are
+written. Every refreshed zone still goes to the
+TemperatureLog writer, and all zones go to it again every
+HEARTBEAT_CHECK_INTERVAL: the writer's deadband drops the repeats and its
+heartbeat keeps a row per zone every so often.
+"""
+import heapq
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from core.sqlite import serialized_write
+from core.system_settings import VERSION_NAME as SETTINGS_VERSION
+from core.versions import VersionListener, bump_version, get_version
+from . import preheat
+from .logwriter import TemperatureLogWriter
+from .models import Zone
+from .resolver import resolve_zones
+from .sweeper import sweep_expired
+from .timeline import VERSION_NAME as SCHEDULES_VERSION, check_version
+from .zonestate import save_states
+
+# Bumped by controller.signals when zones or overrides change
+VERSION_NAME = "controller"
+# Bumped here whenever zones were written, for the live dashboard (controller.live)
+STATE_VERSION = "zone_state"
+# Seconds between offering every zone's target to the log writer's heartbeat
+HEARTBEAT_CHECK_INTERVAL = 60
+# Longest sleep with nothing due, in case a notification got lost
+MAX_SLEEP = 5 * 60
+
+
+def current_versions():
+    return (
+        get_version(VERSION_NAME), get_version(SCHEDULES_VERSION),
+        get_version(SETTINGS_VERSION), get_version(preheat.VERSION_NAME),
+    )
+
+
+class Scheduler:
+    def __init__(self, poll_interval=5.0, log=None, log_writer=None):
+        # How often (seconds) to check the version tokens for edits when
+        # version notifications aren't available
+        self.poll_interval = poll_interval
+        self.log = log or (lambda message: None)
+        self.log_writer = log_writer or TemperatureLogWriter.from_settings()
+        self.queue = []      # heap of (when, zone_id)
+        self.due = {}        # zone_id -> when, to skip stale heap entries
+        self.applied = {}    # zone_id -> (target, source) last written
+        self.states = {}     # zone_id -> ZoneState contents last stored
+        self.versions = None
+        self.refit_at = 0.0  # time.monotonic() of the next preheat refit
+        self.heartbeat_at = 0.0  # time.monotonic() of the next heartbeat check
+
+    def schedule(self, zone_id, when):
+        if when is None:
+            self.due.pop(zone_id, None)
+            return
+        if self.due.get(zone_id) != when:
+            self.due[zone_id] = when
+            heapq.heappush(self.queue, (when, zone_id))
+
+    def next_wakeup(self):
+        """
+        Returns the earliest pending transition time, or None.
+        """
+        while self.queue:
+            when, zone_id = self.queue[0]
+            if self.due.get(zone_id) == when:
+                return when
+            heapq.heappop(self.queue)
+        return None
+
+    def refresh(self, zones=None, now=None):
+        """
+        Re-resolves `zones` (all zones when None), writes the ones whose target
+        or source changed, stores their ZoneState and queues their next transitions.
+        Returns the number of zones written.
+        """
+        if now is None:
+            now = timezone.localtime()
+        if zones is None:
+            zones = list(Zone.objects.all())
+            # Forget zones that were deleted
+            known = {zone.pk for zone in zones}
+            for zone_id in set(self.due) - known:
+                del self.due[zone_id]
+            for zone_id in set(self.applied) - known:
+                del self.applied[zone_id]
+            for zone_id in set(self.states) - known:
+                del self.states[zone_id]
+
+        statuses = resolve_zones(zones, now)
+        changed = [status for status in statuses.values() if self.has_changed(status)]
+        self.apply(changed)
+        save_states(statuses.values(), now, written=self.states)
+
+        for zone_id, status in statuses.items():
+            self.applied[zone_id] = (status.target, status.source)
+            # The writer decides whether it is worth a row
+            self.log_writer.record(zone_id, status.target, status.source, now)
+            self.schedule(zone_id, status.next_event["time"] if status.next_event else None)
+        return len(changed)
+
+    def has_changed(self, status):
+        previous = self.applied.get(status.zone.pk)
+        if previous is None:
+            # First sight of this zone: only write when the stored value is off
+            return status.zone.current_temperature != status.target
+        return previous != (status.target, status.source)
+
+    def apply(self, statuses):
+        if not statuses:
+            return
+
+        # The zone updates go in one write transaction, queued behind other
+        # writers in this process
+        with serialized_write():
+            for status in statuses:
+                zone = status.zone
+                Zone.objects.filter(pk=zone.pk).update(current_temperature=status.target)
+                zone.current_temperature = status.target
+                self.log(f"{zone.name} -> {status.target}°C ({status.source})")
+            # Not before other processes can read the new values
+            transaction.on_commit(lambda: bump_version(STATE_VERSION))
+
+    def run_pending(self, now=None):
+        """
+        Handles every transition that is due at `now`.
+        """
+        if now is None:
+            now = timezone.localtime()
+
+        zone_ids = set()
+        while self.queue and self.queue[0][0] <= now:
+            when, zone_id = heapq.heappop(self.queue)
+            if self.due.get(zone_id) == when:
+                del self.due[zone_id]
+                zone_ids.add(zone_id)
+
+        if zone_ids:
+            # Overrides ending now move to the archive; refreshed just below
+            zone_ids |= sweep_expired(now, refresh=False)
+            return self.refresh(Zone.objects.filter(pk__in=zone_ids), now)
+        return 0
+
+    def maybe_heartbeat(self, now=None):
+        """
+        Offers every zone's applied target to the log writer again every
+        HEARTBEAT_CHECK_INTERVAL, so zones without transitions still get
+        their heartbeat rows.
+        """
+        if self.log_writer.heartbeat is None or time.monotonic() < self.heartbeat_at:
+            return
+        self.heartbeat_at = time.monotonic() + HEARTBEAT_CHECK_INTERVAL
+        if now is None:
+            now = timezone.now()
+        for zone_id, (target, source) in self.applied.items():
+            self.log_writer.record(zone_id, target, source, now)
+
+    def check_versions(self):
+        """
+        Returns True when schedules, overrides, zones or settings changed since last call.
+        """
+        versions = current_versions()
+        changed = versions != self.versions
+        self.versions = versions
+        if changed:
+            check_version()
+        return changed
+
+    def maybe_refit(self):
+        """
+        Refits the preheat model every REFIT_INTERVAL. A model with new
+        rates bumps its version, so the next check_versions() refreshes.
+        """
+        if not preheat.enabled() or time.monotonic() < self.refit_at:
+            return
+        self.refit_at = time.monotonic() + preheat.options()["REFIT_INTERVAL"]
+        model = preheat.refit()
+        self.log(f"Preheat rates known for {len(model.heat_rates)} zone(s)")
+
+    def sleep_timeout(self, max_sleep):
+        """
+        Seconds until something is due: the next transition, a log flush,
+        the heartbeat check or a preheat refit. At most `max_sleep`.
+        """
+        deadlines = [max_sleep]
+        wakeup = self.next_wakeup()
+        if wakeup is not None:
+            deadlines.append((wakeup - timezone.now()).total_seconds())
+        now = time.monotonic()
+        if self.log_writer.buffer:
+            deadlines.append(self.log_writer.flushed_at + self.log_writer.flush_interval - now)
+        if self.log_writer.heartbeat is not None:
+            deadlines.append(self.heartbeat_at - now)
+        if preheat.enabled():
+            deadlines.append(self.refit_at - now)
+        return max(min(deadlines), 0)
+
+    def run(self, iterations=None, listener=None):
+        # Opened first so edits made during startup still wake the loop
+        listener = listener or VersionListener()
+        max_sleep = MAX_SLEEP if listener.available else self.poll_interval
+        try:
+            self.maybe_refit()
+            self.check_versions()
+            # Overrides that ended while the daemon was down
+            sweep_expired(refresh=False)
+            self.refresh()
+            self.maybe_heartbeat()
+
+            while iterations is None or iterations > 0:
+                if iterations is not None:
+                    iterations -= 1
+
+                listener.wait(self.sleep_timeout(max_sleep))
+
+                if self.check_versions():
+                    self.refresh()
+                else:
+                    self.run_pending()
+                self.maybe_heartbeat()
+                self.log_writer.maybe_flush()
+                self.maybe_refit()
+        finally:
+            listener.close()
+            self.log_writer.close()
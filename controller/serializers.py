@@ -5,12 +5,16 @@ from .models import Zone, Schedule, ManualOverride, TemperatureLog
 class ManualOverrideSerializer(serializers.ModelSerializer):
     class Meta:
         model = ManualOverride
-        fields = ['id', 'zone', 'target_temperature', 'active', 'created_at']
-        read_only_fields = ['id', 'created_at']
+        fields = ['id', 'zone', 'target_temperature', 'active_from', 'active_until']
+        read_only_fields = ['id']
 
 
 class ZoneSerializer(serializers.ModelSerializer):
-    manual_override = ManualOverrideSerializer(read_only=True)
+    # From the materialized ZoneState (see ZoneViewSet)
+    target_temperature = serializers.FloatField(source='state.target', read_only=True)
+    source = serializers.CharField(source='state.source', read_only=True)
+    valid_until = serializers.DateTimeField(source='state.valid_until', read_only=True)
+    manual_override = ManualOverrideSerializer(source='state.override', read_only=True)
 
     class Meta:
         model = Zone
@@ -20,6 +24,8 @@ class ZoneSerializer(serializers.ModelSerializer):
             'pin',
             'current_temperature',
             'target_temperature',
+            'source',
+            'valid_until',
             'manual_override'
         ]
         read_only_fields = ['id']
@@ -28,10 +34,15 @@ class ZoneSerializer(serializers.ModelSerializer):
 class ScheduleSerializer(serializers.ModelSerializer):
     class Meta:
         model = Schedule
-        fields = ['id', 'zone', 'day_of_week', 'time', 'target_temperature']
+        fields = ['id', 'zone', 'day_of_week', 'start_time', 'end_time', 'target_temperature', 'priority']
         read_only_fields = ['id']
 
 
+class SensorReadingSerializer(serializers.Serializer):
+    temperature = serializers.FloatField()
+    timestamp = serializers.DateTimeField(required=False)
+
+
 class TemperatureLogSerializer(serializers.ModelSerializer):
     class Meta:
         model = TemperatureLog
@@ -0,0 +1,142 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from core.models import SystemSettings
+from core.versions import bump_version
+from .models import ManualOverride, Schedule, ScheduleGroup, Zone
+from .scheduler import VERSION_NAME
+from .timeline import invalidate_timelines
+from .zonestate import refresh_states
+
+# Sent once per batch of Schedule writes with zone_ids: the zones whose
+# schedules changed, and group_ids: the ScheduleGroups rows moved out of,
+# which may be empty now. Bulk paths (bulk_create, QuerySet.update) send it
+# themselves since they bypass post_save.
+schedules_changed = Signal()
+
+_batch = threading.local()
+
+
+@contextmanager
+def schedule_batch():
+    """
+    Collects the zones touched by Schedule writes inside the block (yielded
+    as a set the caller can add to) and sends schedules_changed once at the
+    end instead of once per row. Nested batches join the outer one.
+    """
+    zone_ids = getattr(_batch, "zone_ids", None)
+    if zone_ids is not None:
+        yield zone_ids
+        return
+
+    zone_ids = _batch.zone_ids = set()
+    group_ids = _batch.group_ids = set()
+    try:
+        yield zone_ids
+    finally:
+        _batch.zone_ids = _batch.group_ids = None
+    if zone_ids or group_ids:
+        schedules_changed.send(sender=Schedule, zone_ids=zone_ids, group_ids=group_ids)
+
+
+def groups_left(group_ids):
+    """
+    Records ScheduleGroups that rows of the current batch moved out of, pruned
+    at its end if empty. Outside a batch they are pruned right away.
+    """
+    group_ids = {group_id for group_id in group_ids if group_id is not None}
+    batch = getattr(_batch, "group_ids", None)
+    if batch is not None:
+        batch.update(group_ids)
+    elif group_ids:
+        prune_groups(group_ids)
+
+
+def prune_groups(group_ids):
+    # Only the groups a write touched: an anti-join over every group would
+    # grow with the table
+    ScheduleGroup.objects.filter(pk__in=group_ids, schedules__isnull=True).delete()
+
+
+@receiver(post_save, sender=Schedule)
+@receiver(post_delete, sender=Schedule)
+def schedule_saved(sender, instance, **kwargs):
+    if isinstance(kwargs.get("origin"), Zone):
+        # Cascade from a zone delete, handled by zone_deleted
+        return
+    # A deleted row leaves its group, a saved one the group it had before
+    group_ids = {instance.group_id, getattr(instance, "_previous_group_id", None)}
+    zone_ids = getattr(_batch, "zone_ids", None)
+    if zone_ids is not None:
+        zone_ids.add(instance.zone_id)
+        groups_left(group_ids)
+    else:
+        schedules_changed.send(sender=Schedule, zone_ids={instance.zone_id}, group_ids=group_ids)
+
+
+@receiver(schedules_changed)
+def invalidate_schedules(sender, zone_ids, group_ids=(), **kwargs):
+    invalidate_timelines(zone_ids)
+    # update() so the Zone post_save (and a scheduler wakeup) isn't triggered twice
+    Zone.objects.filter(pk__in=zone_ids).update(schedules_updated_at=timezone.now())
+    group_ids = {group_id for group_id in group_ids if group_id is not None}
+    if group_ids:
+        prune_groups(group_ids)
+    refresh_states(zone_ids)
+
+
+def swept(origin):
+    # Deleted by ManualOverrideQuerySet.sweep_delete, which bumps and
+    # refreshes once for the whole batch
+    return getattr(origin, "swept", False)
+
+
+@receiver(post_save, sender=Zone)
+@receiver(post_delete, sender=Zone)
+@receiver(post_save, sender=ManualOverride)
+@receiver(post_delete, sender=ManualOverride)
+def controller_changed(sender, instance, **kwargs):
+    if swept(kwargs.get("origin")):
+        return
+    # Wakes the scheduler daemon, once the change is visible to it
+    transaction.on_commit(lambda: bump_version(VERSION_NAME))
+
+
+@receiver(post_save, sender=Zone)
+def zone_saved(sender, instance, **kwargs):
+    refresh_states([instance.pk])
+
+
+@receiver(pre_delete, sender=Zone)
+def zone_deleting(sender, instance, **kwargs):
+    # The groups its schedules are in, to prune once they are gone
+    instance._schedule_group_ids = set(
+        Schedule.objects.filter(zone=instance).values_list("group_id", flat=True).distinct())
+
+
+@receiver(post_delete, sender=Zone)
+def zone_deleted(sender, instance, **kwargs):
+    # Its schedules went with it without sending schedules_changed
+    invalidate_timelines([instance.pk])
+    groups_left(getattr(instance, "_schedule_group_ids", ()))
+
+
+@receiver(post_save, sender=ManualOverride)
+@receiver(post_delete, sender=ManualOverride)
+def override_changed(sender, instance, **kwargs):
+    origin = kwargs.get("origin")
+    if not isinstance(origin, Zone) and not swept(origin):
+        refresh_states([instance.zone_id])
+
+
+@receiver(post_save, sender=SystemSettings)
+@receiver(post_delete, sender=SystemSettings)
+def settings_changed(sender, instance, **kwargs):
+    # Eco temperature and mode apply to every zone. Once committed, so the
+    # save doesn't hold the write lock over every zone's refresh
+    transaction.on_commit(refresh_states)
@@ -0,0 +1,61 @@
+"""
+Moves expired ManualOverride rows to ManualOverrideArchive.
+
+The scheduler daemon sweeps whenever it wakes for an override's end (and on
+startup), so the live table only ever holds current and upcoming overrides.
+The sweep_overrides command does the same from cron when no daemon runs.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from core.sqlite import serialized_write
+from core.versions import bump_version
+from .models import ManualOverride, ManualOverrideArchive
+from .zonestate import refresh_states
+
+# Rows moved per transaction
+SWEEP_BATCH_SIZE = 500
+
+ARCHIVED_FIELDS = ("zone_id", "target_temperature", "active_from", "active_until")
+
+
+def sweep_expired(now=None, batch_size=SWEEP_BATCH_SIZE, refresh=True):
+    """
+    Archives every override whose active_until is at or before `now`,
+    `batch_size` rows per transaction, and returns the ids of the zones
+    that had one. Their ZoneState is recomputed unless `refresh` is False
+    (for callers that refresh those zones themselves).
+    """
+    from .scheduler import VERSION_NAME
+
+    if now is None:
+        now = timezone.now()
+    zone_ids = set()
+    # Checked first so an idle sweep never takes the write lock
+    if not ManualOverride.objects.filter(active_until__lte=now).exists():
+        return zone_ids
+    while True:
+        with serialized_write():
+            # override_until_idx range scan
+            expired = list(
+                ManualOverride.objects.filter(active_until__lte=now)
+                .order_by("active_until").values("pk", *ARCHIVED_FIELDS)[:batch_size]
+            )
+            if not expired:
+                break
+            ManualOverrideArchive.objects.bulk_create([
+                ManualOverrideArchive(archived_at=now, **{field: row[field] for field in ARCHIVED_FIELDS})
+                for row in expired
+            ])
+            pks = [row["pk"] for row in expired]
+            # One DELETE (ZoneState.override is nulled by the cascade), without
+            # the per-row receivers: the zones are refreshed once below instead
+            ManualOverride.objects.filter(pk__in=pks).sweep_delete()
+            transaction.on_commit(lambda: bump_version(VERSION_NAME))
+        zone_ids.update(row["zone_id"] for row in expired)
+        if len(expired) < batch_size:
+            break
+
+    if zone_ids and refresh:
+        refresh_states(zone_ids, now)
+    return zone_ids
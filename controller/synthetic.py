@@ -0,0 +1,178 @@
+"""
+Synthetic data for benchmarks and load testing.
+
+Generates N zones × M schedules per day × K overrides × L days of
+temperature logs, reproducibly from a seed. Rows go in with bulk_create in
+batches, through the same paths the app uses for bulk writes (schedule_batch
+for schedules, the override upsert, rollups.ingest for logs) so caches,
+ZoneState rows and rollups stay consistent.
+"""
+import datetime
+import random
+
+from django.db import transaction
+from django.utils import timezone
+
+from core.versions import bump_version
+from . import rollups
+from .models import ManualOverride, Schedule, ScheduleGroup, TemperatureLog, Zone
+from .scheduler import VERSION_NAME
+from .signals import schedule_batch
+from .zonestate import refresh_states
+
+# Rows per INSERT
+BATCH_SIZE = 1000
+# Seconds between generated log readings per zone
+LOG_INTERVAL = 15 * 60
+TARGETS = (18.0, 19.0, 20.0, 21.0, 22.0)
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def day_slots(per_day):
+    """
+    `per_day` non-overlapping (start, end) times spread over a day.
+    """
+    if not 0 < per_day <= 720:
+        raise ValueError("Between 1 and 720 schedules per day are supported.")
+    step = 24 * 60 // per_day
+    length = max(step // 2, 1)
+    slots = []
+    for i in range(per_day):
+        start = i * step
+        slots.append((
+            datetime.time(start // 60, start % 60),
+            datetime.time((start + length) // 60, (start + length) % 60),
+        ))
+    return slots
+
+
+def create_zones(count, rng, prefix="Zone", batch_size=BATCH_SIZE):
+    """
+    Creates `count` zones (bulk_create, so no per-zone signals) and returns them.
+    """
+    taken = Zone.objects.count()
+    zones = [
+        Zone(name=f"{prefix} {taken + i}", current_temperature=round(rng.uniform(16.0, 23.0), 1))
+        for i in range(1, count + 1)
+    ]
+    Zone.objects.bulk_create(zones, batch_size=batch_size)
+    # SQLite returns the new primary keys, but not every backend does
+    if zones and zones[0].pk is None:
+        zones = list(Zone.objects.filter(name__in=[zone.name for zone in zones]))
+    return zones
+
+
+def create_schedules(zones, per_day, rng, batch_size=BATCH_SIZE):
+    """
+    Gives every zone `per_day` schedules on each day of the week.
+    """
+    if not zones or not per_day:
+        return 0
+    slots = day_slots(per_day)
+    groups = {}
+
+    def rows():
+        for zone in zones:
+            for day in range(7):
+                for start, end in slots:
+                    target = rng.choice(TARGETS)
+                    group = groups.get((start, end, target))
+                    if group is None:
+                        group = groups[start, end, target] = ScheduleGroup.for_values(start, end, target)
+                    yield Schedule(zone=zone, day_of_week=day, start_time=start, end_time=end,
+                                   target_temperature=target, group=group)
+
+    created = 0
+    with transaction.atomic(), schedule_batch() as changed:
+        for batch in _batches(rows(), batch_size):
+            Schedule.objects.bulk_create(batch)
+            created += len(batch)
+        changed.update(zone.pk for zone in zones)
+    return created
+
+
+def create_overrides(zones, count, rng, now=None):
+    """
+    Gives `count` random zones (at most one each) a manual override, about
+    half of them active now and the rest starting later today.
+    """
+    if now is None:
+        now = timezone.now()
+    chosen = rng.sample(list(zones), min(count, len(zones)))
+    overrides = []
+    for zone in chosen:
+        start = now - datetime.timedelta(minutes=rng.randrange(0, 120))
+        if rng.random() < 0.5:
+            start = now + datetime.timedelta(minutes=rng.randrange(1, 12 * 60))
+        overrides.append(ManualOverride(
+            zone=zone, target_temperature=rng.choice(TARGETS),
+            active_from=start, active_until=start + datetime.timedelta(hours=rng.randrange(1, 5)),
+        ))
+    if overrides:
+        # Same upsert as ManualOverride.objects.set_for_zone, for many zones
+        ManualOverride.objects.bulk_create(
+            overrides, update_conflicts=True, unique_fields=["zone"],
+            update_fields=["target_temperature", "active_from", "active_until"],
+        )
+        bump_version(VERSION_NAME)
+        refresh_states([zone.pk for zone in chosen])
+    return len(overrides)
+
+
+def create_logs(zones, days, rng, now=None, interval=LOG_INTERVAL, batch_size=BATCH_SIZE,
+                with_rollups=True):
+    """
+    Writes a sensor reading every `interval` seconds per zone for the last `days`
+    days (a random walk around each zone's current temperature) and, unless
+    `with_rollups` is False, folds them into the rollups. Skipping them more
+    than doubles the insert rate; rollups.rebuild() can add them afterwards.
+    """
+    if now is None:
+        now = timezone.now()
+    steps = int(days * 24 * 60 * 60 // interval)
+    if not zones or steps <= 0:
+        return 0
+
+    def rows():
+        temps = {zone.pk: zone.current_temperature for zone in zones}
+        for step in range(steps, 0, -1):
+            timestamp = now - datetime.timedelta(seconds=step * interval)
+            for zone in zones:
+                temps[zone.pk] = round(min(max(temps[zone.pk] + rng.uniform(-0.3, 0.3), 12.0), 26.0), 1)
+                yield TemperatureLog(zone=zone, temperature=temps[zone.pk],
+                                     source=TemperatureLog.SENSOR, timestamp=timestamp)
+
+    created = 0
+    for batch in _batches(rows(), batch_size):
+        with transaction.atomic():
+            TemperatureLog.objects.bulk_create(batch)
+            if with_rollups:
+                rollups.ingest(batch)
+        created += len(batch)
+    return created
+
+
+def generate(zones=5, schedules_per_day=2, overrides=0, log_days=0, seed=0, now=None,
+             batch_size=BATCH_SIZE, with_rollups=True):
+    """
+    Creates a full synthetic data set and returns the counts per model.
+    The same arguments always produce the same data.
+    """
+    rng = random.Random(seed)
+    created = create_zones(zones, rng, batch_size=batch_size)
+    return {
+        "zones": len(created),
+        "schedules": create_schedules(created, schedules_per_day, rng, batch_size=batch_size),
+        "overrides": create_overrides(created, overrides, rng, now),
+        "logs": create_logs(created, log_days, rng, now, batch_size=batch_size, with_rollups=with_rollups),
+    }
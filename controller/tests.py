@@ -1,3 +1,1578 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import Q, Sum
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from core.models import SystemSettings
+from core.system_settings import invalidate_system_settings
+from core.versions import VersionListener, bump_version, get_version
+from .actuators import Actuator, ActuatorError, FakeActuator, get_actuator
+from .adjust import MAX_TEMP, MIN_TEMP, AdjustmentCoalescer, apply_adjustment
+from . import bench, live, overlaps, preheat, sweeper, synthetic
+from .control import ControlLoop
+from .forms import ScheduleForm
+from .live import Hub
+from .logwriter import TemperatureLogWriter
+from . import rollups
+from .models import (
+    ManualOverride, ManualOverrideArchive, Schedule, ScheduleGroup, TemperatureLog, TemperatureRollup, Zone, ZoneState,
+)
+from .resolver import FALLBACK_TEMPERATURE, resolve_zones
+from .scheduler import MAX_SLEEP, VERSION_NAME as CONTROLLER_VERSION, Scheduler
+from .signals import schedules_changed
+from .timeline import VERSION_NAME as TIMELINE_VERSION, WeekTimeline, invalidate_timelines
+from .views import GroupedScheduleListView
+from .weekgrid import SOURCES, build_week_grid
+from .zonestate import get_states, refresh_states
+
+
+def local_dt(day, hour, minute=0):
+    # 2025-12-15 is a Monday
+    return timezone.make_aware(
+        datetime.datetime(2025, 12, 15 + day, hour, minute),
+        timezone.get_current_timezone(),
+    )
+
+
+class ControllerTestCase(TestCase):
+    def setUp(self):
+        # Rolled back rows don't send signals, so start from empty caches
+        invalidate_timelines()
+        invalidate_system_settings()
+        preheat.reset()
+        self.zone = Zone.objects.create(name="Living Room")
+
+    def add_schedule(self, day, start, end, target, priority=0, zone=None):
+        return Schedule.objects.create(
+            zone=zone or self.zone,
+            day_of_week=day,
+            start_time=datetime.time(*start),
+            end_time=datetime.time(*end),
+            target_temperature=target,
+            priority=priority,
+        )
+
+
+class WeekTimelineTests(ControllerTestCase):
+    def test_active_schedule_and_gaps(self):
+        morning = self.add_schedule(0, (6, 0), (9, 0), 21.0)
+
+        self.assertEqual(self.zone.current_schedule(local_dt(0, 6)), morning)
+        self.assertEqual(self.zone.current_schedule(local_dt(0, 8, 59)), morning)
+        self.assertIsNone(self.zone.current_schedule(local_dt(0, 9)))
+        self.assertIsNone(self.zone.current_schedule(local_dt(1, 7)))
+
+    def test_version_is_published_on_commit(self):
+        before = get_version(TIMELINE_VERSION)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Schedule.objects.upsert([self.zone.pk], [0], datetime.time(6), datetime.time(9), 21.0)
+            # Other processes must not reload before the rows are visible
+            self.assertEqual(get_version(TIMELINE_VERSION), before)
+
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_version(TIMELINE_VERSION), before)
+
+    def test_overnight_schedule_runs_into_next_day(self):
+        night = self.add_schedule(6, (22, 0), (6, 0), 18.0)
+
+        self.assertEqual(self.zone.current_schedule(local_dt(6, 23)), night)
+        # Sunday night wraps around to Monday morning
+        self.assertEqual(self.zone.current_schedule(local_dt(0, 5)), night)
+        self.assertIsNone(self.zone.current_schedule(local_dt(6, 5)))
+
+    def test_lowest_priority_value_wins_overlaps(self):
+        self.add_schedule(0, (6, 0), (12, 0), 19.0, priority=5)
+        urgent = self.add_schedule(0, (8, 0), (10, 0), 23.0, priority=1)
+
+        self.assertEqual(self.zone.current_schedule(local_dt(0, 9)).target_temperature, 23.0)
+        self.assertEqual(self.zone.current_schedule(local_dt(0, 11)).target_temperature, 19.0)
+
+        change, sched = self.zone.timeline.next_transition(local_dt(0, 7))
+        self.assertEqual((change, sched), (local_dt(0, 8), urgent))
+
+    def test_next_transition_wraps_week(self):
+        self.add_schedule(0, (6, 0), (9, 0), 21.0)
+
+        change, sched = self.zone.timeline.next_transition(local_dt(0, 10))
+        self.assertEqual(change, local_dt(7, 6))
+        self.assertEqual(sched.target_temperature, 21.0)
+
+        change, sched = self.zone.timeline.next_transition(local_dt(0, 7))
+        self.assertEqual((change, sched), (local_dt(0, 9), None))
+
+    def test_next_temperature_event_uses_timeline(self):
+        self.add_schedule(0, (6, 0), (9, 0), 21.0)
+        self.add_schedule(0, (18, 0), (22, 0), 22.0)
+
+        event = self.zone.next_temperature_event(local_dt(0, 12))
+        self.assertEqual(event["type"], "schedule_start")
+        self.assertEqual(event["time"], local_dt(0, 18))
+        self.assertEqual(event["target"], 22.0)
+
+        event = self.zone.next_temperature_event(local_dt(0, 19))
+        self.assertEqual(event["type"], "schedule_end")
+        self.assertEqual(event["time"], local_dt(0, 22))
+
+    def test_timeline_rebuilt_on_schedule_change(self):
+        sched = self.add_schedule(0, (6, 0), (9, 0), 21.0)
+        self.assertIsNotNone(self.zone.current_schedule(local_dt(0, 7)))
+
+        with self.assertNumQueries(0):
+            self.zone.current_schedule(local_dt(0, 7))
+
+        sched.delete()
+        self.assertIsNone(self.zone.current_schedule(local_dt(0, 7)))
+
+    def test_compile_splits_week_wraparound(self):
+        sched = Schedule(pk=1, day_of_week=6, start_time=datetime.time(12, 0),
+                         end_time=datetime.time(12, 0), target_temperature=20.0)
+        timeline = WeekTimeline.compile([sched])
+
+        self.assertEqual(len(timeline.segments), 2)
+        self.assertEqual(timeline.next_transition(local_dt(0, 6)), (local_dt(0, 12), None))
+        self.assertEqual(timeline.next_start(local_dt(0, 6)), (sched, local_dt(6, 12)))
+
+
+class ResolverTests(ControllerTestCase):
+    def test_override_beats_schedule_beats_eco(self):
+        other = Zone.objects.create(name="Office")
+        idle = Zone.objects.create(name="Attic")
+        self.add_schedule(0, (6, 0), (9, 0), 21.0)
+        self.add_schedule(0, (6, 0), (9, 0), 19.5, zone=other)
+        ManualOverride.objects.create(
+            zone=self.zone, target_temperature=24.0,
+            active_from=local_dt(0, 5), active_until=local_dt(0, 8),
+        )
+
+        statuses = resolve_zones(now=local_dt(0, 7))
+
+        self.assertEqual((statuses[self.zone.pk].target, statuses[self.zone.pk].source), (24.0, "manual"))
+        self.assertEqual(statuses[self.zone.pk].next_event["type"], "manual_end")
+        self.assertEqual((statuses[other.pk].target, statuses[other.pk].source), (19.5, "schedule"))
+        self.assertEqual((statuses[idle.pk].target, statuses[idle.pk].source), (FALLBACK_TEMPERATURE, "eco"))
+
+    def test_manual_mode_ignores_schedules(self):
+        self.add_schedule(0, (6, 0), (9, 0), 21.0)
+        SystemSettings.objects.create(mode="manual", eco_temperature=15.0)
+
+        status = resolve_zones(now=local_dt(0, 7))[self.zone.pk]
+
+        self.assertEqual((status.target, status.source), (15.0, "eco"))
+
+    def test_upcoming_override_is_next_event(self):
+        ManualOverride.objects.create(
+            zone=self.zone, target_temperature=23.0, active_from=local_dt(0, 10),
+        )
+
+        event = self.zone.next_temperature_event(local_dt(0, 7))
+
+        self.assertEqual(event["type"], "manual_start")
+        self.assertEqual(event["target"], 23.0)
+
+
+class DashboardQueryBudgetTests(ControllerTestCase):
+    # Session, user and zones joined with their materialized state
+    QUERY_BUDGET = 3
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user("admin", password="secret"))
+
+    def test_dashboard_query_count_is_constant(self):
+        for i in range(50):
+            zone = Zone.objects.create(name=f"Zone {i}")
+            self.add_schedule(i % 7, (6, 0), (9, 0), 21.0, zone=zone)
+            ManualOverride.objects.create(zone=zone, target_temperature=22.0)
+
+        with self.assertNumQueries(self.QUERY_BUDGET):
+            response = self.client.get(reverse("controller:dashboard"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["statuses"]), 51)
+
+
+class SchedulerTests(ControllerTestCase):
+    def test_writes_only_changed_zones(self):
+        steady = Zone.objects.create(name="Office", current_temperature=FALLBACK_TEMPERATURE)
+        self.add_schedule(0, (6, 0), (9, 0), 21.0)
+        scheduler = Scheduler()
+
+        self.assertEqual(scheduler.refresh(now=local_dt(0, 7)), 1)
+        self.zone.refresh_from_db()
+        self.assertEqual(self.zone.current_temperature, 21.0)
+        # Both zones are logged though: that is the writer's call
+        self.assertEqual(len(scheduler.log_writer.buffer), 2)
+
+        # Nothing changed: zones + overrides, no writes (settings are cached)
+        with self.assertNumQueries(2):
+            self.assertEqual(scheduler.refresh(now=local_dt(0, 7, 5)), 0)
+        self.assertEqual(len(scheduler.log_writer.buffer), 2)
+        # Until the heartbeat is due
+        scheduler.refresh(now=local_dt(0, 8))
+        self.assertEqual(len(scheduler.log_writer.buffer), 4)
+
+    def test_apply_overrides_is_retired(self):
+        with self.assertRaisesMessage(CommandError, "apply_schedule applies manual overrides"):
+            call_command("apply_overrides")
+
+    def test_edits_bump_the_version_on_commit(self):
+        for edit in (
+            lambda: Zone.objects.create(name="Office"),
+            lambda: ManualOverride.objects.create(zone=self.zone, target_temperature=23.0),
+            lambda: ManualOverride.objects.all().delete(),
+        ):
+            before = get_version(CONTROLLER_VERSION)
+            with self.captureOnCommitCallbacks(execute=True):
+                edit()
+                self.assertEqual(get_version(CONTROLLER_VERSION), before)
+            self.assertNotEqual(get_version(CONTROLLER_VERSION), before)
+
+    def test_run_sleeps_until_notified(self):
+        path = os.path.join(tempfile.mkdtemp(), "versions.sock")
+        with override_settings(VERSION_NOTIFY_SOCKET=path):
+            listener = VersionListener()
+            scheduler = Scheduler(log_writer=TemperatureLogWriter(heartbeat=None, flush_interval=60))
+            # Nothing due: only a notification ends the sleep
+            self.assertEqual(scheduler.sleep_timeout(MAX_SLEEP), MAX_SLEEP)
+
+            threading.Timer(0.2, bump_version, args=[CONTROLLER_VERSION]).start()
+            started = time.monotonic()
+            scheduler.run(iterations=1, listener=listener)
+
+        self.assertTrue(0.2 <= time.monotonic() - started < 5)
+        self.assertFalse(os.path.exists(path))
+
+    def test_heartbeat_logs_unchanged_zones(self):
+        writer = TemperatureLogWriter(deadband=0.1, heartbeat=15 * 60, flush_size=100, flush_interval=60)
+        scheduler = Scheduler(log_writer=writer)
+        scheduler.refresh(now=local_dt(0, 7))
+
+        for minutes, kept in ((5, 1), (14, 1), (15, 2), (20, 2), (30, 3)):
+            scheduler.heartbeat_at = 0.0
+            scheduler.maybe_heartbeat(now=local_dt(0, 7, minutes))
+            self.assertEqual(len(writer.buffer), kept)
+        self.assertEqual({row.source for row in writer.buffer}, {"eco"})
+
+    def test_heap_wakes_at_next_transition(self):
+        self.add_schedule(0, (6, 0), (9, 0), 21.0)
+        ManualOverride.objects.create(
+            zone=self.zone, target_temperature=24.0,
+            active_from=local_dt(0, 7), active_until=local_dt(0, 8),
+        )
+        scheduler = Scheduler()
+        scheduler.refresh(now=local_dt(0, 6, 30))
+
+        self.assertEqual(scheduler.next_wakeup(), local_dt(0, 7))
+        self.assertEqual(scheduler.run_pending(local_dt(0, 6, 59)), 0)
+
+        self.assertEqual(scheduler.run_pending(local_dt(0, 7)), 1)
+        self.assertEqual(scheduler.next_wakeup(), local_dt(0, 8))
+
+        self.assertEqual(scheduler.run_pending(local_dt(0, 8)), 1)
+        # The ended override was archived on the way
+        self.assertFalse(ManualOverride.objects.exists())
+        self.assertEqual(ManualOverrideArchive.objects.get().active_until, local_dt(0, 8))
+        scheduler.log_writer.flush()
+        self.assertEqual(
+            list(TemperatureLog.objects.values_list("temperature", "source")),
+            [(21.0, "schedule"), (24.0, "manual"), (21.0, "schedule")],
+        )
+
+
+class TemperatureLogWriterTests(ControllerTestCase):
+    def test_deadband_and_heartbeat(self):
+        writer = TemperatureLogWriter(deadband=0.5, heartbeat=600, flush_size=100, flush_interval=60)
+        start = local_dt(0, 6)
+
+        def record(minutes, temperature, source="schedule"):
+            return writer.record(self.zone.pk, temperature, source, start + datetime.timedelta(minutes=minutes))
+
+        self.assertTrue(record(0, 20.0))
+        self.assertFalse(record(1, 20.4))
+        self.assertTrue(record(2, 20.6))
+        self.assertTrue(record(3, 20.6, source="manual"))
+        self.assertFalse(record(5, 20.6, source="manual"))
+        self.assertTrue(record(13, 20.6, source="manual"))
+
+        self.assertFalse(TemperatureLog.objects.exists())
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(writer.flush(), 4)
+        inserts = [q for q in queries if q["sql"].startswith('INSERT INTO "controller_temperaturelog"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(
+            list(TemperatureLog.objects.values_list("timestamp", flat=True))[-1],
+            start + datetime.timedelta(minutes=13),
+        )
+
+    def test_sensor_readings_do_not_break_setpoint_deadband(self):
+        writer = TemperatureLogWriter(deadband=0.5, heartbeat=600, flush_size=100, flush_interval=60)
+        start = local_dt(0, 6)
+        kept = [
+            writer.record(self.zone.pk, temperature, source, start + datetime.timedelta(minutes=minutes))
+            for minutes, temperature, source in (
+                (0, 20.0, "schedule"), (1, 18.2, "sensor"), (2, 20.0, "schedule"),
+                (3, 18.3, "sensor"), (4, 18.9, "sensor"),
+            )
+        ]
+        self.assertEqual(kept, [True, True, False, False, True])
+
+    def test_flushes_when_buffer_is_full(self):
+        writer = TemperatureLogWriter(flush_size=3, flush_interval=60)
+        for i in range(7):
+            writer.record(self.zone.pk, 18.0 + i, "schedule")
+
+        self.assertEqual(TemperatureLog.objects.count(), 6)
+        self.assertEqual(writer.close(), 1)
+        self.assertEqual(TemperatureLog.objects.count(), 7)
+
+    def test_failed_flush_is_logged_and_retried(self):
+        writer = TemperatureLogWriter(flush_size=10, flush_interval=60, max_buffer=20)
+        locked = mock.patch.object(
+            TemperatureLog.objects, "bulk_create", side_effect=OperationalError("database is locked"))
+
+        with locked, self.assertLogs("controller.logwriter") as logs:
+            for i in range(25):
+                writer.record(self.zone.pk, 10.0 + i, "schedule")
+        self.assertIn("Failed to write 10 TemperatureLog rows", logs.output[0])
+        # Bounded while flushes keep failing: the oldest rows go first
+        self.assertIn("dropped 1 rows", logs.output[-2])
+        self.assertEqual(len(writer.buffer), 20)
+        self.assertEqual(writer.buffer[0].temperature, 15.0)
+
+        self.assertEqual(writer.close(), 20)
+        self.assertEqual(TemperatureLog.objects.count(), 20)
+
+    def test_rows_of_deleted_zones_are_dropped(self):
+        other = Zone.objects.create(name="Other")
+        writer = TemperatureLogWriter(flush_size=100, flush_interval=60)
+        writer.record(self.zone.pk, 18.0, "schedule")
+        writer.record(other.pk, 19.0, "schedule")
+        other.delete()
+
+        # SQLite checks the foreign key at commit, which a TestCase never reaches
+        errors = [IntegrityError("FOREIGN KEY constraint failed")]
+        write = writer.write
+
+        def failing_write():
+            if errors:
+                raise errors.pop()
+            write()
+
+        with mock.patch.object(writer, "write", failing_write), \
+                self.assertLogs("controller.logwriter", "WARNING"):
+            self.assertEqual(writer.close(), 1)
+        self.assertEqual(list(TemperatureLog.objects.values_list("zone_id", flat=True)), [self.zone.pk])
+
+
+class ControlLoopTests(SimpleTestCase):
+    def zones(self, count):
+        return {Zone(pk=i, name=f"Zone {i}"): 20.0 + i for i in range(1, count + 1)}
+
+    def test_writes_run_concurrently(self):
+        targets = self.zones(100)
+        actuator = FakeActuator(latency=0.05)
+
+        async def evaluate():
+            return targets
+
+        loop = ControlLoop(actuator, evaluate=evaluate, concurrency=100)
+        result = asyncio.run(loop.tick())
+
+        self.assertEqual((result.written, result.failed), (100, 0))
+        # 100 sequential writes would take 5 seconds
+        self.assertLess(result.duration, 1.0)
+        self.assertEqual(actuator.state[3], 23.0)
+
+        # Unchanged targets are not written again
+        self.assertEqual(asyncio.run(loop.tick()).written, 0)
+
+    def test_failed_and_slow_writes_retry_then_give_up(self):
+        class FlakyActuator(FakeActuator):
+            async def write(self, zone, target):
+                self.writes += 1
+                if zone.pk == 1:
+                    await asyncio.sleep(1)
+                elif self.writes < 3:
+                    raise ActuatorError("flaky")
+                self.state[zone.pk] = target
+
+        actuator = FlakyActuator()
+        zones = self.zones(2)
+
+        async def evaluate():
+            return zones
+
+        loop = ControlLoop(actuator, evaluate=evaluate, timeout=0.01, retries=2, backoff=0)
+        with self.assertLogs("controller.control", "WARNING"):
+            result = asyncio.run(loop.tick())
+
+        self.assertEqual((result.written, result.failed), (1, 1))
+        self.assertEqual(actuator.state, {2: 22.0})
+
+    def test_actuator_backend_must_be_configured(self):
+        with self.assertRaises(TypeError):
+            Actuator()
+        with override_settings(CONTROLLER_ACTUATOR=""), self.assertRaises(ImproperlyConfigured):
+            get_actuator()
+        with override_settings(DEBUG=False), self.assertLogs("controller.actuators", "WARNING"):
+            self.assertIsInstance(get_actuator("controller.actuators.FakeActuator"), FakeActuator)
+
+    def test_unexpected_errors_fail_only_their_zone(self):
+        class BrokenActuator(FakeActuator):
+            async def write(self, zone, target):
+                if zone.pk == 1:
+                    raise OSError("serial port gone")
+                await super().write(zone, target)
+
+        actuator = BrokenActuator(latency=0)
+        zones = self.zones(3)
+        evaluations, results = [], []
+
+        async def evaluate():
+            evaluations.append(None)
+            if len(evaluations) == 1:
+                raise RuntimeError("database is locked")
+            return zones
+
+        loop = ControlLoop(actuator, evaluate=evaluate, retries=1, backoff=0)
+        with self.assertLogs("controller.control") as logs:
+            asyncio.run(loop.run(0, ticks=2, report=lambda count, result: results.append(result)))
+
+        [result] = results
+        self.assertEqual((result.written, result.failed), (2, 1))
+        self.assertEqual(actuator.state, {2: 22.0, 3: 23.0})
+        self.assertIn("Control loop tick failed", logs.output[0])
+        self.assertTrue(any("OSError: serial port gone" in line for line in logs.output))
+
+
+@override_settings(
+    TEMPERATURE_LOG_TIERS={60: 30, 3600: None},
+    TEMPERATURE_LOG_RAW_RETENTION_DAYS=7,
+)
+class RollupTests(ControllerTestCase):
+    def write_logs(self, start, temperatures, step_minutes=10):
+        writer = TemperatureLogWriter(flush_size=1000, flush_interval=3600)
+        for i, temperature in enumerate(temperatures):
+            writer.record(self.zone.pk, temperature, "schedule", start + datetime.timedelta(minutes=step_minutes * i))
+        writer.flush()
+
+    def test_rollups_are_maintained_incrementally(self):
+        start = local_dt(0, 6)
+        self.write_logs(start, [18.0, 19.0, 20.0])
+        self.write_logs(start + datetime.timedelta(minutes=30), [22.0, 21.0])
+
+        hourly = TemperatureRollup.objects.get(resolution=3600)
+        self.assertEqual((hourly.count, hourly.minimum, hourly.maximum, hourly.average), (5, 18.0, 22.0, 20.0))
+        self.assertEqual(TemperatureRollup.objects.filter(resolution=60).count(), 5)
+
+        rollups.rebuild()
+        hourly = TemperatureRollup.objects.get(resolution=3600)
+        self.assertEqual((hourly.count, hourly.total), (5, 100.0))
+
+    def test_series_uses_coarsest_tier_that_fits(self):
+        start = local_dt(0, 6)
+        self.write_logs(start, [18.0, 20.0, 22.0])
+        now = start + datetime.timedelta(days=1)
+        end = start + datetime.timedelta(hours=2)
+
+        self.assertEqual(rollups.series(self.zone.pk, start, end, 0, now)[0], 0)
+        self.assertEqual(rollups.series(self.zone.pk, start, end, 900, now)[0], 60)
+        tier, points = rollups.series(self.zone.pk, start, end, 86400, now)
+        self.assertEqual((tier, len(points), points[0]["avg"]), (3600, 1, 20.0))
+
+        # Past the minute tier's retention only the hourly buckets are left
+        later = start + datetime.timedelta(days=60)
+        self.assertEqual(rollups.choose_tier(start, 60, later), 3600)
+
+    def test_series_endpoint(self):
+        self.client.force_login(User.objects.create_user("admin", password="secret"))
+        self.write_logs(local_dt(0, 6), [18.0, 20.0, 22.0])
+
+        response = self.client.get("/api/logs/series/", {
+            "zone": self.zone.pk, "start": "2025-12-15T06:00", "end": "2025-12-15T08:00", "resolution": 3600,
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["resolution"], 3600)
+        self.assertEqual(response.json()["points"][0]["count"], 3)
+        self.assertEqual(self.client.get("/api/logs/series/", {"zone": "x"}).status_code, 400)
+
+    def test_prune_applies_retention_in_chunks(self):
+        start = local_dt(0, 6)
+        self.write_logs(start, [18.0 + i for i in range(10)], step_minutes=1)
+
+        removed = rollups.prune(now=start + datetime.timedelta(days=8), chunk_size=3)
+
+        self.assertEqual(removed, {"raw": 10, 60: 0})
+        self.assertFalse(TemperatureLog.objects.exists())
+        self.assertEqual(TemperatureRollup.objects.filter(resolution=3600).count(), 1)
+
+
+class TemperatureLogApiTests(ControllerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user("admin", password="secret"))
+        self.other = Zone.objects.create(name="Office")
+        start = local_dt(0, 6)
+        TemperatureLog.objects.bulk_create([
+            TemperatureLog(
+                zone=self.zone if i % 2 else self.other,
+                temperature=18.0 + i,
+                source="manual" if i % 3 == 0 else "schedule",
+                # Pairs of rows share a timestamp to exercise the id tiebreak
+                timestamp=start + datetime.timedelta(minutes=i // 2),
+            )
+            for i in range(25)
+        ])
+
+    def test_cursor_pages_cover_every_row_once(self):
+        seen = []
+        url = "/api/logs/?page_size=4"
+        while url:
+            with self.assertNumQueries(3):  # session, user, page
+                data = self.client.get(url).json()
+            seen.extend(row["id"] for row in data["results"])
+            url = data["next"]
+
+        self.assertEqual(sorted(seen), list(TemperatureLog.objects.values_list("id", flat=True)))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_filters(self):
+        data = self.client.get("/api/logs/", {
+            "zone": self.zone.pk, "source": "schedule",
+            "start": "2025-12-15T06:02", "end": "2025-12-15T06:08",
+        }).json()
+
+        rows = TemperatureLog.objects.filter(
+            zone=self.zone, source="schedule",
+            timestamp__gte=local_dt(0, 6, 2), timestamp__lt=local_dt(0, 6, 8),
+        )
+        self.assertEqual([r["id"] for r in data["results"]], [r.id for r in rows.order_by("timestamp", "id")])
+        self.assertEqual(self.client.get("/api/logs/", {"start": "yesterday"}).status_code, 400)
+
+    def test_unknown_source_is_rejected(self):
+        for url in ("/api/logs/", "/api/logs/export/"):
+            response = self.client.get(url, {"source": "schedules"})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("source", response.json())
+
+    def test_streaming_exports(self):
+        response = self.client.get("/api/logs/export/", {"zone": self.other.pk})
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 13)
+        self.assertEqual(json.loads(lines[0])["zone_id"], self.other.pk)
+
+        response = self.client.get("/api/logs/export/", {"fmt": "csv"})
+        rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual(rows[0], ["id", "zone_id", "temperature", "source", "timestamp"])
+        self.assertEqual(len(rows), 26)
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN output is SQLite specific")
+class BulkScheduleEditTests(ControllerTestCase):
+    # 6 loads for the form and group, overlap check (group rows and the
+    # zones' schedules), 2 savepoints, schedule group get_or_create
+    # (4 when new), DELETE (with its SELECT and ZoneState unlink), UPDATE,
+    # groups of the rows the INSERT overwrites, INSERT, zone stamp UPDATE,
+    # empty group DELETE, ZoneState refresh of the 220 zones (3 loads,
+    # 2 upsert batches), release
+    EDIT_STATEMENT_BUDGET = 28
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user("admin", password="secret"))
+        self.changed = []
+        schedules_changed.connect(self.on_changed)
+        self.addCleanup(schedules_changed.disconnect, self.on_changed)
+
+    def on_changed(self, sender, zone_ids, **kwargs):
+        self.changed.append(set(zone_ids))
+
+    def make_group(self, zone_count, days):
+        zones = Zone.objects.bulk_create([Zone(name=f"Zone {i}") for i in range(zone_count)])
+        Schedule.objects.upsert([z.pk for z in zones], days, datetime.time(6), datetime.time(9), 20.0)
+        self.changed.clear()
+        return zones, list(Schedule.objects.filter(zone__in=zones).values_list("id", flat=True))
+
+    def edit(self, ids, zones, days, target=21.0):
+        url = reverse("controller:grouped_schedule_bulk_edit", args=[",".join(map(str, ids))])
+        return self.client.post(url, {
+            "zones": [z.pk for z in zones],
+            "days_of_week": days,
+            "start_time": "06:30",
+            "end_time": "09:00",
+            "target_temperature": target,
+            "priority": 0,
+        })
+
+    def test_group_edit_updates_drops_and_adds_slots(self):
+        zones, ids = self.make_group(3, [0, 1])
+        extra = Zone.objects.create(name="Extra")
+
+        response = self.edit(ids, [zones[0], zones[1], extra], [1, 2])
+
+        self.assertEqual(response.status_code, 302)
+        slots = set(Schedule.objects.values_list("zone_id", "day_of_week", "start_time", "target_temperature"))
+        self.assertEqual(slots, {
+            (zone.pk, day, datetime.time(6, 30), 21.0)
+            for zone in [zones[0], zones[1], extra] for day in [1, 2]
+        })
+        # Edited rows keep their primary key
+        self.assertTrue(Schedule.objects.filter(pk__in=ids, zone=zones[0], day_of_week=1).exists())
+        self.assertEqual(self.changed, [{z.pk for z in zones} | {extra.pk}])
+
+    def test_form_save_upserts_existing_slots(self):
+        zones, _ = self.make_group(2, [0])
+        form = ScheduleForm(data={
+            "zones": [z.pk for z in zones], "days_of_week": [0, 1], "start_time": "06:00",
+            "end_time": "09:00", "target_temperature": 22.5, "priority": 1,
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+
+        form.save()
+
+        self.assertEqual(Schedule.objects.filter(zone__in=zones).count(), 4)
+        self.assertEqual(set(Schedule.objects.values_list("target_temperature", "priority")), {(22.5, 1)})
+        self.assertEqual(len(self.changed), 1)
+
+    def test_thousand_schedule_edit_statement_count(self):
+        # 200 zones x 5 days; the edit moves 20 zones out, 20 in and changes the target
+        zones, ids = self.make_group(200, [0, 1, 2, 3, 4])
+        added = Zone.objects.bulk_create([Zone(name=f"New {i}") for i in range(20)])
+        self.assertEqual(len(ids), 1000)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.edit(ids, zones[20:] + added, [0, 1, 2, 3, 4])
+        self.assertEqual(response.status_code, 302)
+
+        statements = [
+            q["sql"] for q in ctx.captured_queries
+            if "django_session" not in q["sql"] and "auth_user" not in q["sql"]
+        ]
+        # Used to be one statement per row (~1,000)
+        self.assertLessEqual(len(statements), self.EDIT_STATEMENT_BUDGET, "\n".join(statements))
+        self.assertEqual(Schedule.objects.filter(target_temperature=21.0).count(), 1000)
+        self.assertEqual(len(self.changed), 1)
+
+
+class ScheduleGroupTests(ControllerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user("admin", password="secret"))
+
+    def test_groups_follow_save_and_delete(self):
+        first = self.add_schedule(0, (6, 0), (9, 0), 21.0)
+        second = self.add_schedule(1, (6, 0), (9, 0), 21.0)
+        self.assertEqual(first.group, second.group)
+
+        second.target_temperature = 19.0
+        second.save()
+        self.assertEqual(ScheduleGroup.objects.count(), 2)
+
+        first.delete()
+        self.assertEqual(list(ScheduleGroup.objects.values_list("target_temperature", flat=True)), [19.0])
+
+    def test_only_touched_groups_are_pruned(self):
+        # Left empty by some other path: not this write's business
+        stray = ScheduleGroup.for_values(datetime.time(1), datetime.time(2), 15.0)
+        Schedule.objects.upsert([self.zone.pk], [0], datetime.time(6), datetime.time(9), 20.0)
+        old = Schedule.objects.get().group
+
+        with CaptureQueriesContext(connection) as ctx:
+            Schedule.objects.upsert([self.zone.pk], [0], datetime.time(6), datetime.time(9), 21.0)
+        deletes = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith('DELETE FROM "controller_schedulegroup"')]
+        self.assertEqual(len(deletes), 1)
+        self.assertIn(str(old.pk), deletes[0])
+
+        self.assertFalse(ScheduleGroup.objects.filter(pk=old.pk).exists())
+        self.assertTrue(ScheduleGroup.objects.filter(pk=stray.pk).exists())
+        other = Zone.objects.create(name="Office")
+        Schedule.objects.upsert([other.pk], [2], datetime.time(1), datetime.time(2), 16.0)
+        other.delete()
+        self.assertEqual(set(ScheduleGroup.objects.values_list("pk", flat=True)),
+                         {stray.pk, Schedule.objects.get().group_id})
+
+    def test_bulk_edit_moves_rows_to_new_group(self):
+        Schedule.objects.upsert([self.zone.pk], [0, 1], datetime.time(6), datetime.time(9), 20.0)
+        Schedule.objects.replace_group(
+            Schedule.objects.all(), [self.zone.pk], [0, 1],
+            start_time=datetime.time(7), end_time=datetime.time(9), target_temperature=20.0, priority=0,
+        )
+
+        group = ScheduleGroup.objects.get()
+        self.assertEqual(group.start_time, datetime.time(7))
+        self.assertEqual(group.schedules.count(), 2)
+
+    def test_list_is_paginated_with_flat_query_count(self):
+        zones = Zone.objects.bulk_create([Zone(name=f"Zone {i}") for i in range(5)])
+        for i in range(60):
+            start = datetime.time(i // 3, i % 3 * 15)
+            end = datetime.time(i // 3, i % 3 * 15 + 10)
+            Schedule.objects.upsert([z.pk for z in zones], range(7), start, end, 20.0)
+        url = reverse("controller:grouped_schedule_list")
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        first_page = len(ctx.captured_queries)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url, {"page": 2})
+
+        self.assertEqual(len(ctx.captured_queries), first_page)
+        rows = response.context["grouped_schedules"]
+        self.assertEqual(len(rows), GroupedScheduleListView.paginate_by)
+        self.assertEqual(response.context["paginator"].count, 60)
+        self.assertEqual(rows[0]["day_names"][0], "Monday")
+        self.assertEqual(len(rows[0]["zones"]), 5)
+        self.assertEqual(len(rows[0]["schedule_ids"].split(",")), 35)
+
+
+class WeekGridTests(ControllerTestCase):
+    def test_matches_resolver_at_every_slot(self):
+        other = Zone.objects.create(name="Office")
+        self.add_schedule(0, (6, 0), (9, 0), 21.0)
+        self.add_schedule(0, (7, 0), (8, 0), 23.0, priority=1)
+        self.add_schedule(0, (7, 30), (7, 45), 19.0)
+        self.add_schedule(6, (22, 0), (6, 0), 17.0)  # runs into Monday
+        self.add_schedule(2, (12, 0), (13, 0), 22.0, zone=other)
+        SystemSettings.objects.create(eco_temperature=16.0)
+        ManualOverride.objects.create(
+            zone=other, target_temperature=25.0,
+            active_from=local_dt(2, 12, 30), active_until=local_dt(3, 1),
+        )
+
+        now = local_dt(2, 10)
+        grid = build_week_grid([self.zone.pk, other.pk], step=15 * 60, now=now)
+
+        self.assertEqual(grid.targets.shape, (2, 7 * 24 * 4))
+        for slot, offset in enumerate(grid.offsets):
+            moment = grid.start + datetime.timedelta(seconds=int(offset))
+            statuses = resolve_zones(now=moment)
+            for row, zone_id in enumerate(grid.zone_ids):
+                self.assertEqual(grid.targets[row, slot], statuses[zone_id].target, moment)
+                self.assertEqual(SOURCES[grid.sources[row, slot]], statuses[zone_id].source, moment)
+
+    def test_manual_mode_ignores_schedules(self):
+        self.add_schedule(0, (6, 0), (9, 0), 21.0)
+        SystemSettings.objects.create(mode="manual", eco_temperature=15.0)
+
+        grid = build_week_grid([self.zone.pk], step=3600, now=local_dt(0, 0))
+
+        self.assertTrue((grid.row(self.zone.pk) == 15.0).all())
+
+    def test_bulk_endpoint(self):
+        self.client.force_login(User.objects.create_user("admin", password="secret"))
+        self.add_schedule(0, (6, 0), (9, 0), 21.0)
+        url = reverse("controller:api_zones_grid")
+
+        data = self.client.get(url, {"step": 60}).json()
+        targets = data["zones"][str(self.zone.pk)]["targets"]
+        self.assertEqual(len(targets), 7 * 24)
+        self.assertEqual(targets[6:9], [21.0, 21.0, 21.0])
+        self.assertEqual(self.client.get(url, {"step": 0}).status_code, 400)
+
+        data = self.client.get(
+            reverse("controller:api_zone_schedule", args=[self.zone.pk]), {"grid": 60}).json()
+        self.assertEqual(data["grid"]["targets"], targets)
+
+
+class LiveHubTests(ControllerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.computed = 0
+
+        def compute():
+            self.computed += 1
+            return live.snapshot()
+
+        self.hub = Hub(compute=compute, autostart=False)
+
+    def test_diff_keeps_only_changed_fields(self):
+        old = {1: {"target": 20.0, "source": "eco"}, 2: {"target": 18.0, "source": "eco"}}
+        new = {1: {"target": 21.0, "source": "eco"}, 3: {"target": 19.0, "source": "eco"}}
+
+        self.assertEqual(live.diff(old, new), (
+            {1: {"target": 21.0}, 3: {"target": 19.0, "source": "eco"}}, [2],
+        ))
+
+    def test_one_computation_fans_out_to_every_client(self):
+        clients = [self.hub.subscribe() for _ in range(10)]
+        self.assertEqual(clients[0][1][self.zone.pk]["source"], "eco")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ManualOverride.objects.create(zone=self.zone, target_temperature=23.0)
+        event = self.hub.poll()
+
+        self.assertEqual(self.computed, 2)
+        self.assertEqual(event["zones"][self.zone.pk]["source"], "manual")
+        for subscriber, _ in clients:
+            self.assertEqual(subscriber.get(0), event)
+        # Nothing changed since: no recompute
+        self.assertIsNone(self.hub.poll())
+        self.assertEqual(self.computed, 2)
+
+    def test_stream_sends_snapshot_then_deltas(self):
+        stream = self.hub.stream(keepalive=0.01)
+        self.assertTrue(next(stream).startswith("retry:"))
+        self.assertIn('"Living Room"', next(stream))
+
+        self.assertEqual(next(stream), ": keepalive\n\n")
+        with self.captureOnCommitCallbacks(execute=True):
+            ManualOverride.objects.create(zone=self.zone, target_temperature=23.0)
+        self.hub.poll()
+        chunk = next(stream)
+        self.assertTrue(chunk.startswith("event: delta\n"))
+        self.assertEqual(json.loads(chunk.split("data: ", 1)[1])["zones"][str(self.zone.pk)]["target"], 23.0)
+
+        stream.close()
+        self.assertFalse(self.hub.subscribers)
+
+    def test_failed_refresh_is_logged_and_flagged(self):
+        failing = threading.Event()
+
+        def compute():
+            if failing.is_set():
+                raise RuntimeError("database is locked")
+            return {self.zone.pk: {"target": 20.0}}
+
+        hub = Hub(compute=compute, poll_interval=0.01, refresh_interval=0, autostart=False)
+        subscriber, _ = hub.subscribe()
+        failing.set()
+        thread = threading.Thread(target=hub.run)
+        with self.assertLogs("controller.live", "ERROR") as logs:
+            thread.start()
+            self.assertEqual(subscriber.get(5), live.STALE)
+            failing.clear()
+            # Back to normal: every client gets a fresh snapshot
+            self.assertIsNone(subscriber.get(5))
+        hub.unsubscribe(subscriber)
+        thread.join(5)
+
+        self.assertIn("RuntimeError: database is locked", logs.output[0])
+        self.assertFalse(hub.failing)
+
+    def test_endpoint_streams_events(self):
+        self.client.force_login(User.objects.create_user("admin", password="secret"))
+
+        with mock.patch.object(live, "hub", self.hub):
+            response = self.client.get(reverse("controller:dashboard_stream"))
+            chunks = iter(response.streaming_content)
+            next(chunks)
+            snapshot = next(chunks)
+            response.close()
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertIn(b"event: snapshot", snapshot)
+
+
+class OverrideAdjustTests(ControllerTestCase):
+    def test_first_adjustment_starts_from_schedule_target(self):
+        self.add_schedule(0, (6, 0), (9, 0), 21.0)
+
+        self.assertEqual(apply_adjustment(self.zone.pk, 1.0, now=local_dt(0, 7)), 22.0)
+        self.assertEqual(apply_adjustment(self.zone.pk, -0.5, now=local_dt(0, 7, 1)), 21.5)
+        self.assertEqual(ManualOverride.objects.get().target_temperature, 21.5)
+
+    def test_version_is_bumped_on_commit(self):
+        # A new override (set_for_zone), then an update of it
+        for delta in (1.0, 1.0):
+            before = get_version(CONTROLLER_VERSION)
+            with self.captureOnCommitCallbacks() as callbacks:
+                apply_adjustment(self.zone.pk, delta)
+                self.assertEqual(get_version(CONTROLLER_VERSION), before)
+            for callback in callbacks:
+                callback()
+            self.assertNotEqual(get_version(CONTROLLER_VERSION), before)
+
+    def test_update_is_one_clamped_statement(self):
+        ManualOverride.objects.create(zone=self.zone, target_temperature=29.0)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(apply_adjustment(self.zone.pk, 5.0), MAX_TEMP)
+        writes = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith('UPDATE "controller_manualoverride"')]
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(self.zone.current_state().target, MAX_TEMP)
+        self.assertEqual(apply_adjustment(self.zone.pk, -100.0), MIN_TEMP)
+
+    def test_unknown_zone(self):
+        with self.assertRaises(Zone.DoesNotExist):
+            apply_adjustment(self.zone.pk + 1, 1.0)
+
+    @override_settings(OVERRIDE_ADJUST_WINDOW=0)
+    def test_view(self):
+        self.client.force_login(User.objects.create_user("admin", password="secret"))
+        url = reverse("controller:override_adjust")
+        ManualOverride.objects.create(zone=self.zone, target_temperature=20.0)
+
+        data = self.client.post(url, {"zone": self.zone.pk, "delta": 1}).json()
+
+        self.assertEqual(data, {"success": True, "new_target": 21.0, "zone": self.zone.pk, "clamped": False})
+        self.assertFalse(self.client.post(url, {"zone": self.zone.pk + 1, "delta": 1}).json()["success"])
+
+    def test_view_rejects_non_finite_delta(self):
+        self.client.force_login(User.objects.create_user("admin", password="secret"))
+        url = reverse("controller:override_adjust")
+
+        for delta in ("nan", "inf", "-inf"):
+            data = self.client.post(url, {"zone": self.zone.pk, "delta": delta}).json()
+            self.assertEqual(data, {"success": False, "error": "Invalid zone or delta"})
+        self.assertFalse(ManualOverride.objects.exists())
+
+
+class ManualOverrideUpsertTests(ControllerTestCase):
+    def test_set_for_zone_is_one_statement(self):
+        for zone, target, until in [(self.zone, 22.0, None), (self.zone.pk, 18.0, local_dt(0, 9))]:
+            with CaptureQueriesContext(connection) as ctx:
+                ManualOverride.objects.set_for_zone(zone, target, until=until)
+            writes = [q["sql"] for q in ctx.captured_queries if "controller_manualoverride" in q["sql"]
+                      and not q["sql"].startswith("SELECT")]
+            self.assertEqual(len(writes), 1, writes)
+
+        override = ManualOverride.objects.get()
+        self.assertEqual((override.target_temperature, override.active_until), (18.0, local_dt(0, 9)))
+
+    def test_one_override_per_zone(self):
+        ManualOverride.objects.create(zone=self.zone, target_temperature=22.0)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ManualOverride.objects.create(zone=self.zone, target_temperature=23.0)
+
+    def test_api_create_replaces_existing_override(self):
+        self.client.force_login(User.objects.create_user("admin", password="secret"))
+        ManualOverride.objects.create(
+            zone=self.zone, target_temperature=25.0,
+            active_from=local_dt(0, 5), active_until=local_dt(0, 6),
+        )
+
+        response = self.client.post(reverse("manualoverride-list"), {
+            "zone": self.zone.pk, "target_temperature": 22.0,
+        }, content_type="application/json")
+
+        self.assertEqual(response.status_code, 201, response.content)
+        override = ManualOverride.objects.get()
+        self.assertEqual(response.json()["id"], override.pk)
+        self.assertEqual((override.target_temperature, override.active_until), (22.0, None))
+
+    def test_api_update_moving_zone_replaces_its_override(self):
+        self.client.force_login(User.objects.create_user("admin", password="secret"))
+        other = Zone.objects.create(name="Office")
+        moved = ManualOverride.objects.create(zone=self.zone, target_temperature=25.0)
+        ManualOverride.objects.create(zone=other, target_temperature=18.0)
+        url = reverse("manualoverride-detail", args=[moved.pk])
+
+        response = self.client.patch(url, {"target_temperature": 23.0}, content_type="application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(ManualOverride.objects.get(zone=self.zone).target_temperature, 23.0)
+
+        response = self.client.patch(url, {"zone": other.pk}, content_type="application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            list(ManualOverride.objects.values_list("zone_id", "target_temperature")), [(other.pk, 23.0)],
+        )
+
+    def test_adjust_replaces_expired_override(self):
+        ManualOverride.objects.create(
+            zone=self.zone, target_temperature=25.0,
+            active_from=local_dt(0, 5), active_until=local_dt(0, 6),
+        )
+
+        self.assertEqual(apply_adjustment(self.zone.pk, 1.0, now=local_dt(0, 7)), FALLBACK_TEMPERATURE + 1)
+        self.assertIsNone(ManualOverride.objects.get().active_until)
+
+
+class AdjustmentCoalescerTests(SimpleTestCase):
+    def test_burst_is_applied_in_few_writes_without_losing_deltas(self):
+        applied = []
+        lock = threading.Lock()
+        total = {1: 0.0}
+
+        def apply(zone_id, delta):
+            with lock:
+                applied.append(delta)
+                total[zone_id] += delta
+                return total[zone_id]
+
+        coalescer = AdjustmentCoalescer(window=0.02, apply=apply)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(coalescer.adjust(1, 1.0)))
+            for _ in range(300)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(total[1], 300.0)
+        self.assertEqual(len(results), 300)
+        self.assertEqual(max(results), 300.0)
+        self.assertLess(len(applied), 300)
+
+    def test_errors_reach_every_waiter(self):
+        def apply(zone_id, delta):
+            raise Zone.DoesNotExist
+
+        with self.assertRaises(Zone.DoesNotExist):
+            AdjustmentCoalescer(window=0, apply=apply).adjust(1, 1.0)
+
+
+class ZoneStateTests(ControllerTestCase):
+    def state(self):
+        return ZoneState.objects.get(zone=self.zone)
+
+    def test_signals_keep_state_current(self):
+        self.assertEqual(self.state().source, "eco")
+
+        override = ManualOverride.objects.create(zone=self.zone, target_temperature=23.0)
+        self.assertEqual((self.state().target, self.state().source, self.state().override), (23.0, "manual", override))
+
+        override.delete()
+        self.assertEqual(self.state().source, "eco")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SystemSettings.objects.create(eco_temperature=16.0)
+            # Refreshed once the save commits
+            self.assertEqual(self.state().source, "eco")
+            self.assertNotEqual(self.state().target, 16.0)
+        self.assertEqual(self.state().target, 16.0)
+
+    def test_stale_state_is_recomputed_on_read(self):
+        self.add_schedule(0, (6, 0), (9, 0), 21.0)
+        refresh_states(now=local_dt(0, 7))
+        self.assertEqual(self.state().valid_until, local_dt(0, 9))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(get_states(now=local_dt(0, 8))[self.zone.pk].target, 21.0)
+
+        state = get_states(now=local_dt(0, 10))[self.zone.pk]
+        self.assertEqual((state.source, state.next_event["type"]), ("eco", "schedule_start"))
+        self.assertEqual(self.state().source, "eco")
+
+    def test_scheduler_stores_states_at_transitions(self):
+        self.add_schedule(0, (6, 0), (9, 0), 21.0)
+        scheduler = Scheduler()
+
+        scheduler.refresh(now=local_dt(0, 5))
+        self.assertEqual(self.state().valid_until, local_dt(0, 6))
+        scheduler.run_pending(now=local_dt(0, 6))
+        self.assertEqual((self.state().target, self.state().source), (21.0, "schedule"))
+
+    def test_zone_delete_cascades(self):
+        self.add_schedule(0, (6, 0), (9, 0), 21.0)
+        ManualOverride.objects.create(zone=self.zone, target_temperature=23.0)
+
+        self.zone.delete()
+
+        self.assertFalse(ZoneState.objects.exists())
+        self.assertFalse(ScheduleGroup.objects.exists())
+
+    def test_api_lists_zones_from_state(self):
+        self.client.force_login(User.objects.create_user("admin", password="secret"))
+        for i in range(20):
+            Zone.objects.create(name=f"Zone {i}")
+        ManualOverride.objects.create(zone=self.zone, target_temperature=23.0)
+
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get("/api/zones/").json()
+        zone_queries = [q for q in ctx.captured_queries if "controller_" in q["sql"]]
+
+        self.assertEqual(len(zone_queries), 1)
+        self.assertEqual(len(data), 21)
+        self.assertEqual(data[0]["target_temperature"], 23.0)
+        self.assertEqual(data[0]["manual_override"]["target_temperature"], 23.0)
+
+    def test_api_detail_recomputes_a_stale_state(self):
+        self.client.force_login(User.objects.create_user("admin", password="secret"))
+        ZoneState.objects.filter(zone=self.zone).update(target=30.0, valid_until=timezone.now())
+
+        data = self.client.get(f"/api/zones/{self.zone.pk}/").json()
+
+        self.assertEqual((data["target_temperature"], data["source"]), (FALLBACK_TEMPERATURE, "eco"))
+
+
+class ZoneScheduleApiTests(ControllerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user("admin", password="secret"))
+        self.add_schedule(0, (6, 0), (9, 0), 21.0)
+        self.url = reverse("controller:api_zone_schedule", args=[self.zone.pk])
+
+    def get(self, **headers):
+        # Returns the response and the queries it ran, minus session/auth lookups
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, headers=headers)
+        queries = [
+            q["sql"] for q in ctx.captured_queries
+            if "django_session" not in q["sql"] and "auth_user" not in q["sql"]
+        ]
+        return response, queries
+
+    def test_payload(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["zone"], "Living Room")
+        self.assertEqual(data["schedule"]["Monday"], [
+            {"start_time": "06:00", "end_time": "09:00", "target_temperature": 21.0},
+        ])
+        self.assertEqual(data["schedule"]["Sunday"], [])
+
+    def test_repeat_load_is_one_query_and_revalidates(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        response, queries = self.get()
+        self.assertEqual(response.json()["zone"], "Living Room")
+        self.assertEqual(len(queries), 1, queries)
+
+        response, queries = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 1, queries)
+
+    def test_schedule_edit_changes_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.add_schedule(1, (18, 0), (22, 0), 20.0)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.json()["schedule"]["Tuesday"]), 1)
+
+    def test_rename_is_not_a_304(self):
+        first = self.client.get(self.url)
+        self.assertNotIn("Last-Modified", first)
+        Zone.objects.filter(pk=self.zone.pk).update(name="Lounge")
+
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=http_date(time.time()))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["zone"], "Lounge")
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+
+    def test_unknown_zone(self):
+        url = reverse("controller:api_zone_schedule", args=[self.zone.pk + 1])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class HotQueryIndexTests(TestCase):
+    def assertUsesIndex(self, queryset):
+        plan = queryset.explain()
+        table_steps = [line for line in plan.splitlines() if "controller_" in line]
+        self.assertTrue(table_steps, plan)
+        for line in table_steps:
+            self.assertIn("SEARCH", line, plan)
+            self.assertIn("INDEX", line, plan)
+
+    def test_hot_queries_use_index_searches(self):
+        now = timezone.now()
+        active = Q(active_until__gt=now) | Q(active_until__isnull=True)
+
+        for queryset in [
+            # resolver.resolve_zones
+            ManualOverride.objects.filter(zone_id__in=[1, 2]).filter(active).order_by("active_from"),
+            # views.get_active_overrides
+            ManualOverride.objects.filter(active_from__lte=now).filter(active),
+            # OverrideAdjustView
+            ManualOverride.objects.filter(zone_id=1, active_from__lte=now).filter(active),
+            # timeline.get_timelines and utils.zone_schedule_api
+            Schedule.objects.filter(zone_id__in=[1, 2]),
+            Schedule.objects.filter(zone_id=1).order_by("day_of_week", "start_time"),
+            # rollups.series, /api/logs/ cursor pages and rollups.prune
+            TemperatureLog.objects.filter(zone_id=1, timestamp__gte=now, timestamp__lt=now),
+            TemperatureLog.objects.filter(timestamp__gt=now).order_by("timestamp", "id")[:500],
+            TemperatureLog.objects.filter(timestamp__lt=now).values_list("id", flat=True)[:500],
+            TemperatureRollup.objects.filter(zone_id=1, resolution=60, bucket__gte=now, bucket__lt=now),
+            TemperatureRollup.objects.filter(resolution=60, bucket__lt=now).values_list("id", flat=True)[:500],
+        ]:
+            with self.subTest(sql=str(queryset.query)):
+                self.assertUsesIndex(queryset)
+
+
+class SyntheticDataTests(ControllerTestCase):
+    def test_generates_requested_counts(self):
+        counts = synthetic.generate(zones=4, schedules_per_day=3, overrides=2, log_days=0.25, seed=1)
+
+        # 4 zones × 7 days × 3 slots, 6 hours of 15 minute readings per zone
+        self.assertEqual(counts, {"zones": 4, "schedules": 84, "overrides": 2, "logs": 96})
+        self.assertEqual(Zone.objects.count(), 5)
+        self.assertEqual(ManualOverride.objects.count(), 2)
+        self.assertEqual(TemperatureRollup.objects.filter(resolution=3600).aggregate(n=Sum("count"))["n"], 96)
+        # Every schedule belongs to the group for its values
+        self.assertFalse(Schedule.objects.filter(group__isnull=True).exists())
+        self.assertEqual(ZoneState.objects.count(), 5)
+
+    def test_same_seed_same_data(self):
+        synthetic.generate(zones=2, schedules_per_day=2, seed=7)
+        first = list(Schedule.objects.order_by("pk").values_list("target_temperature", flat=True))
+        Schedule.objects.all().delete()
+        Zone.objects.exclude(pk=self.zone.pk).delete()
+
+        synthetic.generate(zones=2, schedules_per_day=2, seed=7)
+        second = list(Schedule.objects.order_by("pk").values_list("target_temperature", flat=True))
+        self.assertEqual(first, second)
+
+    def test_seed_command_generates_fleet(self):
+        out = io.StringIO()
+        call_command("seed", zones=3, schedules_per_day=1, log_days=0.5, no_rollups=True, stdout=out)
+
+        self.assertIn("Created 144 logs", out.getvalue())
+        self.assertEqual(Schedule.objects.count(), 21)
+        self.assertFalse(TemperatureRollup.objects.exists())
+
+    def test_day_slots_do_not_overlap(self):
+        slots = synthetic.day_slots(48)
+        self.assertEqual(len(slots), 48)
+        for (_, end), (start, _) in zip(slots, slots[1:]):
+            self.assertLessEqual(end, start)
+        with self.assertRaises(ValueError):
+            synthetic.day_slots(0)
+
+
+class BenchTests(ControllerTestCase):
+    def test_runs_every_benchmark(self):
+        synthetic.generate(zones=3, schedules_per_day=2, overrides=1, log_days=0.1)
+
+        # control_tick resolves on a worker thread, which can't see this
+        # test's open transaction
+        names = set(bench.benchmarks()) - {"control_tick"}
+        results = bench.run_benchmarks(repeat=1, only=names)
+
+        self.assertEqual(set(results), names)
+        # Session and user lookups plus the dashboard's own budget
+        self.assertLessEqual(results["dashboard"]["queries"], 2 + DashboardQueryBudgetTests.QUERY_BUDGET)
+        self.assertGreater(results["zone_schedule_api"]["wall_ms"]["min"], 0)
+        json.dumps(results)
+
+    def test_compare_flags_slower_runs_and_extra_queries(self):
+        def result(ms, queries):
+            return {"queries": queries, "peak_kb": 1.0, "wall_ms": {"min": ms, "median": ms, "max": ms}}
+
+        baseline = {"a": result(10.0, 3), "b": result(10.0, 3), "c": result(10.0, 3)}
+        rows, regressions = bench.compare(
+            baseline, {"a": result(11.0, 3), "b": result(15.0, 3), "c": result(9.0, 4), "d": result(1.0, 1)},
+        )
+
+        self.assertEqual([row["name"] for row in rows], ["a", "b", "c"])
+        self.assertEqual(regressions, ["b", "c"])
+
+
+class OverrideSweeperTests(ControllerTestCase):
+    def test_archives_expired_overrides_in_batches(self):
+        zones = [self.zone] + [Zone.objects.create(name=f"Zone {i}") for i in range(4)]
+        for i, zone in enumerate(zones):
+            ManualOverride.objects.create(
+                zone=zone, target_temperature=20.0 + i,
+                active_from=local_dt(0, 6), active_until=local_dt(0, 7 + i),
+            )
+        refresh_states(now=local_dt(0, 6, 30))
+
+        # Three have ended by 9:00, in batches of two
+        swept = sweeper.sweep_expired(now=local_dt(0, 9), batch_size=2)
+
+        self.assertEqual(swept, {zone.pk for zone in zones[:3]})
+        self.assertEqual(
+            list(ManualOverrideArchive.objects.values_list("zone_id", "target_temperature")),
+            [(zones[0].pk, 20.0), (zones[1].pk, 21.0), (zones[2].pk, 22.0)],
+        )
+        self.assertEqual(set(ManualOverride.objects.values_list("zone_id", flat=True)),
+                         {zones[3].pk, zones[4].pk})
+        # Their state no longer points at the deleted override
+        state = ZoneState.objects.get(zone=zones[0])
+        self.assertIsNone(state.override_id)
+        self.assertEqual(state.source, "eco")
+        self.assertEqual(ZoneState.objects.get(zone=zones[3]).source, "manual")
+
+    def test_one_delete_per_batch(self):
+        for i in range(3):
+            ManualOverride.objects.create(
+                zone=Zone.objects.create(name=f"Zone {i}"), target_temperature=20.0,
+                active_from=local_dt(0, 6), active_until=local_dt(0, 7),
+            )
+
+        with self.captureOnCommitCallbacks() as callbacks, CaptureQueriesContext(connection) as ctx:
+            sweeper.sweep_expired(now=local_dt(0, 9), refresh=False)
+
+        deletes = [q for q in ctx.captured_queries if q["sql"].startswith("DELETE")]
+        self.assertEqual(len(deletes), 1)
+        # The per-row receivers are skipped: no refresh, one bump
+        self.assertFalse(any("zonestate" in q["sql"].lower() and q["sql"].startswith("INSERT")
+                             for q in ctx.captured_queries))
+        self.assertEqual(len(callbacks), 1)
+
+    def test_nothing_expired_opens_no_transaction(self):
+        ManualOverride.objects.create(zone=self.zone, target_temperature=20.0, active_until=None)
+        with self.assertNumQueries(1):
+            self.assertEqual(sweeper.sweep_expired(), set())
+
+
+class ScheduleOverlapTests(ControllerTestCase):
+    def form(self, start, end, days=(0,), priority=0, zones=None, instance=None):
+        return ScheduleForm(instance=instance, data={
+            "zones": [z.pk for z in zones or [self.zone]], "days_of_week": list(days),
+            "start_time": start, "end_time": end, "target_temperature": 22.0, "priority": priority,
+        })
+
+    def slots(self):
+        return sorted(Schedule.objects.values_list(
+            "day_of_week", "start_time", "end_time", "target_temperature"
+        ))
+
+    def test_interval_tree_matches_brute_force(self):
+        import random
+        rng = random.Random(3)
+        intervals = []
+        for i in range(300):
+            start = rng.randrange(1000)
+            intervals.append((start, start + rng.randrange(1, 60), i))
+        tree = overlaps.IntervalTree(intervals)
+        for _ in range(200):
+            start = rng.randrange(1000)
+            end = start + rng.randrange(1, 80)
+            expected = {i for s, e, i in intervals if s < end and e > start}
+            self.assertEqual(set(tree.overlapping(start, end)), expected)
+
+    def test_detects_overnight_and_week_wraparound(self):
+        self.add_schedule(0, (22, 0), (6, 0), 18.0)   # Monday night
+        self.add_schedule(6, (23, 0), (1, 0), 18.0)   # Sunday night
+
+        self.assertTrue(self.form("06:00", "09:00", days=[1]).is_valid())
+        tuesday = self.form("05:00", "07:00", days=[1])
+        self.assertFalse(tuesday.is_valid())
+        self.assertIn("Living Room: Tuesday 05:00-07:00 overlaps Monday 22:00-06:00",
+                      tuesday.non_field_errors())
+        self.assertFalse(self.form("00:30", "02:00", days=[0]).is_valid())
+        # Touching ends aren't overlaps
+        self.assertTrue(self.form("01:00", "05:00", days=[0]).is_valid())
+
+    def test_checks_whole_bulk_submission(self):
+        other = Zone.objects.create(name="Office")
+        self.add_schedule(1, (7, 0), (9, 0), 20.0)
+        self.add_schedule(3, (8, 0), (10, 0), 20.0, zone=other)
+        form = self.form("20:00", "21:00", days=range(7), zones=[self.zone, other])
+        self.assertTrue(form.is_valid(), form.errors)
+
+        form = self.form("22:00", "08:30", days=range(7), zones=[self.zone, other])
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.non_field_errors(), [
+            "Living Room: Monday 22:00-08:30 overlaps Tuesday 07:00-09:00",
+            "Office: Wednesday 22:00-08:30 overlaps Thursday 08:00-10:00",
+        ])
+
+    def test_same_slot_is_an_upsert_not_an_overlap(self):
+        self.add_schedule(0, (6, 0), (9, 0), 20.0)
+        form = self.form("06:00", "09:00")
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def test_edit_replaces_the_row(self):
+        sched = self.add_schedule(0, (6, 0), (9, 0), 20.0)
+        form = self.form("07:00", "10:00", instance=sched)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+
+        self.assertEqual(self.slots(), [(0, datetime.time(7), datetime.time(10), 22.0)])
+        self.assertTrue(Schedule.objects.filter(pk=sched.pk).exists())
+
+    def test_bulk_edit_ignores_its_own_rows(self):
+        self.client.force_login(User.objects.create_user("admin", password="secret"))
+        first = self.add_schedule(0, (6, 0), (9, 0), 20.0)
+        second = self.add_schedule(1, (6, 0), (9, 0), 20.0)
+        self.add_schedule(2, (8, 0), (12, 0), 20.0)
+        url = reverse("controller:grouped_schedule_bulk_edit", args=[f"{first.pk},{second.pk}"])
+        data = {"zones": [self.zone.pk], "start_time": "07:00", "end_time": "10:00",
+                "target_temperature": 21.0, "priority": 0}
+
+        self.assertEqual(self.client.post(url, {**data, "days_of_week": [0, 1]}).status_code, 302)
+        response = self.client.post(url, {**data, "days_of_week": [0, 2]})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Wednesday 08:00-12:00", str(response.context["form"].non_field_errors()))
+
+    @override_settings(SCHEDULE_OVERLAP_POLICY="priority")
+    def test_priority_policy_trims_losing_rows(self):
+        self.add_schedule(0, (6, 0), (22, 0), 19.0, priority=5)
+        # Runs into Monday morning, where the earlier-starting row wins the tie
+        self.add_schedule(6, (22, 0), (8, 0), 16.0, priority=5)
+        form = self.form("12:00", "14:00", days=[0], priority=1)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        form = self.form("07:00", "09:00", days=[0], priority=1)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+
+        t = datetime.time
+        self.assertEqual(self.slots(), [
+            (0, t(6), t(7), 19.0),
+            (0, t(7), t(9), 22.0),
+            (0, t(9), t(12), 19.0),
+            (0, t(12), t(14), 22.0),
+            (0, t(14), t(22), 19.0),
+            (6, t(22), t(6), 16.0),
+        ])
+        timeline = WeekTimeline.compile(Schedule.objects.all())
+        self.assertEqual(len(timeline.segments), 7)
+        self.assertEqual(self.zone.current_schedule(local_dt(0, 10)).target_temperature, 19.0)
+        self.assertEqual(overlaps.find_overlaps(list(Schedule.objects.all())), [])
+
+
+@override_settings(PREHEAT={"ENABLED": True})
+class PreheatTests(ControllerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(preheat.reset)
+
+    def readings(self, zone_id, start, step, count, rate):
+        # `count` readings `step` seconds apart changing by `rate` °C per hour
+        times = start + step * np.arange(count)
+        return np.full(count, zone_id), times, 18.0 + rate * (times - start) / 3600
+
+    def fit(self, *series, now):
+        model = preheat.HeatingModel()
+        model.update(*(np.concatenate(parts) for parts in zip(*series)), now)
+        return model
+
+    def test_fits_heating_and_cooling_rates_per_zone(self):
+        now = local_dt(0, 12).timestamp()
+        model = self.fit(
+            self.readings(1, now - 6 * 3600, 600, 12, 2.0),        # heating
+            self.readings(1, now - 2 * 3600, 600, 12, -0.5),       # cooling
+            self.readings(2, now - 3 * 3600, 900, 12, 1.0),
+            self.readings(3, now - 3 * 3600, 900, 3, 1.0),         # too few
+            self.readings(4, now - 3 * 3600, 2 * 3600, 10, 1.0),   # too far apart
+            now=now,
+        )
+
+        self.assertAlmostEqual(model.heat_rate(1), 2.0)
+        self.assertAlmostEqual(model.cool_rate(1), 0.5)
+        self.assertAlmostEqual(model.heat_rate(2), 1.0)
+        self.assertIsNone(model.cool_rate(2))
+        self.assertIsNone(model.heat_rate(3))
+        self.assertIsNone(model.heat_rate(4))
+        self.assertAlmostEqual(model.lead_time(1, 18.0, 21.0), 1.5 * 3600)
+        self.assertEqual(model.lead_time(1, 10.0, 30.0), preheat.DEFAULTS["MAX_LEAD"])
+        self.assertIsNone(model.lead_time(1, 21.0, 20.0))
+
+    def test_recent_transitions_weigh_more(self):
+        now = local_dt(0, 12).timestamp()
+        week = 7 * 24 * 3600
+        model = self.fit(
+            self.readings(1, now - week, 600, 30, 4.0),
+            self.readings(1, now - 6 * 3600, 600, 30, 1.0),
+            now=now,
+        )
+        self.assertLess(model.heat_rate(1), 2.0)
+
+    def test_refit_reads_only_new_logs(self):
+        start = local_dt(0, 6)
+        TemperatureLog.objects.bulk_create([
+            TemperatureLog(zone=self.zone, temperature=16.0 + 0.25 * i, source="sensor",
+                           timestamp=start + datetime.timedelta(minutes=15 * i))
+            for i in range(12)
+        ])
+        model = preheat.refit(now=local_dt(0, 9))
+        self.assertAlmostEqual(model.heat_rate(self.zone.pk), 1.0)
+
+        TemperatureLog.objects.bulk_create([
+            TemperatureLog(zone=self.zone, temperature=18.75 - 0.5 * i, source="sensor",
+                           timestamp=local_dt(0, 8, 45) + datetime.timedelta(minutes=15 * i))
+            for i in range(1, 9)
+        ])
+        with self.assertNumQueries(1):
+            model = preheat.refit(now=local_dt(0, 11))
+        self.assertAlmostEqual(model.cool_rate(self.zone.pk), 2.0)
+        self.assertEqual(model.cursor, TemperatureLog.objects.latest("pk").pk)
+
+        # Same sums as fitting everything at once
+        full = preheat.HeatingModel()
+        logs = TemperatureLog.objects.filter(source="sensor").values_list("zone_id", "timestamp", "temperature")
+        zone_ids, times, temperatures = zip(*logs)
+        full.update(zone_ids, [t.timestamp() for t in times], temperatures, local_dt(0, 11).timestamp())
+        np.testing.assert_allclose(model.sums, full.sums)
+
+    def test_refit_ignores_setpoints(self):
+        # The scheduler logs targets, which jump: 16 -> 21 in a minute
+        TemperatureLog.objects.bulk_create([
+            TemperatureLog(zone=self.zone, temperature=(16.0, 21.0)[i % 2], source=("eco", "schedule")[i % 2],
+                           timestamp=local_dt(0, 6) + datetime.timedelta(minutes=i))
+            for i in range(12)
+        ])
+        model = preheat.refit(now=local_dt(0, 9))
+        self.assertIsNone(model.heat_rate(self.zone.pk))
+        self.assertFalse(model.rows)
+
+    def test_next_event_reports_preheat_start(self):
+        self.add_schedule(0, (7, 0), (9, 0), 22.0)
+        other = Zone.objects.create(name="Office")
+        self.add_schedule(0, (7, 0), (9, 0), 22.0, zone=other)
+        model = self.fit(self.readings(self.zone.pk, local_dt(0, 0).timestamp(), 600, 12, 2.0),
+                         now=local_dt(0, 5).timestamp())
+        preheat.publish(model)
+
+        # 20°C (eco) to 22°C at 2°C/h: an hour early
+        event = self.zone.next_temperature_event(local_dt(0, 5))
+        self.assertEqual(event, {"time": local_dt(0, 6), "type": "preheat_start", "target": 22.0})
+        self.assertEqual(self.zone.status(local_dt(0, 5)).target, FALLBACK_TEMPERATURE)
+
+        status = self.zone.status(local_dt(0, 6, 30))
+        self.assertEqual((status.target, status.source), (22.0, "schedule"))
+        self.assertEqual(status.next_event["type"], "schedule_start")
+
+        # No learned rate: starts on time
+        self.assertEqual(other.next_temperature_event(local_dt(0, 5))["time"], local_dt(0, 7))
+        self.assertEqual(other.status(local_dt(0, 6, 30)).target, FALLBACK_TEMPERATURE)
+
+        with override_settings(PREHEAT={"ENABLED": False}):
+            self.assertEqual(self.zone.next_temperature_event(local_dt(0, 5))["time"], local_dt(0, 7))
+
+    def test_scheduler_wakes_at_preheat_start(self):
+        self.add_schedule(0, (7, 0), (9, 0), 22.0)
+        preheat.publish(self.fit(self.readings(self.zone.pk, local_dt(0, 0).timestamp(), 600, 12, 2.0),
+                                 now=local_dt(0, 5).timestamp()))
+        scheduler = Scheduler()
+        scheduler.refresh(now=local_dt(0, 5))
+
+        self.assertEqual(scheduler.next_wakeup(), local_dt(0, 6))
+        self.assertEqual(scheduler.run_pending(local_dt(0, 6)), 1)
+        self.zone.refresh_from_db()
+        self.assertEqual(self.zone.current_temperature, 22.0)
+        self.assertEqual(scheduler.next_wakeup(), local_dt(0, 7))
+        self.assertEqual(scheduler.run_pending(local_dt(0, 7)), 0)
+
+    def test_posted_sensor_readings_drive_preheat(self):
+        self.client.force_login(User.objects.create_user("admin", password="secret"))
+        self.add_schedule(0, (7, 0), (9, 0), 22.0)
+        url = f"/api/zones/{self.zone.pk}/readings/"
+        readings = [
+            {"temperature": 16.0 + 0.5 * i, "timestamp": (local_dt(0, 2) + datetime.timedelta(minutes=15 * i)).isoformat()}
+            for i in range(12)
+        ]
+
+        response = self.client.post(url, readings, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["recorded"], 12)
+        self.assertEqual(self.client.post(url, {"temperature": "warm"}, content_type="application/json").status_code, 400)
+        self.assertEqual(self.client.post("/api/zones/0/readings/", {"temperature": 20.0},
+                                          content_type="application/json").status_code, 404)
+
+        model = preheat.refit(now=local_dt(0, 5))
+        self.assertAlmostEqual(model.heat_rate(self.zone.pk), 2.0)
+        # 20°C (eco) to 22°C at 2°C/h: an hour early
+        self.assertEqual(self.zone.next_temperature_event(local_dt(0, 5))["type"], "preheat_start")
+        self.assertEqual(self.zone.next_temperature_event(local_dt(0, 5))["time"], local_dt(0, 6))
@@ -0,0 +1,291 @@
+"""
+Compiled weekly schedule timelines.
+
+A zone's Schedule rows are compiled once into a sorted, immutable list of
+non-overlapping segments on a seconds-of-week axis (Monday 00:00 = 0).
+Overnight schedules are split at the end of the week and overlapping rows are
+resolved up front, so "what is active at t" and "what changes next" are plain
+bisections that never touch the database.
+
+Timelines are cached per process and dropped when the zone's schedules change
+(see controller.signals). Other processes notice through the shared
+"schedules" version token.
+"""
+import bisect
+import datetime
+import heapq
+import threading
+import time
+from typing import NamedTuple
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+from core.versions import bump_version, get_version
+
+SECONDS_PER_DAY = 24 * 60 * 60
+SECONDS_PER_WEEK = 7 * SECONDS_PER_DAY
+
+# How often (seconds) a process checks whether another process changed schedules
+VERSION_CHECK_INTERVAL = 1.0
+VERSION_NAME = "schedules"
+
+
+class Segment(NamedTuple):
+    start: int
+    end: int
+    schedule: object
+
+
+def _seconds(t):
+    return t.hour * 3600 + t.minute * 60 + t.second
+
+
+def _local(now):
+    if now is None:
+        return timezone.localtime()
+    if timezone.is_naive(now):
+        return timezone.make_aware(now)
+    return timezone.localtime(now)
+
+
+def week_offset(now):
+    """
+    Seconds elapsed since Monday 00:00 (local time) of the week containing `now`.
+    """
+    return now.weekday() * SECONDS_PER_DAY + _seconds(now.time())
+
+
+def offset_to_datetime(now, offset):
+    """
+    Converts a seconds-of-week offset (which may run past the end of the week)
+    back to an aware datetime in the week of `now`.
+    """
+    week_start = now.date() - datetime.timedelta(days=now.weekday())
+    days, seconds = divmod(offset, SECONDS_PER_DAY)
+    moment = datetime.datetime.combine(
+        week_start + datetime.timedelta(days=days),
+        datetime.time(seconds // 3600, seconds % 3600 // 60, seconds % 60),
+    )
+    return timezone.make_aware(moment, timezone.get_current_timezone())
+
+
+def schedule_intervals(sched):
+    """
+    Yields the (start, end) seconds-of-week spans covered by a schedule.
+    Overnight schedules run into the next day and wrap around Sunday night.
+    """
+    start = sched.day_of_week * SECONDS_PER_DAY + _seconds(sched.start_time)
+    end = sched.day_of_week * SECONDS_PER_DAY + _seconds(sched.end_time)
+    if end <= start:
+        end += SECONDS_PER_DAY
+
+    if end <= SECONDS_PER_WEEK:
+        yield start, end
+    else:
+        yield start, SECONDS_PER_WEEK
+        yield 0, end - SECONDS_PER_WEEK
+
+
+def precedence(sched):
+    # Same order as Schedule.Meta.ordering: the lowest priority value wins
+    return (sched.priority, sched.start_time, sched.pk or 0)
+
+
+class WeekTimeline:
+    """
+    Immutable, conflict-free view of one zone's weekly schedule.
+    """
+
+    __slots__ = ("segments", "_starts", "_changes", "_wraps")
+
+    def __init__(self, segments):
+        self.segments = tuple(segments)
+        self._starts = tuple(s.start for s in self.segments)
+
+        changes = set()
+        for seg in self.segments:
+            changes.add(seg.start)
+            changes.add(seg.end % SECONDS_PER_WEEK)
+        # Sunday night -> Monday morning is not a change when the same schedule carries on
+        self._wraps = bool(
+            self.segments
+            and self.segments[0].start == 0
+            and self.segments[-1].end == SECONDS_PER_WEEK
+            and self.segments[0].schedule is self.segments[-1].schedule
+        )
+        if self._wraps:
+            changes.discard(0)
+        self._changes = tuple(sorted(changes))
+
+    @classmethod
+    def compile(cls, schedules):
+        intervals = []
+        for sched in schedules:
+            for start, end in schedule_intervals(sched):
+                intervals.append((start, end, precedence(sched), sched))
+        if not intervals:
+            return cls(())
+
+        intervals.sort(key=lambda i: i[0])
+        boundaries = sorted({b for i in intervals for b in i[:2]})
+
+        # Sweep the elementary spans between boundaries, keeping the covering
+        # schedules in a heap ordered by precedence (lazily dropping ended ones).
+        segments = []
+        active = []
+        pos = 0
+        for left, right in zip(boundaries, boundaries[1:]):
+            while pos < len(intervals) and intervals[pos][0] == left:
+                start, end, rank, sched = intervals[pos]
+                heapq.heappush(active, (rank, end, id(sched), sched))
+                pos += 1
+            while active and active[0][1] <= left:
+                heapq.heappop(active)
+            if not active:
+                continue
+
+            winner = active[0][3]
+            if segments and segments[-1].end == left and segments[-1].schedule is winner:
+                segments[-1] = segments[-1]._replace(end=right)
+            else:
+                segments.append(Segment(left, right, winner))
+
+        return cls(segments)
+
+    def __bool__(self):
+        return bool(self.segments)
+
+    def segment_at(self, offset):
+        idx = bisect.bisect_right(self._starts, offset) - 1
+        if idx >= 0 and offset < self.segments[idx].end:
+            return self.segments[idx]
+        return None
+
+    def schedule_at(self, now=None):
+        """
+        Returns the schedule active at `now`, or None.
+        """
+        segment = self.segment_at(week_offset(_local(now)))
+        return segment.schedule if segment else None
+
+    def next_transition(self, now=None):
+        """
+        Returns (datetime, schedule) for the next moment strictly after `now`
+        at which the active schedule changes. `schedule` is what becomes
+        active then (None when the zone falls back to no schedule).
+        Returns (None, None) when nothing ever changes.
+        """
+        if not self._changes:
+            return None, None
+
+        now = _local(now)
+        offset = week_offset(now)
+        idx = bisect.bisect_right(self._changes, offset)
+        if idx < len(self._changes):
+            change = self._changes[idx]
+        else:
+            change = self._changes[0] + SECONDS_PER_WEEK
+
+        segment = self.segment_at(change % SECONDS_PER_WEEK)
+        return offset_to_datetime(now, change), segment.schedule if segment else None
+
+    def next_start(self, now=None):
+        """
+        Returns (schedule, datetime) for the next segment starting after `now`.
+        """
+        if not self.segments:
+            return None, None
+
+        now = _local(now)
+        idx = bisect.bisect_right(self._starts, week_offset(now))
+        count = len(self.segments)
+        # The Monday 00:00 half of a wrapped Sunday night schedule isn't a start
+        if self._wraps and count > 1 and idx % count == 0:
+            idx += 1
+        segment = self.segments[idx % count]
+        start = segment.start + SECONDS_PER_WEEK * (idx // count)
+        return segment.schedule, offset_to_datetime(now, start)
+
+
+_timelines = {}
+_lock = threading.Lock()
+_generation = 0
+_seen_version = None
+_checked_at = 0.0
+
+
+def _check_version(force=False):
+    global _generation, _seen_version, _checked_at
+    now = time.monotonic()
+    if not force and now - _checked_at < VERSION_CHECK_INTERVAL:
+        return
+    _checked_at = now
+    version = get_version(VERSION_NAME)
+    if version != _seen_version:
+        _timelines.clear()
+        _generation += 1
+        _seen_version = version
+
+
+def check_version():
+    """
+    Drops the cached timelines right away if another process changed schedules.
+    """
+    with _lock:
+        _check_version(force=True)
+
+
+def get_timelines(zone_ids):
+    """
+    Returns {zone_id: WeekTimeline}, loading all missing zones in one query.
+    """
+    from .models import Schedule
+
+    with _lock:
+        _check_version()
+        found = {zid: _timelines[zid] for zid in zone_ids if zid in _timelines}
+        generation = _generation
+
+    missing = [zid for zid in zone_ids if zid not in found]
+    if missing:
+        by_zone = {zid: [] for zid in missing}
+        # From the primary: a lagging replica would stay cached until the next edit
+        for sched in Schedule.objects.using(DEFAULT_DB_ALIAS).filter(zone_id__in=missing):
+            by_zone[sched.zone_id].append(sched)
+        compiled = {zid: WeekTimeline.compile(scheds) for zid, scheds in by_zone.items()}
+        with _lock:
+            # Don't cache what was loaded while an invalidation happened
+            if generation == _generation:
+                _timelines.update(compiled)
+        found.update(compiled)
+
+    return found
+
+
+def get_timeline(zone_id):
+    return get_timelines([zone_id])[zone_id]
+
+
+def _drop(zone_ids, version=None):
+    global _generation, _seen_version
+    with _lock:
+        if zone_ids is None:
+            _timelines.clear()
+        else:
+            for zid in zone_ids:
+                _timelines.pop(zid, None)
+        _generation += 1
+        if version is not None:
+            _seen_version = version
+
+
+def invalidate_timelines(zone_ids=None):
+    """
+    Drops cached timelines (all of them when zone_ids is None) and tells other
+    processes to do the same once the current transaction commits: a process
+    reloading before then would cache the old rows under the new token.
+    """
+    _drop(zone_ids)
+    # Dropped again on commit, in case another thread reloaded meanwhile
+    transaction.on_commit(lambda: _drop(zone_ids, bump_version(VERSION_NAME)))
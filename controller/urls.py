@@ -1,8 +1,8 @@
 from django.urls import path
 
-from .utils import zone_schedule_api
+from .utils import zone_schedule_api, zones_grid_api
 from .views import (
-    DashboardView, OverrideAdjustView, ScheduleDeleteView, ZoneDeleteView, ZoneListView, ScheduleListView,
+    DashboardView, DashboardStreamView, OverrideAdjustView, ScheduleDeleteView, ZoneDeleteView, ZoneListView, ScheduleListView,
     ScheduleCreateView, ScheduleUpdateView,
     ZoneCreateView, ZoneUpdateView, ZoneScheduleListView, GroupedScheduleListView, GroupedScheduleBulkEditView, GroupedScheduleDeleteView,
     ZoneScheduleGraphView
@@ -13,6 +13,7 @@ app_name = "controller"
 urlpatterns = [
     # Frontend
     path('', DashboardView.as_view(), name='dashboard'),
+    path('live/', DashboardStreamView.as_view(), name='dashboard_stream'),
     path("overrides/adjust/", OverrideAdjustView.as_view(), name="override_adjust"),
 
 
@@ -22,6 +23,7 @@ urlpatterns = [
     path("zones/delete/<int:pk>/", ZoneDeleteView.as_view(), name="zone-delete"),
     path('zones/<int:zone_id>/schedules/', ZoneScheduleListView.as_view(), name='zone_schedules'),
     path('api/zone/<int:zone_id>/schedule/', zone_schedule_api, name='api_zone_schedule'),
+    path('api/zones/grid/', zones_grid_api, name='api_zones_grid'),
     path('zone/<int:zone_id>/graph/', ZoneScheduleGraphView.as_view(), name='zone_schedules_graph'),
 
     path('schedules/grouped/', GroupedScheduleListView.as_view(), name='grouped_schedule_list'),
@@ -1,27 +1,115 @@
-# views.py
-from django.http import JsonResponse
+import hashlib
+
+from django.core.cache import cache
+from django.http import Http404, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
 from controller.models import Zone, Schedule
-from core.models import SystemSettings
+from core.db_router import read_from_replica
+from core.system_settings import get_system_settings
+from controller.weekgrid import build_week_grid
+
+# Rendered schedules are keyed by the zone's stamp, so edits never hit a stale entry
+SCHEDULE_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def zone_schedule_data(zone_id):
+    """
+    {day name: [{start_time, end_time, target_temperature}, ...]} in one query.
+    """
+    day_names = dict(Schedule._meta.get_field('day_of_week').choices)
+    schedule_data = {day_names[day]: [] for day in range(7)}
+    schedules = Schedule.objects.filter(zone_id=zone_id).order_by('day_of_week', 'start_time')
+    for s in schedules:
+        schedule_data[day_names[s.day_of_week]].append({
+            'start_time': s.start_time.strftime("%H:%M"),
+            'end_time': s.end_time.strftime("%H:%M"),
+            'target_temperature': s.target_temperature
+        })
+    return schedule_data
+
+
+def cached_zone_schedule_data(zone_id, stamp):
+    key = f"zone_schedule:{zone_id}:{stamp.timestamp()}"
+    schedule_data = cache.get(key)
+    if schedule_data is None:
+        schedule_data = zone_schedule_data(zone_id)
+        cache.set(key, schedule_data, SCHEDULE_CACHE_TIMEOUT)
+    return schedule_data
+
 
+def parse_grid_step(value):
+    """
+    Slot width in seconds from a step given in minutes (1 to 1440).
+    Raises ValueError for anything else.
+    """
+    minutes = int(value)
+    if not 1 <= minutes <= 24 * 60:
+        raise ValueError(value)
+    return minutes * 60
+
+
+@read_from_replica
 def zone_schedule_api(request, zone_id):
-    zone = Zone.objects.get(id=zone_id)
-    system_settings = SystemSettings.objects.first()
+    try:
+        name, stamp = Zone.objects.values_list('name', 'schedules_updated_at').get(id=zone_id)
+    except Zone.DoesNotExist:
+        raise Http404("Zone not found")
+    system_settings = get_system_settings()
     eco_temp = system_settings.eco_temperature if system_settings else 20
 
-    schedule_data = {}
-    for day in range(7):
-        day_name = Schedule._meta.get_field('day_of_week').choices[day][1]
-        day_scheds = Schedule.objects.filter(zone=zone, day_of_week=day).order_by('start_time')
-        schedule_data[day_name] = [
-            {
-                'start_time': s.start_time.strftime("%H:%M"),
-                'end_time': s.end_time.strftime("%H:%M"),
-                'target_temperature': s.target_temperature
-            } for s in day_scheds
-        ]
-
-    return JsonResponse({
-        'zone': zone.name,
-        'eco_temperature': eco_temp,
-        'schedule': schedule_data
-    })
+    if 'grid' in request.GET:
+        # ?grid=<minutes> adds this week's targets per slot. They include
+        # overrides, which the stamp doesn't cover, so no conditional GET here.
+        try:
+            step = parse_grid_step(request.GET['grid'])
+        except ValueError:
+            return JsonResponse({"success": False, "error": "Invalid grid step"}, status=400)
+        grid = build_week_grid([zone_id], step).as_dict()
+        grid.update(grid.pop('zones')[zone_id])
+        return JsonResponse({
+            'zone': name,
+            'eco_temperature': eco_temp,
+            'schedule': cached_zone_schedule_data(zone_id, stamp),
+            'grid': grid,
+        })
+
+    # The stamp only covers schedules; name and eco temperature are in the body
+    # too. No Last-Modified: a rename has no time to go by, only the ETag sees it.
+    etag = quote_etag(hashlib.md5(
+        f"{zone_id}|{stamp.isoformat()}|{eco_temp}|{name}".encode()
+    ).hexdigest())
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse({
+            'zone': name,
+            'eco_temperature': eco_temp,
+            'schedule': cached_zone_schedule_data(zone_id, stamp)
+        })
+
+    response.headers['ETag'] = etag
+    # Let the browser keep it but revalidate on every load
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@read_from_replica
+def zones_grid_api(request):
+    """
+    This week's target of every zone per slot.
+    ?step=<minutes> (default 15), ?zones=1,2 to limit, ?manual=0 to ignore overrides.
+    """
+    try:
+        step = parse_grid_step(request.GET.get('step', 15))
+        zone_ids = None
+        if request.GET.get('zones'):
+            zone_ids = [int(z) for z in request.GET['zones'].split(',')]
+    except ValueError:
+        return JsonResponse({"success": False, "error": "Invalid step or zones"}, status=400)
+
+    if zone_ids is not None:
+        zone_ids = list(Zone.objects.filter(pk__in=zone_ids).order_by('pk').values_list('pk', flat=True))
+    grid = build_week_grid(zone_ids, step, include_manual=request.GET.get('manual') != '0')
+    return JsonResponse(grid.as_dict())
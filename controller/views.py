@@ -1,3 +1,4 @@
+import math
 from collections import defaultdict
 from django.http import Http404
 from django.shortcuts import get_list_or_404, get_object_or_404, redirect, render
@@ -6,19 +7,24 @@ from django.views.generic import ListView, CreateView, UpdateView, DeleteView, T
 from django.urls import reverse_lazy
 from django.utils import timezone
 
-from core.models import SystemSettings
-from .models import Zone, Schedule, ManualOverride
+from core.db_router import read_from_replica
+from core.system_settings import get_system_settings
+from .models import Zone, Schedule, ScheduleGroup, ManualOverride
 from .forms import ScheduleBatchForm, ScheduleForm, ManualOverrideForm, ZoneForm
+from . import adjust, live, overlaps
+from .adjust import MAX_TEMP, MIN_TEMP
+from .zonestate import get_states
+from .signals import schedule_batch
 from django.db.models import Q
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views.generic import FormView
 from django.db import transaction
 from django.http import Http404
 
-MAX_TEMP = 30.0
-MIN_TEMP = 5.0   # optional, but recommended
+
+DAY_NAMES = dict(Schedule._meta.get_field('day_of_week').choices)
 
     
 def get_active_overrides():
@@ -30,35 +36,51 @@ def get_active_overrides():
     )
 
 
+@method_decorator(read_from_replica, name='dispatch')
 class DashboardView(ListView):
     model = Zone
     template_name = "controller/dashboard.html"
     context_object_name = "zones"
 
+    def get_queryset(self):
+        return Zone.objects.select_related("state", "state__override")
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        now = timezone.localtime()
-
-        overrides = get_active_overrides()
-        active_overrides = {o.zone_id: o for o in overrides}
-
-        next_events = {
-            zone.id: zone.next_temperature_event(now)
-            for zone in context["zones"]
-        }
+        # Materialized rows; only stale ones are re-resolved
+        context["zones"] = list(context["zones"])
+        states = get_states(context["zones"])
 
         context.update({
-            "active_overrides": active_overrides,
-            "next_events": next_events,
+            "statuses": states,
+            "active_overrides": {
+                zone_id: state.override
+                for zone_id, state in states.items() if state.override
+            },
+            "next_events": {
+                zone_id: state.next_event for zone_id, state in states.items()
+            },
             "page_title": "Heating Dashboard",
             "breadcrumbs": [
                 {"name": "Home", "url": "/", "active": True},
             ]
         })
-        print(context)
         return context
 
 
+class DashboardStreamView(View):
+    """
+    Server-Sent Events feed of per-zone changes for the dashboard.
+    """
+
+    def get(self, request, *args, **kwargs):
+        response = StreamingHttpResponse(live.hub.stream(), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        # Stop nginx from buffering the stream
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class OverrideAdjustView(View):
     """
@@ -66,51 +88,25 @@ class OverrideAdjustView(View):
     """
 
     def post(self, request, *args, **kwargs):
-        zone_id = request.POST.get("zone")
-
         try:
+            zone_id = int(request.POST.get("zone"))
             delta = float(request.POST.get("delta", 0))
         except (TypeError, ValueError):
-            return JsonResponse({"success": False, "error": "Invalid delta"})
+            return JsonResponse({"success": False, "error": "Invalid zone or delta"})
+        # float() accepts "nan" and "inf", which would end up as the target
+        if not math.isfinite(delta):
+            return JsonResponse({"success": False, "error": "Invalid zone or delta"})
 
+        # Bursts of clicks on one zone are summed and written once
         try:
-            zone = Zone.objects.get(id=zone_id)
+            new_target = adjust.coalescer.adjust(zone_id, delta)
         except Zone.DoesNotExist:
             return JsonResponse({"success": False, "error": "Zone not found"})
 
-        now = timezone.now()
-
-        # Get active override if exists
-        override = ManualOverride.objects.filter(
-            zone=zone,
-            active_from__lte=now
-        ).filter(
-            Q(active_until__gte=now) | Q(active_until__isnull=True)
-        ).first()
-
-        if override:
-            new_target = override.target_temperature + delta
-        else:
-            new_target = zone.get_active_target + delta
-
-        # Clamp temperature
-        new_target = max(MIN_TEMP, min(MAX_TEMP, new_target))
-
-        if override:
-            override.target_temperature = new_target
-            override.active_from = now
-            override.save()
-        else:
-            override = ManualOverride.objects.create(
-                zone=zone,
-                target_temperature=new_target,
-                active_from=now
-            )
-
         return JsonResponse({
             "success": True,
             "new_target": round(new_target, 1),
-            "zone": zone.id,
+            "zone": zone_id,
             "clamped": new_target in (MIN_TEMP, MAX_TEMP)
         })
 
@@ -198,7 +194,7 @@ class ZoneScheduleListView(ListView):
         context = super().get_context_data(**kwargs)
         zone_id = self.kwargs['zone_id']
         zone = Zone.objects.get(id=zone_id)
-        system_settings = SystemSettings.objects.first()
+        system_settings = get_system_settings()
         context.update({
             "zone": zone,
             "eco_temperature": system_settings.eco_temperature if system_settings else 20,
@@ -327,40 +323,38 @@ class ManualOverrideUpdateView(UpdateView):
     success_url = reverse_lazy('manual_override')
 
 
-class GroupedScheduleListView(TemplateView):
+class GroupedScheduleListView(ListView):
     template_name = "controller/grouped_schedule_list.html"
+    model = ScheduleGroup
+    paginate_by = 50
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        # Fetch all schedules
-        schedules = Schedule.objects.select_related('zone').all().order_by(
-            'start_time', 'end_time', 'target_temperature', 'priority'
-        )
+        # Zones, days and ids for the groups on this page only
+        members = defaultdict(lambda: {'zones': {}, 'days': set(), 'ids': []})
+        rows = Schedule.objects.filter(group__in=context['object_list']).order_by().values_list(
+            'group_id', 'id', 'zone_id', 'zone__name', 'day_of_week')
+        for group_id, sched_id, zone_id, zone_name, day in rows:
+            member = members[group_id]
+            member['zones'][zone_id] = zone_name
+            member['days'].add(day)
+            member['ids'].append(sched_id)
 
-        # Group schedules by identical settings
-        grouped = defaultdict(
-            lambda: {'zones': set(), 'days': set(), 'schedules': []})
-        for sched in schedules:
-            key = (sched.start_time, sched.end_time,
-                   sched.target_temperature, sched.priority)
-            grouped[key]['zones'].add(sched.zone)         # set method
-            grouped[key]['days'].add(sched.day_of_week)  # set method
-            grouped[key]['schedules'].append(sched)
-
-        # Convert to list for template
         grouped_schedules = []
-        for key, value in grouped.items():
-            start_time, end_time, temp, priority = key
+        for group in context['object_list']:
+            member = members[group.pk]
+            days = sorted(member['days'])
             grouped_schedules.append({
-                'zones': sorted(value['zones'], key=lambda z: z.name),
-                'days': sorted(value['days']),
-                'day_names': [dict(Schedule._meta.get_field('day_of_week').choices)[d] for d in sorted(value['days'])],
-                'schedules': value['schedules'],
-                'start_time': start_time,
-                'end_time': end_time,
-                'target_temperature': temp,
-                'priority': priority,
+                'zones': sorted(({'id': zid, 'name': name} for zid, name in member['zones'].items()),
+                                key=lambda z: z['name']),
+                'days': days,
+                'day_names': [DAY_NAMES[d] for d in days],
+                'schedule_ids': ','.join(map(str, sorted(member['ids']))),
+                'start_time': group.start_time,
+                'end_time': group.end_time,
+                'target_temperature': group.target_temperature,
+                'priority': group.priority,
             })
 
         context.update({
@@ -410,64 +404,37 @@ class GroupedScheduleBulkEditView(FormView):
             self.schedules.values_list("day_of_week", flat=True).distinct()
         )
 
+        # The group's own rows are rewritten, not conflicts
+        kwargs["replacing"] = self.schedules
+
         return kwargs
 
-    @transaction.atomic
     def form_valid(self, form):
         cleaned = form.cleaned_data
-        selected_zones = cleaned["zones"]
-        selected_days = [int(d) for d in cleaned["days_of_week"]]
-        start_time = cleaned["start_time"]
-        end_time = cleaned["end_time"]
-        target_temperature = cleaned["target_temperature"]
-        priority = cleaned["priority"]
-
-        # Build sets for comparison
-        original_keys = {
-            (s.zone_id, s.day_of_week): s
-            for s in self.schedules
-        }
-        submitted_keys = {
-            (zone.id, day) for zone in selected_zones for day in selected_days
-        }
-
-        # 1. Update existing schedules that are still selected
-        for key in submitted_keys & original_keys.keys():
-            sched = original_keys[key]
-            sched.start_time = start_time
-            sched.end_time = end_time
-            sched.target_temperature = target_temperature
-            sched.priority = priority
-            sched.save()
-
-        # 2. Delete schedules that were removed
-        for key in original_keys.keys() - submitted_keys:
-            original_keys[key].delete()
-
-        # 3. Create new schedules for newly added zone/day combos
-        for key in submitted_keys - original_keys.keys():
-            zone_id, day = key
-            Schedule.objects.create(
-                zone_id=zone_id,
-                day_of_week=day,
-                start_time=start_time,
-                end_time=end_time,
-                target_temperature=target_temperature,
-                priority=priority
-            )
-
+        zone_ids = [zone.id for zone in cleaned["zones"]]
+        overlaps.save_schedules(lambda: Schedule.objects.replace_group(
+            self.schedules,
+            zone_ids,
+            cleaned["days_of_week"],
+            start_time=cleaned["start_time"],
+            end_time=cleaned["end_time"],
+            target_temperature=cleaned["target_temperature"],
+            priority=cleaned["priority"],
+        ), zone_ids)
         return redirect("controller:grouped_schedule_list")
 
 
 class GroupedScheduleDeleteView(View):
     def post(self, request, schedule_ids, *args, **kwargs):
         ids = schedule_ids.split(',')
-        schedules = get_list_or_404(Schedule, id__in=ids)
-        for sched in schedules:
-            sched.delete()
+        schedules = Schedule.objects.filter(id__in=ids)
+        with schedule_batch():
+            if not schedules.delete()[0]:
+                raise Http404("No schedules found.")
         return redirect('controller:grouped_schedule_list')
 
 
+@method_decorator(read_from_replica, name='dispatch')
 class ZoneScheduleGraphView(TemplateView):
     template_name = "controller/zone_schedules/zone_schedules_graph.html"
 
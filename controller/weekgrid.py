@@ -0,0 +1,133 @@
+"""
+Vectorized week grid: the effective target of every zone at every time slot.
+
+Builds a zones × slots NumPy array for one week (Monday 00:00 local time)
+from the compiled timelines (controller.timeline, so overnight spans and
+priority are already resolved), then overlays ManualOverride windows and
+fills the gaps with the eco temperature. Each slot is evaluated at its start,
+the same way controller.resolver evaluates a single moment.
+"""
+import datetime
+
+import numpy as np
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ManualOverride, Zone
+from .resolver import eco_temperature, schedules_enabled
+from .timeline import SECONDS_PER_WEEK, get_timelines
+
+# Values of WeekGrid.sources, indexing into SOURCES
+ECO, SCHEDULE, MANUAL = 0, 1, 2
+SOURCES = ("eco", "schedule", "manual")
+
+
+def week_start(now=None):
+    """
+    Monday 00:00 (local time) of the week containing `now`.
+    """
+    now = timezone.localtime(now)
+    monday = now.date() - datetime.timedelta(days=now.weekday())
+    return timezone.make_aware(datetime.datetime.combine(monday, datetime.time()))
+
+
+class WeekGrid:
+    def __init__(self, zone_ids, start, step, targets, sources):
+        self.zone_ids = zone_ids
+        self.start = start
+        self.step = step
+        self.targets = targets  # float array, zones × slots
+        self.sources = sources  # int8 array of ECO/SCHEDULE/MANUAL, same shape
+        self._rows = {zone_id: row for row, zone_id in enumerate(zone_ids)}
+
+    @property
+    def offsets(self):
+        # Seconds since the start of the week for each slot
+        return np.arange(self.targets.shape[1]) * self.step
+
+    def row(self, zone_id):
+        return self.targets[self._rows[zone_id]]
+
+    def as_dict(self, zone_ids=None):
+        """
+        JSON-ready form: {"start", "step", "zones": {id: {"targets", "sources"}}}.
+        """
+        if zone_ids is None:
+            zone_ids = self.zone_ids
+        return {
+            "start": self.start.isoformat(),
+            "step": self.step,
+            "sources": SOURCES,
+            "zones": {
+                zone_id: {
+                    "targets": self.targets[self._rows[zone_id]].round(2).tolist(),
+                    "sources": self.sources[self._rows[zone_id]].tolist(),
+                }
+                for zone_id in zone_ids
+            },
+        }
+
+
+def _week_offset(start, moment):
+    # Wall-clock seconds since `start`, like timeline.week_offset
+    local = timezone.localtime(moment).replace(tzinfo=None)
+    return (local - start.replace(tzinfo=None)).total_seconds()
+
+
+def build_week_grid(zone_ids=None, step=60, now=None, include_manual=True):
+    """
+    Returns a WeekGrid for the week containing `now`, with one slot every
+    `step` seconds (a divisor of a day works best). Costs the timeline
+    queries plus one overrides query.
+    """
+    if zone_ids is None:
+        zone_ids = list(Zone.objects.order_by("pk").values_list("pk", flat=True))
+    zone_ids = list(zone_ids)
+    start = week_start(now)
+    offsets = np.arange(0, SECONDS_PER_WEEK, step)
+    shape = (len(zone_ids), len(offsets))
+
+    targets = np.full(shape, eco_temperature(), dtype=float)
+    sources = np.full(shape, ECO, dtype=np.int8)
+
+    if schedules_enabled() and zone_ids:
+        # Segments never overlap and never cross the end of the week, so
+        # laying the zones end to end gives one sorted array to search in
+        timelines = get_timelines(zone_ids)
+        seg_starts, seg_ends, seg_targets = [], [], []
+        for row, zone_id in enumerate(zone_ids):
+            base = row * SECONDS_PER_WEEK
+            for seg in timelines[zone_id].segments:
+                seg_starts.append(base + seg.start)
+                seg_ends.append(base + seg.end)
+                seg_targets.append(seg.schedule.target_temperature)
+
+        if seg_starts:
+            seg_starts = np.array(seg_starts)
+            keys = (np.arange(len(zone_ids))[:, None] * SECONDS_PER_WEEK + offsets).ravel()
+            idx = np.searchsorted(seg_starts, keys, side="right") - 1
+            safe = idx.clip(0)
+            hit = ((idx >= 0) & (keys < np.array(seg_ends)[safe])).reshape(shape)
+            targets[hit] = np.array(seg_targets)[safe].reshape(shape)[hit]
+            sources[hit] = SCHEDULE
+
+    if include_manual and zone_ids:
+        end = start + datetime.timedelta(weeks=1)
+        rows = {zone_id: row for row, zone_id in enumerate(zone_ids)}
+        overrides = ManualOverride.objects.filter(
+            zone_id__in=zone_ids, active_from__lt=end,
+        ).filter(
+            Q(active_until__gt=start) | Q(active_until__isnull=True)
+        ).order_by("active_from")
+        # Later overrides paint over earlier ones: the most recent start wins
+        for override in overrides:
+            first = np.searchsorted(offsets, _week_offset(start, override.active_from))
+            last = (
+                np.searchsorted(offsets, _week_offset(start, override.active_until))
+                if override.active_until else len(offsets)
+            )
+            row = rows[override.zone_id]
+            targets[row, first:last] = override.target_temperature
+            sources[row, first:last] = MANUAL
+
+    return WeekGrid(zone_ids, start, step, targets, sources)
@@ -0,0 +1,109 @@
+"""
+Materialized ZoneState rows.
+
+Resolving a zone's target means loading overrides, timelines and settings.
+ZoneState stores the result (target, source, the override or schedule behind
+it and the next event) so reads are a primary key join. Rows are rewritten
+by the scheduler at transitions and by controller.signals on edits; a row
+past its valid_until, or missing, is recomputed by the reader, so reads stay
+correct even when no scheduler is running.
+"""
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from .models import Zone, ZoneState
+from .resolver import resolve_zones
+
+STATE_FIELDS = [
+    "target", "source", "override", "schedule",
+    "valid_until", "next_event_type", "next_target", "updated_at",
+]
+
+
+def state_from_status(status, now):
+    event = status.next_event or {}
+    return ZoneState(
+        zone=status.zone,
+        target=status.target,
+        source=status.source,
+        override=status.override,
+        schedule=status.schedule,
+        valid_until=event.get("time"),
+        next_event_type=event.get("type", ""),
+        next_target=event.get("target"),
+        updated_at=now,
+    )
+
+
+def state_key(state):
+    # What a ZoneState row holds, to skip rewriting identical rows
+    return tuple(getattr(state, field + "_id" if field in ("override", "schedule") else field)
+                 for field in STATE_FIELDS if field != "updated_at")
+
+
+def save_states(statuses, now=None, written=None):
+    """
+    Upserts a ZoneState per resolver.ZoneStatus in one statement per batch.
+    `written` ({zone_id: state_key}, updated in place) lets a long-running
+    caller skip rows it already stored unchanged.
+    Returns {zone_id: ZoneState}.
+    """
+    if now is None:
+        now = timezone.now()
+    states = [state_from_status(status, now) for status in statuses]
+    if written is not None:
+        states = [state for state in states if written.get(state.zone_id) != state_key(state)]
+    if states:
+        ZoneState.objects.bulk_create(
+            states, update_conflicts=True, unique_fields=["zone"], update_fields=STATE_FIELDS,
+        )
+        if written is not None:
+            written.update((state.zone_id, state_key(state)) for state in states)
+    return {state.zone_id: state for state in states}
+
+
+def refresh_states(zone_ids=None, now=None):
+    """
+    Recomputes and stores the state of `zone_ids` (all zones when None).
+    """
+    zones = Zone.objects.all()
+    if zone_ids is not None:
+        zones = zones.filter(pk__in=zone_ids)
+    return save_states(resolve_zones(zones, now).values(), now)
+
+
+def get_states(zones=None, now=None):
+    """
+    Returns {zone_id: ZoneState} for `zones` (all zones when None), with
+    each zone's `state` attribute set. States already loaded through
+    select_related("state") are reused; missing or stale ones are
+    recomputed and stored.
+    """
+    if now is None:
+        now = timezone.now()
+    if zones is None:
+        zones = Zone.objects.all()
+    if isinstance(zones, QuerySet):
+        zones = zones.select_related("state")
+    zones = list(zones)
+
+    states = {}
+    unloaded = []
+    for zone in zones:
+        if Zone.state.is_cached(zone):
+            state = getattr(zone, "state", None)
+            if state is not None:
+                states[zone.pk] = state
+        else:
+            unloaded.append(zone.pk)
+    if unloaded:
+        states.update((s.zone_id, s) for s in ZoneState.objects.filter(zone_id__in=unloaded))
+
+    stale = [zone for zone in zones if zone.pk not in states or states[zone.pk].is_stale(now)]
+    if stale:
+        states.update(save_states(resolve_zones(stale, now).values(), now))
+
+    for zone in zones:
+        zone.state = states[zone.pk]
+        states[zone.pk].zone = zone
+    return states
@@ -0,0 +1,100 @@
+"""
+Reader/writer database routing.
+
+When a "replica" database is configured (settings.DB_REPLICA_NAME), views
+wrapped in read_from_replica send their reads there, leaving the primary to
+the control loop's writes. Everything else, and every write, uses "default".
+
+A replica lags behind the primary, so reads go back to the primary:
+- for a session that just made a change (ReplicaPinMiddleware pins it for
+  settings.REPLICA_STICKY_SECONDS after any successful POST/PUT/PATCH/DELETE),
+- for the rest of a request once it wrote anything itself.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = "replica"
+# Session key holding the time (epoch seconds) until which reads stay on the primary
+PIN_KEY = "_db_pinned_until"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_state = threading.local()
+
+
+def replica_available():
+    replica = connections.settings.get(REPLICA)
+    # As a test mirror the replica points at the primary's database, whose
+    # open test transaction a second connection can't see
+    return replica is not None and replica["NAME"] != connections.settings[DEFAULT_DB_ALIAS]["NAME"]
+
+
+def sticky_seconds():
+    return getattr(settings, "REPLICA_STICKY_SECONDS", 10)
+
+
+@contextmanager
+def use_replica():
+    """
+    Reads inside the block go to the replica (if there is one), until the
+    block writes something.
+    """
+    previous = getattr(_state, "reading", False), getattr(_state, "wrote", False)
+    _state.reading, _state.wrote = True, False
+    try:
+        yield
+    finally:
+        _state.reading, _state.wrote = previous
+
+
+def is_pinned(request):
+    session = getattr(request, "session", None)
+    return session is not None and session.get(PIN_KEY, 0) > time.time()
+
+
+def pin(request):
+    session = getattr(request, "session", None)
+    if session is not None:
+        session[PIN_KEY] = time.time() + sticky_seconds()
+
+
+def read_from_replica(view):
+    """
+    View decorator: safe requests from unpinned sessions read from the
+    replica. Template responses are rendered inside, so lazy querysets
+    evaluated by the template are routed too.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS or is_pinned(request):
+            return view(request, *args, **kwargs)
+        with use_replica():
+            response = view(request, *args, **kwargs)
+            if hasattr(response, "render") and not response.is_rendered:
+                response.render()
+        return response
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if getattr(_state, "reading", False) and not getattr(_state, "wrote", False) and replica_available():
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Reads after this in the same request must see it
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA}
+
+    def allow_migrate(self, db, app_label, **hints):
+        # The replica gets its schema from the primary
+        return db != REPLICA
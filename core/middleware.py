@@ -1,7 +1,18 @@
+import re
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+
 from django.shortcuts import redirect
 from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
 from django.urls import reverse
 
+from .db_router import SAFE_METHODS, pin, replica_available
+
 
 class LoginRequiredMiddleware:
     EXEMPT_URLS = None
@@ -32,3 +43,150 @@ class LoginRequiredMiddleware:
 
         # Reject all other URLs
         return redirect(settings.LOGIN_URL)
+
+
+# Requests kept per URL name for the rolling percentiles
+PROFILE_WINDOW = 500
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+
+
+def normalize_sql(sql):
+    """
+    Strips literals so the same query with different parameters compares equal.
+    """
+    # Django passes parameters separately as %s, inline literals become ? too
+    return _IN_LISTS.sub("(...)", _LITERALS.sub("?", sql.replace("%s", "?")))
+
+
+class QueryRecorder:
+    """
+    connection.execute_wrapper hook collecting (normalized sql, seconds).
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((normalize_sql(sql), time.perf_counter() - started))
+
+    @property
+    def sql_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    def duplicates(self):
+        """
+        {normalized sql: count} for statements run more than once (N+1 suspects).
+        """
+        counts = Counter(sql for sql, _ in self.queries)
+        return {sql: count for sql, count in counts.items() if count > 1}
+
+
+class ProfileStats:
+    """
+    Rolling per URL name samples, kept in memory for this process only.
+    """
+
+    def __init__(self, window=PROFILE_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._duplicates = defaultdict(Counter)
+
+    def record(self, name, total, sql_time, queries, duplicates):
+        with self._lock:
+            self._samples[name].append((total, sql_time, queries, sum(duplicates.values())))
+            self._duplicates[name].update(duplicates)
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._duplicates.clear()
+
+    @staticmethod
+    def percentiles(values):
+        if len(values) == 1:
+            return {"p50": values[0], "p95": values[0], "p99": values[0]}
+        cuts = statistics.quantiles(values, n=100, method="inclusive")
+        return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98]}
+
+    def summary(self):
+        with self._lock:
+            samples = {name: list(rows) for name, rows in self._samples.items()}
+            duplicates = {name: counter.most_common(5) for name, counter in self._duplicates.items()}
+
+        summary = {}
+        for name, rows in sorted(samples.items()):
+            total, sql_time, queries, dupes = zip(*rows)
+            summary[name] = {
+                "requests": len(rows),
+                "total_ms": self.percentiles([t * 1000 for t in total]),
+                "sql_ms": self.percentiles([t * 1000 for t in sql_time]),
+                "queries": self.percentiles(list(queries)),
+                "duplicated_queries": self.percentiles(list(dupes)),
+                "top_duplicates": [{"sql": sql, "count": count} for sql, count in duplicates[name]],
+            }
+        return summary
+
+
+profile_stats = ProfileStats()
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in (settings.PROFILING) per-request SQL and timing profile. Adds a
+    Server-Timing header and feeds profile_stats, shown at core:profiling.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+
+        if response.streaming:
+            # Body (and its queries) runs after we return: nothing useful to time
+            return response
+
+        sql_time = recorder.sql_time
+        duplicates = recorder.duplicates()
+        response["Server-Timing"] = ", ".join([
+            f'sql;dur={sql_time * 1000:.1f};desc="{len(recorder.queries)} queries"',
+            f'dup;desc="{sum(duplicates.values())} duplicated"',
+            f"view;dur={(total - sql_time) * 1000:.1f}",
+            f"total;dur={total * 1000:.1f}",
+        ])
+
+        match = request.resolver_match
+        name = match.view_name if match else "<unresolved>"
+        profile_stats.record(name, total, sql_time, len(recorder.queries), duplicates)
+        return response
+
+
+class ReplicaPinMiddleware:
+    """
+    Keeps a session's reads on the primary for a few seconds after it changed
+    something, so it sees its own writes (see core.db_router).
+    """
+
+    def __init__(self, get_response):
+        if not replica_available():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            pin(request)
+        return response
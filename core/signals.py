@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import SystemSettings
+from .system_settings import invalidate_system_settings
+
+
+@receiver(post_save, sender=SystemSettings)
+@receiver(post_delete, sender=SystemSettings)
+def system_settings_changed(sender, instance, **kwargs):
+    invalidate_system_settings()
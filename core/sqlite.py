@@ -0,0 +1,22 @@
+"""
+Process-wide write serialization for the shared SQLite database (tuned in
+heating.sqlite).
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+_write_lock = threading.RLock()
+
+
+@contextmanager
+def serialized_write(using=DEFAULT_DB_ALIAS):
+    """
+    One transaction for a batch of writes, and one such batch at a time per
+    process: threads queue on a lock instead of all contending for SQLite's
+    write lock. Daemons wrap each round of writes in this so they hold the
+    lock once per round rather than once per statement.
+    """
+    with _write_lock, transaction.atomic(using=using):
+        yield
@@ -0,0 +1,67 @@
+"""
+Process-wide cached SystemSettings singleton.
+
+Reads are served from memory. At most every CHECK_INTERVAL seconds the
+process compares a version token in the shared cache, which is bumped
+whenever the settings are saved, so a change made in one process reaches
+every web worker and daemon within that delay.
+"""
+import threading
+import time
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import SystemSettings
+from .versions import bump_version, get_version
+
+VERSION_NAME = "system_settings"
+# Upper bound (seconds) on how stale another process' settings can be
+CHECK_INTERVAL = 1.0
+
+_lock = threading.Lock()
+_loaded = False
+_cached = None
+_version = None
+_checked_at = 0.0
+
+
+def get_system_settings():
+    """
+    Returns the SystemSettings singleton, or None if it was never saved.
+    The instance is shared: treat it as read-only and load a fresh one from
+    the database to edit it.
+    """
+    global _loaded, _cached, _version, _checked_at
+    with _lock:
+        now = time.monotonic()
+        if _loaded and now - _checked_at < CHECK_INTERVAL:
+            return _cached
+
+        version = get_version(VERSION_NAME)
+        if not _loaded or version != _version:
+            # From the primary, never a lagging replica: this stays cached
+            _cached = SystemSettings.objects.using(DEFAULT_DB_ALIAS).first()
+            _loaded = True
+            _version = version
+        _checked_at = now
+        return _cached
+
+
+def _drop(version=None):
+    global _loaded, _cached, _version
+    with _lock:
+        _loaded = False
+        _cached = None
+        if version is not None:
+            _version = version
+
+
+def invalidate_system_settings():
+    """
+    Drops the cached settings here now and, through the version token,
+    everywhere else once the current transaction commits: a process
+    reloading before then would cache the old row under the new token.
+    """
+    _drop()
+    # Dropped again on commit, in case another thread reloaded meanwhile
+    transaction.on_commit(lambda: _drop(bump_version(VERSION_NAME)))
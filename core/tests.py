@@ -1,3 +1,327 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+import time
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.http import HttpResponse, JsonResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from controller.api_views import TemperatureLogViewSet
+from controller.models import TemperatureLog, Zone
+from heating import sqlite
+from .db_router import PIN_KEY, REPLICA, read_from_replica, use_replica
+from .middleware import QueryRecorder, ReplicaPinMiddleware, normalize_sql, profile_stats
+from .models import SystemSettings
+from . import system_settings
+from .system_settings import get_system_settings, invalidate_system_settings
+from .versions import VersionListener, bump_version, get_version
+
+
+class SystemSettingsCacheTests(TestCase):
+    def setUp(self):
+        invalidate_system_settings()
+
+    def test_reads_are_cached(self):
+        SystemSettings.objects.create(pk=1, eco_temperature=17.0)
+
+        self.assertEqual(get_system_settings().eco_temperature, 17.0)
+        with self.assertNumQueries(0):
+            for _ in range(100):
+                get_system_settings()
+
+    def test_save_invalidates(self):
+        settings = SystemSettings.objects.create(pk=1, eco_temperature=17.0)
+        get_system_settings()
+
+        settings.eco_temperature = 18.0
+        settings.save()
+
+        self.assertEqual(get_system_settings().eco_temperature, 18.0)
+
+    def test_version_is_published_on_commit(self):
+        settings = SystemSettings.objects.create(pk=1, eco_temperature=17.0)
+        before = get_version(system_settings.VERSION_NAME)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            settings.eco_temperature = 18.0
+            settings.save()
+            self.assertEqual(get_version(system_settings.VERSION_NAME), before)
+            # This process sees its own change right away
+            self.assertEqual(get_system_settings().eco_temperature, 18.0)
+        self.assertNotEqual(get_version(system_settings.VERSION_NAME), before)
+
+    def test_other_process_change_seen_after_check_interval(self):
+        SystemSettings.objects.create(pk=1, mode="auto")
+        get_system_settings()
+        # Simulate another process saving: the row and version token change
+        SystemSettings.objects.filter(pk=1).update(mode="manual")
+        bump_version(system_settings.VERSION_NAME)
+
+        self.assertEqual(get_system_settings().mode, "auto")
+        system_settings._checked_at -= system_settings.CHECK_INTERVAL
+        self.assertEqual(get_system_settings().mode, "manual")
+
+    def test_missing_row_is_cached_as_none(self):
+        self.assertIsNone(get_system_settings())
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_system_settings())
+
+
+@override_settings(MIDDLEWARE=settings.MIDDLEWARE + ["core.middleware.ProfilingMiddleware"])
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        profile_stats.reset()
+        self.user = User.objects.create_user("admin", password="secret", is_staff=True)
+        self.client.force_login(self.user)
+
+    def test_normalize_sql(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE id IN (%s, %s) AND name = 'it''s' AND x = 1.5"),
+            "SELECT * FROM t WHERE id IN (...) AND name = ? AND x = ?",
+        )
+
+    def test_recorder_flags_duplicates(self):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for pk in range(3):
+                list(User.objects.filter(pk=pk))
+            User.objects.count()
+        self.assertEqual(len(recorder.queries), 4)
+        self.assertEqual(list(recorder.duplicates().values()), [3])
+
+    def test_server_timing_and_stats(self):
+        response = self.client.get(reverse("controller:dashboard"))
+        self.assertIn("sql;dur=", response["Server-Timing"])
+
+        stats = self.client.get(reverse("core:profiling")).json()["views"]
+        self.assertEqual(stats["controller:dashboard"]["requests"], 1)
+        self.assertGreater(stats["controller:dashboard"]["queries"]["p50"], 0)
+
+    def test_stats_are_staff_only(self):
+        self.user.is_staff = False
+        self.user.save()
+        response = self.client.get(reverse("core:profiling"))
+        self.assertEqual(response.status_code, 302)
+
+    def test_post_resets(self):
+        self.client.get(reverse("controller:dashboard"))
+        self.client.post(reverse("core:profiling"))
+        self.assertNotIn("controller:dashboard", profile_stats.summary())
+
+
+class VersionListenerTests(SimpleTestCase):
+    def setUp(self):
+        path = os.path.join(tempfile.mkdtemp(), "versions.sock")
+        self.enterContext(override_settings(VERSION_NOTIFY_SOCKET=path))
+        self.listener = VersionListener()
+        self.addCleanup(self.listener.close)
+
+    def test_bump_wakes_the_listener(self):
+        self.assertEqual(self.listener.wait(0), set())
+
+        threading.Timer(0.1, bump_version, args=["controller"]).start()
+        started = time.monotonic()
+        self.assertEqual(self.listener.wait(5), {"controller"})
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_bumps_while_busy_are_all_reported(self):
+        bump_version("controller")
+        bump_version("schedules")
+        self.assertEqual(self.listener.wait(0), {"controller", "schedules"})
+
+    def test_bump_without_listener_is_harmless(self):
+        self.listener.close()
+        bump_version("controller")
+        with override_settings(VERSION_NOTIFY_SOCKET=None):
+            listener = VersionListener()
+        self.assertFalse(listener.available)
+        self.assertEqual(listener.wait(0), set())
+
+
+class SQLiteTuningTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "stress.sqlite3")
+
+    def connect(self, **pragmas):
+        # A connection to a real file (the test database lives in memory)
+        # with the project's OPTIONS. Close it in the thread that made it.
+        settings_dict = {**connections.settings[DEFAULT_DB_ALIAS], "NAME": self.path}
+        settings_dict["OPTIONS"] = {**settings_dict["OPTIONS"], **sqlite.database_options(**pragmas)}
+        return DatabaseWrapper(settings_dict, alias="stress")
+
+    def test_settings_apply_pragmas(self):
+        self.assertIn("journal_mode=WAL", settings.DATABASES["default"]["OPTIONS"]["init_command"])
+        wrapper = self.connect()
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            self.assertEqual(cursor.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            self.assertEqual(cursor.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+
+    def stress(self, journal_mode, duration=1.0):
+        """
+        One thread commits small write transactions back to back while
+        readers (busy timeout 0) count the reads that hit "database is locked".
+        """
+        setup = self.connect(journal_mode=journal_mode)
+        with setup.cursor() as cursor:
+            cursor.execute("CREATE TABLE IF NOT EXISTS reading (value REAL)")
+        setup.close()
+
+        stop = threading.Event()
+        failures = []
+        reads = []
+
+        def write():
+            writer = self.connect(journal_mode=journal_mode)
+            while not stop.is_set():
+                with writer.cursor() as cursor:
+                    cursor.execute("BEGIN IMMEDIATE")
+                    cursor.executemany("INSERT INTO reading VALUES (%s)", [(20.0,)] * 200)
+                    cursor.execute("COMMIT")
+            writer.close()
+
+        def read():
+            reader = self.connect(journal_mode=journal_mode, timeout=0)
+            while not stop.is_set():
+                try:
+                    with reader.cursor() as cursor:
+                        cursor.execute("SELECT COUNT(*), AVG(value) FROM reading").fetchone()
+                    reads.append(1)
+                except OperationalError:
+                    failures.append(1)
+            reader.close()
+
+        threads = [threading.Thread(target=write)] + [threading.Thread(target=read) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return len(reads), len(failures)
+
+    def test_readers_do_not_block_behind_writer(self):
+        # The rollback journal locks readers out while each commit runs
+        self.assertGreater(self.stress("DELETE", duration=0.5)[1], 0)
+
+        reads, failures = self.stress("WAL")
+        self.assertGreater(reads, 0)
+        self.assertEqual(failures, 0)
+
+
+class ReplicaRoutingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # A second SQLite file standing in for the replica, registered here
+        # rather than in settings (the runner would want to create it) but
+        # before TestCase wraps each database in a transaction
+        cls.databases = {DEFAULT_DB_ALIAS, REPLICA}
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.configured = connections.settings.get(REPLICA)
+        cls.drop_replica_connection()
+        connections.settings[REPLICA] = {
+            **connections.settings[DEFAULT_DB_ALIAS],
+            "NAME": os.path.join(cls.tmp.name, "replica.sqlite3"),
+            "OPTIONS": sqlite.database_options(),
+        }
+        with connections[REPLICA].schema_editor() as editor:
+            for model in (SystemSettings, Zone, TemperatureLog):
+                editor.create_model(model)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.drop_replica_connection()
+        if cls.configured is None:
+            del connections.settings[REPLICA]
+        else:
+            connections.settings[REPLICA] = cls.configured
+        cls.tmp.cleanup()
+
+    @staticmethod
+    def drop_replica_connection():
+        if hasattr(connections._connections, REPLICA):
+            connections[REPLICA].close()
+            del connections[REPLICA]
+
+    @classmethod
+    def setUpTestData(cls):
+        SystemSettings.objects.using(REPLICA).create(pk=1, eco_temperature=12.0)
+        SystemSettings.objects.create(pk=1, eco_temperature=18.0)
+        zone = Zone.objects.using(REPLICA).create(name="Replica")
+        TemperatureLog.objects.using(REPLICA).create(zone=zone, temperature=12.5, source="eco")
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def eco_view(self):
+        @read_from_replica
+        def view(request):
+            return JsonResponse({"eco": SystemSettings.objects.get(pk=1).eco_temperature})
+        return view
+
+    def request(self, method="get", session=None):
+        request = getattr(self.factory, method)("/")
+        request.session = session if session is not None else {}
+        return request
+
+    def test_reads_outside_marked_views_use_primary(self):
+        self.assertEqual(SystemSettings.objects.get(pk=1).eco_temperature, 18.0)
+
+    def test_marked_view_reads_from_replica(self):
+        response = self.eco_view()(self.request())
+        self.assertEqual(json.loads(response.content), {"eco": 12.0})
+
+    def test_streamed_export_reads_from_replica(self):
+        request = APIRequestFactory().get("/api/logs/export/")
+        request.session = {}
+        force_authenticate(request, user=User(username="reader"))
+        response = TemperatureLogViewSet.as_view({"get": "export"})(request)
+
+        # Consumed after the view (and its replica block) returned
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([row["temperature"] for row in rows], [12.5])
+
+    def test_writes_go_to_primary_and_later_reads_follow(self):
+        with use_replica():
+            self.assertEqual(SystemSettings.objects.get(pk=1).eco_temperature, 12.0)
+            SystemSettings.objects.filter(pk=1).update(eco_temperature=19.0)
+            self.assertEqual(SystemSettings.objects.get(pk=1).eco_temperature, 19.0)
+        self.assertEqual(SystemSettings.objects.using(REPLICA).get(pk=1).eco_temperature, 12.0)
+
+    def test_session_is_pinned_to_primary_after_a_write(self):
+        session = {}
+        middleware = ReplicaPinMiddleware(lambda request: HttpResponse())
+        middleware(self.request("post", session))
+
+        response = self.eco_view()(self.request(session=session))
+        self.assertEqual(json.loads(response.content), {"eco": 18.0})
+
+        # Until the pin expires
+        session[PIN_KEY] = time.time() - 1
+        response = self.eco_view()(self.request(session=session))
+        self.assertEqual(json.loads(response.content), {"eco": 12.0})
+
+    def test_failed_writes_do_not_pin(self):
+        session = {}
+        ReplicaPinMiddleware(lambda request: HttpResponse(status=400))(self.request("post", session))
+        self.assertNotIn(PIN_KEY, session)
+
+    def test_replica_connection_can_be_read_only(self):
+        with connections[REPLICA].cursor() as cursor:
+            cursor.execute("PRAGMA query_only=ON")
+            try:
+                with self.assertRaises(OperationalError), transaction.atomic(using=REPLICA):
+                    SystemSettings.objects.using(REPLICA).filter(pk=1).update(eco_temperature=1.0)
+            finally:
+                cursor.execute("PRAGMA query_only=OFF")
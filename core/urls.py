@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import CustomLoginView, CustomLogoutView, RegisterView, SettingsView, UpdateSettingsView
+from .views import CustomLoginView, CustomLogoutView, RegisterView, SettingsView, UpdateSettingsView, ProfilingView
 
 app_name = 'core'
 
@@ -9,4 +9,5 @@ urlpatterns = [
     path('auth/register/', RegisterView.as_view(), name='register'),
     path('settings/', SettingsView.as_view(), name='settings'),
     path('settings/update/', UpdateSettingsView.as_view(), name='update_settings'),
+    path('profiling/', ProfilingView.as_view(), name='profiling'),
 ]
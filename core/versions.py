@@ -0,0 +1,110 @@
+import os
+import select
+import socket
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+KEY_PREFIX = "version:"
+
+_sender = None
+
+
+def get_version(name):
+    """
+    Returns the current version token for `name`, or None if it was never bumped.
+    """
+    return cache.get(KEY_PREFIX + name)
+
+
+def bump_version(name):
+    """
+    Marks `name` as changed for every process sharing the cache backend.
+    A random token (rather than a counter) keeps concurrent bumps race free.
+    """
+    token = uuid.uuid4().hex
+    cache.set(KEY_PREFIX + name, token, timeout=None)
+    notify(name)
+    return token
+
+
+def notify_path():
+    """
+    Unix datagram socket bumps are announced on, or None when unavailable.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    return getattr(settings, "VERSION_NOTIFY_SOCKET", None)
+
+
+def notify(name):
+    """
+    Wakes the VersionListener, if a process has one open. Best effort: the
+    token in the cache stays the source of truth.
+    """
+    global _sender
+    path = notify_path()
+    if not path:
+        return
+    try:
+        if _sender is None:
+            _sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            _sender.setblocking(False)
+        _sender.sendto(name.encode(), path)
+    except OSError:
+        # Nobody listening, or its queue is full (and it is awake anyway)
+        pass
+
+
+class VersionListener:
+    """
+    Lets a daemon sleep until some process bumps a version, instead of
+    polling the tokens. One listener per socket path: opening a new one
+    takes the path over.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or notify_path()
+        self.sock = None
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self.sock.bind(self.path)
+            self.sock.setblocking(False)
+
+    @property
+    def available(self):
+        return self.sock is not None
+
+    def wait(self, timeout):
+        """
+        Blocks up to `timeout` seconds (None for no limit) for a bump.
+        Returns the names bumped meanwhile, empty on timeout.
+        """
+        if self.sock is None:
+            if timeout is not None:
+                select.select([], [], [], timeout)
+            return set()
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        names = set()
+        while readable:
+            try:
+                names.add(self.sock.recv(256).decode())
+            except BlockingIOError:
+                break
+        return names
+
+    def close(self):
+        if self.sock is None:
+            return
+        self.sock.close()
+        self.sock = None
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
@@ -11,9 +11,12 @@ from .forms import SystemSettingsForm
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.http import JsonResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings as project_settings
 
 
 from core.forms import RegisterForm
+from core.middleware import profile_stats
 
 
 class CustomLoginView(LoginView):
@@ -73,3 +76,18 @@ class UpdateSettingsView(View):
             settings.save()
 
         return JsonResponse({"status": "ok", "mode": settings.mode, "eco_temperature": settings.eco_temperature})
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class ProfilingView(View):
+    """
+    Rolling per-view stats collected by ProfilingMiddleware (this process only).
+    POST clears them.
+    """
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse({"enabled": project_settings.PROFILING, "views": profile_stats.summary()})
+
+    def post(self, request, *args, **kwargs):
+        profile_stats.reset()
+        return JsonResponse({"status": "ok"})
@@ -14,6 +14,8 @@ import os
 from pathlib import Path
 from decouple import config
 
+from . import sqlite
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -60,6 +62,11 @@ MIDDLEWARE = [
     'core.middleware.LoginRequiredMiddleware',
 ]
 
+# Per-request SQL/timing profile (Server-Timing header, stats at /profiling/)
+PROFILING = config("PROFILING", default=False, cast=bool)
+if PROFILING:
+    MIDDLEWARE.append('core.middleware.ProfilingMiddleware')
+
 ROOT_URLCONF = 'heating.urls'
 
 TEMPLATES = [
@@ -87,6 +94,50 @@ REST_FRAMEWORK = {
 
 WSGI_APPLICATION = 'heating.wsgi.application'
 
+# Backend used by the run_controller command to drive the zone outputs. Only
+# defaults to the fake (which drives nothing) in DEBUG; production must set it.
+CONTROLLER_ACTUATOR = config(
+    "CONTROLLER_ACTUATOR", default="controller.actuators.FakeActuator" if DEBUG else "")
+
+# What saving overlapping schedules for a zone does: "reject" reports them
+# on the form, "priority" saves and trims the lower-precedence rows (see
+# controller.overlaps)
+SCHEDULE_OVERLAP_POLICY = config("SCHEDULE_OVERLAP_POLICY", default="reject")
+
+# Buffered TemperatureLog writes (see controller.logwriter)
+TEMPERATURE_LOG_WRITER = {
+    'DEADBAND': 0.1,        # °C change needed to log a new row
+    'HEARTBEAT': 15 * 60,   # seconds before an unchanged zone is logged again
+    'FLUSH_SIZE': 500,      # rows per bulk insert
+    'FLUSH_INTERVAL': 5.0,  # max seconds rows wait in memory
+    'MAX_BUFFER': 10000,    # rows kept while flushes fail, oldest dropped
+}
+
+# Predictive preheat from learned heating rates (see controller.preheat).
+# Rates are fitted on "sensor" TemperatureLog rows only, so only enable it
+# once the zone sensors post to /api/zones/<id>/readings/.
+PREHEAT = {
+    'ENABLED': config("PREHEAT_ENABLED", default=False, cast=bool),
+    'LOOKBACK_DAYS': 7,           # history read by a first fit
+    'HALF_LIFE_HOURS': 72,        # age at which a transition counts half
+    'MAX_GAP': 60 * 60,           # seconds between readings still paired
+    'MIN_SAMPLES': 5,             # transitions needed before preheating
+    'MAX_LEAD': 3 * 60 * 60,      # seconds, longest preheat
+    'REFIT_INTERVAL': 15 * 60,    # seconds between scheduler refits
+}
+
+# TemperatureLog rollup tiers: bucket width (seconds) -> retention (days, None = forever)
+TEMPERATURE_LOG_TIERS = {
+    60: 30,
+    15 * 60: 365,
+    60 * 60: None,
+}
+# Raw TemperatureLog rows older than this are removed by `manage.py prune_logs`
+TEMPERATURE_LOG_RAW_RETENTION_DAYS = 7
+
+# Seconds a burst of dashboard +/- clicks is collected before one write (see controller.adjust)
+OVERRIDE_ADJUST_WINDOW = 0.05
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -95,9 +146,66 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Persistent connections, health checked before reuse
+        'CONN_MAX_AGE': config("DB_CONN_MAX_AGE", default=600, cast=int),
+        'CONN_HEALTH_CHECKS': True,
+        # WAL, busy timeout and pragmas for concurrent writers, see heating.sqlite
+        'OPTIONS': sqlite.database_options(
+            timeout=config("SQLITE_BUSY_TIMEOUT", default=sqlite.BUSY_TIMEOUT, cast=int),
+            journal_mode=config("SQLITE_JOURNAL_MODE", default=sqlite.PRAGMAS["journal_mode"]),
+            synchronous=config("SQLITE_SYNCHRONOUS", default=sqlite.PRAGMAS["synchronous"]),
+            mmap_size=config("SQLITE_MMAP_SIZE", default=sqlite.PRAGMAS["mmap_size"], cast=int),
+            cache_size=config("SQLITE_CACHE_SIZE", default=sqlite.PRAGMAS["cache_size"], cast=int),
+        ),
     }
 }
 
+# Optional read replica (a second SQLite file kept in sync by e.g. Litestream,
+# or a Postgres standby) for the read-only views, see core.db_router
+DB_REPLICA_NAME = config("DB_REPLICA_NAME", default="")
+if DB_REPLICA_NAME:
+    DB_REPLICA_ENGINE = config("DB_REPLICA_ENGINE", default='django.db.backends.sqlite3')
+    DATABASES['replica'] = {
+        'ENGINE': DB_REPLICA_ENGINE,
+        'NAME': DB_REPLICA_NAME,
+        'HOST': config("DB_REPLICA_HOST", default=""),
+        'PORT': config("DB_REPLICA_PORT", default=""),
+        'USER': config("DB_REPLICA_USER", default=""),
+        'PASSWORD': config("DB_REPLICA_PASSWORD", default=""),
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'CONN_HEALTH_CHECKS': True,
+        # Refuse writes on the replica connection
+        'OPTIONS': (
+            sqlite.database_options(query_only="ON")
+            if DB_REPLICA_ENGINE.endswith("sqlite3")
+            else {'options': '-c default_transaction_read_only=on'}
+        ),
+        'TEST': {'MIRROR': 'default'},
+    }
+    MIDDLEWARE.append('core.middleware.ReplicaPinMiddleware')
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+# Seconds a session keeps reading from the primary after a write
+REPLICA_STICKY_SECONDS = config("REPLICA_STICKY_SECONDS", default=10, cast=int)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# File based so version tokens (core.versions) are shared by the web workers
+# and the management command daemons.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config("CACHE_LOCATION", default=str(BASE_DIR / '.cache')),
+    }
+}
+
+# Unix socket the scheduler daemon sleeps on; every version bump pokes it
+# (core.versions.VersionListener). Empty to fall back to polling.
+VERSION_NOTIFY_SOCKET = config(
+    "VERSION_NOTIFY_SOCKET", default=os.path.join(CACHES['default']['LOCATION'], 'versions.sock'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
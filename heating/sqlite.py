@@ -0,0 +1,47 @@
+"""
+SQLite tuning for several processes sharing one database file.
+
+The web workers, the scheduler daemon and the control loop all write to
+db.sqlite3. With the default rollback journal a writer committing blocks
+every reader, and a transaction that starts reading and later writes can
+fail with "database is locked" without waiting for the busy timeout. So:
+
+- WAL journaling: readers keep reading the last committed data while a
+  write is in progress.
+- synchronous=NORMAL: safe with WAL (a power cut can lose the last commits,
+  never corrupt the file) and avoids an fsync per commit.
+- IMMEDIATE transactions (set in settings): the write lock is taken at
+  BEGIN, where a busy writer is waited for, instead of on the first write.
+- mmap and a bigger page cache for the read-heavy dashboard.
+
+database_options() builds the DATABASES OPTIONS from these; settings.py
+reads the values from the environment. Writers that batch their statements
+take core.sqlite.serialized_write().
+"""
+
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,  # bytes
+    "cache_size": -20000,            # negative: KiB, so ~20MB
+    "temp_store": "MEMORY",
+}
+
+# Seconds a connection waits for the write lock before "database is locked"
+BUSY_TIMEOUT = 20
+
+
+def init_command(**pragmas):
+    """
+    "PRAGMA a=1;PRAGMA b=2" for OPTIONS["init_command"], run on every new connection.
+    """
+    pragmas = {**PRAGMAS, **pragmas}
+    return ";".join(f"PRAGMA {name}={value}" for name, value in pragmas.items() if value is not None)
+
+
+def database_options(timeout=BUSY_TIMEOUT, transaction_mode="IMMEDIATE", **pragmas):
+    return {
+        "timeout": timeout,
+        "transaction_mode": transaction_mode,
+        "init_command": init_command(**pragmas),
+    }